@@ -0,0 +1,175 @@
+import argparse
+import json
+import os
+import time
+from typing import Optional, Tuple
+
+import numpy as np
+
+from catalog import CATEGORY_COLUMNS, FEATURE_SCALE, TrackCatalog
+
+
+def squared_distances(x: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+    """Pairwise squared Euclidean distances between rows of x and centroids."""
+    return (np.einsum("ij,ij->i", x, x)[:, None]
+            - 2.0 * x @ centroids.T
+            + np.einsum("ij,ij->i", centroids, centroids)[None, :])
+
+
+def assign_nearest(x: np.ndarray, centroids: np.ndarray, chunk_size: int = 20_000) -> np.ndarray:
+    """Index of the nearest centroid for every row of x, computed in chunks to bound memory."""
+    assign = np.empty(len(x), dtype=np.int64)
+    for start in range(0, len(x), chunk_size):
+        assign[start:start + chunk_size] = squared_distances(x[start:start + chunk_size], centroids).argmin(axis=1)
+    return assign
+
+
+def train_kmeans(x: np.ndarray, n_clusters: int, n_iter: int = 20, seed: int = 42) -> np.ndarray:
+    """Plain Lloyd's k-means in NumPy, returning the centroids."""
+    rng = np.random.default_rng(seed)
+    centroids = x[rng.choice(len(x), size=n_clusters, replace=False)].copy()
+    for _ in range(n_iter):
+        assign = assign_nearest(x, centroids)
+        counts = np.bincount(assign, minlength=n_clusters)
+        sums = np.stack([np.bincount(assign, weights=x[:, d], minlength=n_clusters)
+                         for d in range(x.shape[1])], axis=1)
+        nonempty = counts > 0
+        centroids[nonempty] = sums[nonempty] / counts[nonempty, None]
+        # Re-seed empty clusters from random points so every list gets used
+        if not nonempty.all():
+            centroids[~nonempty] = x[rng.choice(len(x), size=int((~nonempty).sum()), replace=False)]
+    return centroids
+
+
+class IVFIndex:
+    """
+    Inverted-file (IVF) approximate nearest-neighbour index over catalog audio features.
+
+    Tracks are partitioned by their nearest coarse centroid and stored
+    contiguously per partition, together with their language/genre codes.
+    A query only scans the nprobe partitions whose centroids are closest to
+    the target, which keeps lookups well under a millisecond on catalogs with
+    millions of rows. All arrays are memory-mapped when loading.
+    """
+
+    ASSIGN_CHUNK = 200_000
+
+    def __init__(self, path: str):
+        """
+        Args:
+            path: Index directory written by IVFIndex.build
+        """
+        self.path = path
+        with open(os.path.join(path, "meta.json")) as f:
+            self.meta = json.load(f)
+        self.centroids = np.load(os.path.join(path, "centroids.npy"))
+        self.list_offsets = np.load(os.path.join(path, "list_offsets.npy"))
+        self.vectors = np.load(os.path.join(path, "vectors.npy"), mmap_mode="r")
+        self.row_ids = np.load(os.path.join(path, "row_ids.npy"), mmap_mode="r")
+        self.categories = {column: np.load(os.path.join(path, f"{column}.npy"), mmap_mode="r")
+                           for column in CATEGORY_COLUMNS}
+        self.nprobe = self.meta.get("nprobe", 8)
+
+    @classmethod
+    def build(cls, catalog: TrackCatalog, out_dir: str, nlist: Optional[int] = None,
+              sample_size: int = 100_000, nprobe: int = 8) -> "IVFIndex":
+        """
+        Build an index for a catalog and write it to out_dir.
+
+        Args:
+            catalog: Catalog to index
+            out_dir: Directory to write the index to
+            nlist: Number of partitions; defaults to about sqrt(len(catalog))
+            sample_size: Number of rows used to train the coarse centroids
+            nprobe: Default number of partitions scanned per query
+
+        Returns:
+            The loaded index
+        """
+        os.makedirs(out_dir, exist_ok=True)
+        count = len(catalog)
+        nlist = max(1, min(nlist or int(np.sqrt(count)), count))
+
+        rng = np.random.default_rng(42)
+        sample_rows = np.sort(rng.choice(count, size=min(sample_size, count), replace=False))
+        sample = np.asarray(catalog.features[sample_rows], dtype=np.float32) / FEATURE_SCALE
+        centroids = train_kmeans(sample, nlist).astype(np.float32)
+
+        assign = np.empty(count, dtype=np.int64)
+        for start in range(0, count, cls.ASSIGN_CHUNK):
+            stop = min(start + cls.ASSIGN_CHUNK, count)
+            chunk = np.asarray(catalog.features[start:stop], dtype=np.float32) / FEATURE_SCALE
+            assign[start:stop] = assign_nearest(chunk, centroids)
+
+        order = np.argsort(assign, kind="stable")
+        list_offsets = np.zeros(nlist + 1, dtype=np.int64)
+        np.cumsum(np.bincount(assign, minlength=nlist), out=list_offsets[1:])
+
+        np.save(os.path.join(out_dir, "centroids.npy"), centroids)
+        np.save(os.path.join(out_dir, "list_offsets.npy"), list_offsets)
+        np.save(os.path.join(out_dir, "row_ids.npy"), order.astype(np.int64))
+        np.save(os.path.join(out_dir, "vectors.npy"),
+                (np.asarray(catalog.features, dtype=np.float32)[order] / FEATURE_SCALE).astype(np.float32))
+        for column in CATEGORY_COLUMNS:
+            np.save(os.path.join(out_dir, f"{column}.npy"), np.asarray(catalog.categories[column])[order])
+        with open(os.path.join(out_dir, "meta.json"), "w") as f:
+            json.dump({"count": count, "catalog_build_id": catalog.build_id, "nlist": nlist, "nprobe": nprobe}, f)
+
+        return cls(out_dir)
+
+    def search(self, columns: np.ndarray, target: np.ndarray, k: int = 10, nprobe: Optional[int] = None,
+               category_codes: Optional[dict] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Find approximate nearest catalog rows.
+
+        Args:
+            columns: Feature column indices the target constrains
+            target: Scaled target values for those columns
+            k: Number of results
+            nprobe: Number of partitions to scan
+            category_codes: Optional {"language": [codes], "genre": [codes]} filters
+
+        Returns:
+            (catalog_row_ids, squared_distances), closest first
+        """
+        nprobe = min(nprobe or self.nprobe, len(self.centroids))
+        centroid_diff = self.centroids[:, columns] - target
+        probes = np.argpartition(np.einsum("ij,ij->i", centroid_diff, centroid_diff), nprobe - 1)[:nprobe]
+
+        ranges = [(self.list_offsets[p], self.list_offsets[p + 1]) for p in probes]
+        ranges = [(start, stop) for start, stop in ranges if stop > start]
+        if not ranges:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+
+        positions = np.concatenate([np.arange(start, stop) for start, stop in ranges])
+        diff = self.vectors[positions][:, columns] - target
+        distance = np.einsum("ij,ij->i", diff, diff)
+
+        for column, codes in (category_codes or {}).items():
+            distance[~np.isin(self.categories[column][positions], codes)] = np.inf
+
+        if len(distance) > k:
+            top = np.argpartition(distance, k)[:k]
+        else:
+            top = np.arange(len(distance))
+        top = top[np.argsort(distance[top], kind="stable")]
+        top = top[np.isfinite(distance[top])]
+        return np.asarray(self.row_ids[positions[top]]), distance[top]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build an IVF index for a local track catalog")
+    parser.add_argument("catalog", help="Catalog directory")
+    parser.add_argument("--nlist", type=int, help="Number of partitions (default ~sqrt(n))")
+    parser.add_argument("--nprobe", type=int, default=8, help="Default partitions scanned per query")
+    args = parser.parse_args()
+
+    catalog = TrackCatalog(args.catalog)
+    started = time.perf_counter()
+    index = IVFIndex.build(catalog, os.path.join(args.catalog, "ivf"), nlist=args.nlist, nprobe=args.nprobe)
+    print(f"Built IVF index with {index.meta['nlist']} lists over {len(catalog)} tracks "
+          f"in {time.perf_counter() - started:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,83 +1,114 @@
-from flask import Flask, request, jsonify
+import startup  # first import, so the startup clock covers everything below
+from flask import Flask, Response, g, request, jsonify, stream_with_context
 from flask_cors import CORS
-from emotion_detector import EmotionDetector
-from recommender import MoodIntensifyingRecommender
+from metrics import REGISTRY
+from tracing import (HTTP_FIRST_BYTE_SECONDS, HTTP_REQUEST_SECONDS, TRACE_REQUEST_HEADER, TRACE_RESPONSE_HEADER,
+                     end_trace, stage, start_trace)
+import config
+from services import (emotion_detector, engine, format_recommendations, format_song, parse_recommend_request,
+                      recommender, start_background_tasks, stream_event, stream_timings)
 import os
-from dotenv import load_dotenv
 import logging
+import json
+import time
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# Load environment variables
-load_dotenv()
-
 # Initialize Flask app
 app = Flask(__name__)
 CORS(app)  # Enable CORS for all routes
 
-# Path to local model
-model_path = os.path.join(os.path.dirname(__file__), "models", "emotion_model")
+# In pre-fork mode (gunicorn.conf.py) threads must not run in the parent;
+# each worker starts its own after fork
+if not config.PREFORK:
+    start_background_tasks()
+
+@app.before_request
+def start_request_timer():
+    """Start the request clock, and a trace if one was asked for"""
+    g.request_started = time.perf_counter()
+    g.trace_token = None
+    if config.TRACE_HEADER and TRACE_REQUEST_HEADER in request.headers:
+        g.trace_token = start_trace()
 
-# Initialize emotion detector and recommender
-try:
-    emotion_detector = EmotionDetector(model_path)
-    recommender = MoodIntensifyingRecommender(model_path)
-    logger.info("Emotion detector and recommender initialized successfully")
-except Exception as e:
-    logger.error(f"Error initializing components: {str(e)}")
-    raise
+@app.after_request
+def observe_request(response):
+    """Record the request duration and attach the trace headers"""
+    if g.get("trace_token") is not None:
+        trace = end_trace(g.trace_token)
+        g.trace_token = None
+        response.headers["Server-Timing"] = trace.server_timing()
+        response.headers[TRACE_RESPONSE_HEADER] = trace.to_json()
+    if "request_started" in g:
+        route = request.url_rule.rule if request.url_rule is not None else "unmatched"
+        HTTP_REQUEST_SECONDS.observe(time.perf_counter() - g.request_started,
+                                     route=route, status=response.status_code)
+    return response
+
+@app.teardown_request
+def discard_trace(exc):
+    """Drop the trace if the request failed before after_request ran"""
+    if g.get("trace_token") is not None:
+        end_trace(g.trace_token)
 
 @app.route('/health', methods=['GET'])
 def health_check():
     """Endpoint to check if the API is running"""
     return jsonify({"status": "healthy", "message": "API is running"}), 200
 
+@app.route('/ready', methods=['GET'])
+def readiness_check():
+    """Endpoint to check if the worker can serve recommendations (model loaded and warmed up)"""
+    ready = engine.loaded
+    body = {"status": "ready" if ready else "loading", "startup": startup.report(), "warmup": engine.warmup_report}
+    return jsonify(body), 200 if ready else 503
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """Expose process metrics in Prometheus text format"""
+    return Response(REGISTRY.render(), mimetype="text/plain; version=0.0.4")
+
 @app.route('/recommend', methods=['POST'])
 def recommend():
     """Main endpoint for song recommendations based on emotion"""
     try:
         # Get JSON data from request
-        data = request.json
-        
-        if not data or 'user_text' not in data:
-            return jsonify({"error": "Missing required field 'user_text'"}), 400
+        try:
+            params = parse_recommend_request(request.get_json(silent=True))
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
         
-        user_text = data['user_text']
-        languages = data.get('languages', ["hindi", "malayalam"])
+        user_text = params['user_text']
+        languages = params['languages']
+        use_clustering = params['use_clustering']
+        num_songs = params['num_songs']
         
         logger.info(f"Received recommendation request: {user_text[:50]}...")
         
-        # Detect emotion from text
-        emotion = emotion_detector.detect_emotion(user_text)
+        # Detect emotion from text (single forward pass, reused by the recommender)
+        with stage("emotion"):
+            emotion_result = emotion_detector.detect_emotion_with_scores(user_text)
+        emotion = emotion_result.emotion
         logger.info(f"Detected emotion: {emotion}")
         
         # Get song recommendations
-        raw_recommendations = recommender.recommend_for_text(
-            user_text, 
-            num_songs=5,
-            languages=languages
-        )
-        
-        # Format recommendations according to API specification
-        formatted_recommendations = []
-        for title, artist in raw_recommendations:
-            # Determine language (this implementation depends on your recommender's capabilities)
-            # For now, we'll alternate between Hindi and Malayalam as a placeholder
-            language = languages[len(formatted_recommendations) % len(languages)]
-            
-            formatted_recommendations.append({
-                "title": title,
-                "artist": artist,
-                "language": language
-            })
+        with stage("recommend"):
+            raw_recommendations = recommender.recommend_for_text(
+                user_text, 
+                num_songs=num_songs,
+                languages=languages,
+                emotion_result=emotion_result,
+                use_clustering=use_clustering
+            )
         
         # Return response
-        response = {
-            "emotion": emotion,
-            "recommendations": formatted_recommendations
-        }
+        with stage("format"):
+            response = {
+                "emotion": emotion,
+                "recommendations": format_recommendations(raw_recommendations)
+            }
         
         return jsonify(response), 200
         
@@ -85,6 +116,85 @@ def recommend():
         logger.error(f"Error processing recommendation request: {str(e)}")
         return jsonify({"error": str(e)}), 500
 
+@app.route('/recommend/stream', methods=['POST'])
+def recommend_stream():
+    """
+    Streamed /recommend, as NDJSON events: the detected emotion and scores as
+    soon as inference finishes, then each recommendation as soon as it is
+    found, then "done" with the time-to-first-byte and total timings
+    """
+    try:
+        params = parse_recommend_request(request.get_json(silent=True))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    
+    user_text = params['user_text']
+    languages = params['languages']
+    use_clustering = params['use_clustering']
+    num_songs = params['num_songs']
+    started = g.request_started
+    
+    logger.info(f"Received streamed recommendation request: {user_text[:50]}...")
+    
+    def generate():
+        try:
+            emotion_result = emotion_detector.detect_emotion_with_scores(user_text)
+            yield stream_event("emotion", emotion=emotion_result.emotion, label=emotion_result.label,
+                               scores=emotion_result.scores)
+            # The generator resumes once the server has written the event
+            first_byte = time.perf_counter() - started
+            HTTP_FIRST_BYTE_SECONDS.observe(first_byte, route="/recommend/stream")
+            
+            first_recommendation = None
+            count = 0
+            for song in recommender.iter_recommendations(emotion_result, num_songs, languages, use_clustering):
+                yield stream_event("recommendation", index=count, **format_song(song))
+                if first_recommendation is None:
+                    first_recommendation = time.perf_counter() - started
+                count += 1
+            
+            yield stream_event("done", count=count,
+                               **stream_timings(started, first_byte, first_recommendation, "/recommend/stream"))
+        except Exception as e:
+            logger.error(f"Error processing streamed recommendation request: {str(e)}")
+            yield stream_event("error", error=str(e))
+    
+    # Ask proxies not to buffer, or the events would arrive all at once
+    return Response(stream_with_context(generate()), mimetype="application/x-ndjson",
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@app.route('/recommend/batch', methods=['POST'])
+def recommend_batch():
+    """Bulk recommendations for many texts, streamed back as NDJSON (one line per text)"""
+    try:
+        params = parse_recommend_request(request.get_json(silent=True), batch=True)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    
+    texts = params['texts']
+    languages = params['languages']
+    num_songs = params['num_songs']
+    
+    logger.info(f"Received batch recommendation request for {len(texts)} texts")
+    
+    def generate():
+        try:
+            for index, emotion_result, raw_recommendations in recommender.recommend_for_texts(
+                texts,
+                num_songs=num_songs,
+                languages=languages
+            ):
+                yield json.dumps({
+                    "index": index,
+                    "emotion": emotion_result.emotion,
+                    "recommendations": format_recommendations(raw_recommendations)
+                }) + "\n"
+        except Exception as e:
+            logger.error(f"Error processing batch recommendation request: {str(e)}")
+            yield json.dumps({"error": str(e)}) + "\n"
+    
+    return Response(stream_with_context(generate()), mimetype="application/x-ndjson")
+
 if __name__ == '__main__':
     port = int(os.environ.get('PORT', 5000))
     app.run(host='0.0.0.0', port=port, debug=True)
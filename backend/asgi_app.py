@@ -0,0 +1,340 @@
+"""
+Async (ASGI) serving mode with the same HTTP contract as app.py.
+
+Emotion inference and the in-memory recommendation sources run on a bounded
+thread pool; live Spotify searches go through an async HTTP client, so one
+process holds many in-flight requests without a thread per request.
+
+    pip install -r requirements-async.txt
+    uvicorn asgi_app:app --host 0.0.0.0 --port 5000
+"""
+import asyncio
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+
+from starlette.applications import Starlette
+from starlette.middleware import Middleware
+from starlette.middleware.cors import CORSMiddleware
+from starlette.requests import Request
+from starlette.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from starlette.routing import Route
+
+import config
+import startup
+from async_spotify import AsyncSpotifyWebAPI
+from metrics import REGISTRY
+from recommender import CLUSTERING_SECONDS
+from records import Song
+from services import (engine, format_recommendations, format_song, parse_recommend_request, recommender,
+                      start_background_tasks, stream_event, stream_timings)
+from token_manager import get_token_manager
+from tracing import (HTTP_FIRST_BYTE_SECONDS, HTTP_REQUEST_SECONDS, TRACE_REQUEST_HEADER, TRACE_RESPONSE_HEADER,
+                     current_trace, end_trace, in_context, stage, start_trace)
+
+logger = logging.getLogger(__name__)
+
+INFERENCE_QUEUE = REGISTRY.gauge(
+    "asgi_inference_pending", "Requests waiting for or running on the inference executor")
+
+# In pre-fork mode (gunicorn.conf.py) threads must not run in the parent;
+# each worker starts its own after fork
+if not config.PREFORK:
+    start_background_tasks()
+
+executor = ThreadPoolExecutor(max_workers=config.ASGI_INFERENCE_WORKERS, thread_name_prefix="inference")
+spotify = None
+_inference_slots = None
+_pending = 0
+
+
+async def run_inference(fn, *args):
+    """Run blocking work on the inference executor; at most ASGI_MAX_PENDING_INFERENCE calls are queued on it."""
+    global _pending
+    _pending += 1
+    INFERENCE_QUEUE.set(_pending)
+    try:
+        async with _inference_slots:
+            # run_in_executor does not carry contextvars over, so bind the request's trace explicitly
+            return await asyncio.get_running_loop().run_in_executor(executor, in_context(fn, *args))
+    finally:
+        _pending -= 1
+        INFERENCE_QUEUE.set(_pending)
+
+
+async def read_json(request):
+    """The decoded JSON body, or None if it is not valid JSON."""
+    try:
+        return await request.json()
+    except ValueError:
+        return None
+
+
+def classify_and_recommend_offline(user_text, num_songs, languages, use_clustering):
+    with stage("emotion"):
+        emotion_result = engine.classify(user_text)
+    return emotion_result, recommender.recommend_offline(emotion_result, num_songs, languages, use_clustering)
+
+
+async def fetch_candidate_tracks(emotion, num_songs, market="US"):
+    """Async version of MoodIntensifyingRecommender.fetch_candidate_tracks."""
+    all_tracks = []
+    for tracks in await spotify.search_many(recommender.candidate_queries(emotion), market=market):
+        all_tracks.extend(tracks)
+    for query, limit in recommender.fallback_queries(emotion, num_songs):
+        if all_tracks:
+            break
+        all_tracks = await spotify.search_tracks(query, limit=limit, market=market)
+    return all_tracks
+
+
+async def stream_candidate_songs(emotion, num_songs, market="US"):
+    """Async version of MoodIntensifyingRecommender.stream_candidate_songs."""
+    seen = set()
+    searches = spotify.search_as_completed(recommender.candidate_queries(emotion), market=market)
+    try:
+        async for _, tracks in searches:
+            for track in tracks:
+                song = Song(track.name, track.artist)
+                if song not in seen:
+                    seen.add(song)
+                    yield song
+                    if len(seen) == num_songs:
+                        return
+    finally:
+        await searches.aclose()
+
+    for query, limit in recommender.fallback_queries(emotion, num_songs):
+        if seen:
+            break
+        songs = recommender.format_tracks(await spotify.search_tracks(query, limit=limit, market=market), num_songs)
+        seen.update(songs)
+        for song in songs:
+            yield song
+
+
+async def cluster_candidate_tracks(tracks, emotion):
+    started = time.perf_counter()
+    with stage("clustering"):
+        features = await spotify.get_audio_features([track.id for track in tracks if track.id])
+        clustered = await run_inference(recommender.cluster_songs, tracks, features, emotion) or tracks
+    CLUSTERING_SECONDS.observe(time.perf_counter() - started)
+    return clustered
+
+
+async def health_check(request: Request):
+    """Endpoint to check if the API is running"""
+    return JSONResponse({"status": "healthy", "message": "API is running"})
+
+
+async def readiness_check(request: Request):
+    """Endpoint to check if the worker can serve recommendations (model loaded and warmed up)"""
+    ready = engine.loaded
+    body = {"status": "ready" if ready else "loading", "startup": startup.report(), "warmup": engine.warmup_report}
+    return JSONResponse(body, status_code=200 if ready else 503)
+
+
+async def metrics(request: Request):
+    """Expose process metrics in Prometheus text format"""
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4")
+
+
+async def recommend(request: Request):
+    """Main endpoint for song recommendations based on emotion"""
+    try:
+        try:
+            params = parse_recommend_request(await read_json(request))
+        except ValueError as e:
+            return JSONResponse({"error": str(e)}, status_code=400)
+
+        user_text = params['user_text']
+        languages = params['languages']
+        use_clustering = params['use_clustering']
+        num_songs = params['num_songs']
+
+        logger.info(f"Received recommendation request: {user_text[:50]}...")
+
+        emotion_result, raw_recommendations = await run_inference(
+            classify_and_recommend_offline, user_text, num_songs, languages, use_clustering)
+        logger.info(f"Detected emotion: {emotion_result.emotion}")
+
+        if raw_recommendations is None:
+            with stage("spotify_candidates"):
+                tracks = await fetch_candidate_tracks(emotion_result.label, num_songs)
+            if not tracks:
+                # May scan the local catalog: not on the event loop
+                raw_recommendations = await run_inference(recommender.recommend_local_fallback,
+                                                          emotion_result, num_songs)
+            else:
+                if use_clustering:
+                    tracks = await cluster_candidate_tracks(tracks, emotion_result.label)
+                raw_recommendations = recommender.format_tracks(tracks, num_songs)
+
+        with stage("format"):
+            body = {
+                "emotion": emotion_result.emotion,
+                "recommendations": format_recommendations(raw_recommendations)
+            }
+        return JSONResponse(body)
+
+    except Exception as e:
+        logger.error(f"Error processing recommendation request: {str(e)}")
+        return JSONResponse({"error": str(e)}, status_code=500)
+
+
+async def iter_recommendations(emotion_result, num_songs, languages, use_clustering):
+    """Async version of MoodIntensifyingRecommender.iter_recommendations."""
+    recommendations = await run_inference(
+        recommender.recommend_offline, emotion_result, num_songs, languages, use_clustering)
+    if recommendations is None:
+        if use_clustering:
+            tracks = await fetch_candidate_tracks(emotion_result.label, num_songs)
+            if tracks:
+                tracks = await cluster_candidate_tracks(tracks, emotion_result.label)
+            recommendations = recommender.format_tracks(tracks, num_songs)
+        else:
+            # Pass each Spotify song on as soon as its search returns
+            recommendations = []
+            songs = stream_candidate_songs(emotion_result.label, num_songs)
+            try:
+                async for song in songs:
+                    recommendations.append(song)
+                    yield song
+            finally:
+                await songs.aclose()
+            if recommendations:
+                return
+        if not recommendations:
+            # May scan the local catalog: not on the event loop
+            recommendations = await run_inference(recommender.recommend_local_fallback, emotion_result, num_songs)
+    for song in recommendations:
+        yield song
+
+
+async def recommend_stream(request: Request):
+    """
+    Streamed /recommend, as NDJSON events: the detected emotion and scores as
+    soon as inference finishes, then each recommendation as soon as it is
+    found, then "done" with the time-to-first-byte and total timings
+    """
+    try:
+        params = parse_recommend_request(await read_json(request))
+    except ValueError as e:
+        return JSONResponse({"error": str(e)}, status_code=400)
+
+    user_text = params['user_text']
+    languages = params['languages']
+    use_clustering = params['use_clustering']
+    num_songs = params['num_songs']
+    started = request.state.started
+
+    logger.info(f"Received streamed recommendation request: {user_text[:50]}...")
+
+    async def generate():
+        try:
+            emotion_result = await run_inference(engine.classify, user_text)
+            yield stream_event("emotion", emotion=emotion_result.emotion, label=emotion_result.label,
+                               scores=emotion_result.scores)
+            # The generator resumes once the server has sent the event
+            first_byte = time.perf_counter() - started
+            HTTP_FIRST_BYTE_SECONDS.observe(first_byte, route="/recommend/stream")
+
+            first_recommendation = None
+            count = 0
+            async for song in iter_recommendations(emotion_result, num_songs, languages, use_clustering):
+                yield stream_event("recommendation", index=count, **format_song(song))
+                if first_recommendation is None:
+                    first_recommendation = time.perf_counter() - started
+                count += 1
+
+            yield stream_event("done", count=count,
+                               **stream_timings(started, first_byte, first_recommendation, "/recommend/stream"))
+        except Exception as e:
+            logger.error(f"Error processing streamed recommendation request: {str(e)}")
+            yield stream_event("error", error=str(e))
+
+    # Ask proxies not to buffer, or the events would arrive all at once
+    return StreamingResponse(generate(), media_type="application/x-ndjson",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
+class RequestTimingMiddleware:
+    """
+    Records http_request_seconds for every request and, when TRACE_HEADER is
+    enabled and the client sends X-Debug-Trace, returns the request's stage
+    timings in Server-Timing and X-Debug-Trace response headers.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        # Read by handlers as request.state.started
+        scope.setdefault("state", {})["started"] = started
+        status = 500
+        token = trace = None
+        if config.TRACE_HEADER and TRACE_REQUEST_HEADER.lower().encode() in dict(scope["headers"]):
+            token = start_trace()
+            trace = current_trace()
+
+        async def send_with_timing(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                if trace is not None:
+                    message["headers"] = list(message.get("headers", [])) + [
+                        (b"server-timing", trace.server_timing().encode()),
+                        (TRACE_RESPONSE_HEADER.lower().encode(), trace.to_json().encode()),
+                    ]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            if token is not None:
+                end_trace(token)
+            route = scope["path"] if scope["path"] in ROUTE_PATHS else "unmatched"
+            HTTP_REQUEST_SECONDS.observe(time.perf_counter() - started, route=route, status=status)
+
+
+@asynccontextmanager
+async def lifespan(app):
+    global spotify, _inference_slots
+    _inference_slots = asyncio.Semaphore(config.ASGI_MAX_PENDING_INFERENCE)
+    spotify = AsyncSpotifyWebAPI(get_token_manager().get_token,
+                                 search_cache=recommender.spotify.search_cache,
+                                 features_cache=recommender.spotify.features_cache)
+    try:
+        yield
+    finally:
+        await spotify.aclose()
+        executor.shutdown(wait=False)
+
+
+routes = [
+    Route('/health', health_check, methods=['GET']),
+    Route('/ready', readiness_check, methods=['GET']),
+    Route('/metrics', metrics, methods=['GET']),
+    Route('/recommend', recommend, methods=['POST']),
+    Route('/recommend/stream', recommend_stream, methods=['POST']),
+]
+ROUTE_PATHS = {route.path for route in routes}
+
+app = Starlette(
+    routes=routes,
+    middleware=[Middleware(RequestTimingMiddleware),
+                Middleware(CORSMiddleware, allow_origins=["*"], allow_methods=["*"], allow_headers=["*"])],
+    lifespan=lifespan,
+)
+
+if __name__ == '__main__':
+    import uvicorn
+
+    uvicorn.run(app, host='0.0.0.0', port=int(os.environ.get('PORT', 5000)))
@@ -0,0 +1,255 @@
+import asyncio
+import time
+from typing import AsyncIterator, Callable, Dict, List, Optional, Sequence, Tuple
+
+import httpx
+import requests
+
+import config
+from cache import TTLCache
+from spotify_api import SPOTIFY_REQUEST_SECONDS, SPOTIFY_REQUESTS, SPOTIFY_RETRIES
+from records import AudioFeatures, Track, parse_audio_features, parse_search
+from spotify_guard import AsyncSingleFlight, SpotifyGuard, SpotifyUnavailable, get_spotify_guard
+from tracing import stage
+
+
+class AsyncSpotifyWebAPI:
+    """
+    asyncio counterpart of SpotifyWebAPI for the ASGI serving mode.
+
+    Uses one pooled httpx.AsyncClient, so hundreds of searches can be in
+    flight on a single event loop without a thread each. It shares the
+    search and audio-feature caches of a SpotifyWebAPI instance, so the
+    sync and async paths (and candidate pool refreshes) warm each other,
+    and the process-wide SpotifyGuard, so both paths share one rate limit and
+    circuit breaker.
+    """
+
+    SEARCH_URL = f"{config.SPOTIFY_API_URL}/v1/search"
+    AUDIO_FEATURES_URL = f"{config.SPOTIFY_API_URL}/v1/audio-features"
+
+    def __init__(self, token_provider: Callable[[], str], search_cache: TTLCache, features_cache: TTLCache,
+                 max_connections: Optional[int] = None, guard: Optional[SpotifyGuard] = None):
+        """
+        Args:
+            token_provider: Callable returning a valid Spotify access token; it may
+                block, so it is called in the default executor
+            search_cache: Cache of search results shared with the sync client
+            features_cache: Cache of audio features shared with the sync client
+            max_connections: Maximum number of concurrent connections
+            guard: Rate limiter and circuit breaker, defaults to the process-wide one
+        """
+        self.token_provider = token_provider
+        self.guard = guard or get_spotify_guard()
+        self._searches = AsyncSingleFlight("search")
+        self._feature_chunks = AsyncSingleFlight("audio_features")
+        self.search_cache = search_cache
+        self.features_cache = features_cache
+        max_connections = max_connections or config.ASGI_SPOTIFY_MAX_CONNECTIONS
+        self.client = httpx.AsyncClient(
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections),
+            timeout=config.SPOTIFY_REQUEST_TIMEOUT_S,
+        )
+
+    async def aclose(self):
+        await self.client.aclose()
+
+    async def _headers(self) -> Dict[str, str]:
+        """
+        Raises:
+            SpotifyUnavailable: If no token can be obtained (accounts service down, or no credentials)
+        """
+        try:
+            token = await asyncio.get_running_loop().run_in_executor(None, self.token_provider)
+        except requests.exceptions.RequestException as e:
+            raise SpotifyUnavailable(f"No Spotify access token: {e}") from e
+        return {"Authorization": f"Bearer {token}"}
+
+    async def _get(self, endpoint: str, url: str, headers: Dict[str, str], params: Dict,
+                   timeout: Optional[float] = None) -> httpx.Response:
+        """
+        GET a Web API URL within timeout seconds, retrying 429s, server errors and network errors.
+
+        Raises:
+            SpotifyUnavailable: If the guard refuses the call (circuit open, or rate limited past the timeout)
+            httpx.HTTPError: If the last attempt failed
+        """
+        deadline = time.monotonic() + (timeout or config.SPOTIFY_REQUEST_TIMEOUT_S)
+        attempt = 0
+        while True:
+            wait = self.guard.admit(deadline - time.monotonic())
+            if wait:
+                await asyncio.sleep(wait)
+            try:
+                response = await self._send(endpoint, url, headers, params, deadline - time.monotonic())
+            except httpx.HTTPError:
+                delay = self.guard.failed(endpoint, attempt)
+                if delay is None or time.monotonic() + delay >= deadline:
+                    raise
+            except BaseException:
+                # Including cancellation at a search deadline
+                self.guard.abandoned()
+                raise
+            else:
+                delay = self.guard.completed(endpoint, response.status_code,
+                                             response.headers.get("Retry-After"), attempt)
+                if delay is None or time.monotonic() + delay >= deadline:
+                    return response
+            SPOTIFY_RETRIES.inc(endpoint=endpoint)
+            await asyncio.sleep(delay)
+            attempt += 1
+
+    async def _send(self, endpoint: str, url: str, headers: Dict[str, str], params: Dict,
+                    timeout: float) -> httpx.Response:
+        """One GET, recording its duration, status and trace span under the endpoint name."""
+        started = time.perf_counter()
+        status = "error"
+        try:
+            with stage(f"spotify_{endpoint}"):
+                response = await self.client.get(url, headers=headers, params=params, timeout=timeout)
+            status = response.status_code
+            return response
+        finally:
+            SPOTIFY_REQUEST_SECONDS.observe(time.perf_counter() - started, endpoint=endpoint)
+            SPOTIFY_REQUESTS.inc(endpoint=endpoint, status=status)
+
+    async def search_tracks(self, query: str, limit: int = 20, market: str = "US",
+                            timeout: Optional[float] = None) -> List[Track]:
+        """
+        Search Spotify for tracks.
+
+        Returns:
+            A list of tracks, empty on error
+        """
+        return await self._search(query, limit, market, timeout)
+
+    async def _search(self, query: str, limit: int, market: str, timeout: Optional[float],
+                      headers: Optional[Dict[str, str]] = None) -> List[Track]:
+        key = f"{market}:{limit}:{query}"
+        tracks = self.search_cache.get(key)
+        if tracks is not None:
+            return tracks
+        return await self._searches.do(key, lambda: self._fetch_search(key, query, limit, market, timeout, headers))
+
+    async def _fetch_search(self, key: str, query: str, limit: int, market: str, timeout: Optional[float],
+                            headers: Optional[Dict[str, str]]) -> List[Track]:
+        params = {"q": query, "type": "track", "limit": limit, "market": market}
+        try:
+            headers = headers or await self._headers()
+            response = await self._get("search", self.SEARCH_URL, headers, params, timeout)
+        except (httpx.HTTPError, SpotifyUnavailable) as e:
+            print(f"Error searching Spotify: {e!r}")
+            return self.search_cache.get_stale(key, [])
+
+        if response.status_code != 200:
+            print(f"Error searching Spotify: {response.text}")
+            return self.search_cache.get_stale(key, [])
+
+        # Errors are not cached so they are retried on the next request
+        tracks = parse_search(response.content)
+        self.search_cache.set(key, tracks)
+        return tracks
+
+    async def search_as_completed(self, queries: Sequence[Tuple[str, int]], market: str = "US",
+                                  deadline: Optional[float] = None) -> AsyncIterator[Tuple[int, List[Track]]]:
+        """
+        Run several searches concurrently and yield each result as soon as it arrives.
+
+        Searches still running at the deadline, or when the caller stops
+        iterating, are cancelled; failed and cancelled searches are not yielded.
+
+        Yields:
+            (index in queries, tracks) pairs, in completion order
+        """
+        deadline = deadline or config.SPOTIFY_SEARCH_DEADLINE_S
+        started = time.monotonic()
+        # Fetch the token once for the whole fan-out
+        try:
+            headers = await self._headers()
+        except SpotifyUnavailable as e:
+            # Every search would fail the same way; the caller falls back to local results
+            print(f"Error searching Spotify: {e!r}")
+            return
+        tasks = {asyncio.ensure_future(self._search(query, limit, market, deadline, headers)): index
+                 for index, (query, limit) in enumerate(queries)}
+
+        pending = set(tasks)
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, timeout=deadline - (time.monotonic() - started),
+                                                   return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    print(f"Spotify search deadline of {deadline}s hit after {time.monotonic() - started:.2f}s; "
+                          f"using {len(tasks) - len(pending)}/{len(tasks)} results")
+                    break
+                for task in done:
+                    if task.exception() is None:
+                        yield tasks[task], task.result()
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def search_many(self, queries: Sequence[Tuple[str, int]], market: str = "US",
+                          deadline: Optional[float] = None) -> List[List[Track]]:
+        """
+        Run several searches concurrently and wait for them up to a deadline.
+
+        Searches still running at the deadline are cancelled and yield [].
+
+        Returns:
+            One list of tracks per query, in the same order as queries
+        """
+        results = [[] for _ in queries]
+        async for index, tracks in self.search_as_completed(queries, market, deadline):
+            results[index] = tracks
+        return results
+
+    async def get_audio_features(self, track_ids: List[str]) -> List[AudioFeatures]:
+        """
+        Get audio features for multiple tracks, fetching uncached chunks of 100 concurrently.
+
+        Returns:
+            Audio features for each track found
+        """
+        features_by_id = {}
+        missing = []
+        for track_id in dict.fromkeys(track_ids):
+            feature = self.features_cache.get(track_id)
+            if feature is not None:
+                features_by_id[track_id] = feature
+            else:
+                missing.append(track_id)
+
+        headers = None
+        if missing:
+            try:
+                headers = await self._headers()
+            except SpotifyUnavailable as e:
+                print(f"Error fetching audio features: {e!r}")
+                for feature in map(self.features_cache.get_stale, missing):
+                    if feature:
+                        features_by_id[feature.id] = feature
+                missing = []
+
+        async def fetch(chunk):
+            try:
+                response = await self._get("audio_features", self.AUDIO_FEATURES_URL, headers,
+                                           {"ids": ",".join(chunk)})
+            except (httpx.HTTPError, SpotifyUnavailable) as e:
+                print(f"Error fetching audio features: {e!r}")
+                return list(map(self.features_cache.get_stale, chunk))
+            if response.status_code != 200:
+                print(f"Error fetching audio features: {response.text}")
+                return list(map(self.features_cache.get_stale, chunk))
+            features = parse_audio_features(response.content)
+            self.features_cache.set_many({feature.id: feature for feature in features})
+            return features
+
+        chunks = [tuple(missing[i:i + 100]) for i in range(0, len(missing), 100)]
+        for features in await asyncio.gather(*(self._feature_chunks.do(chunk, lambda chunk=chunk: fetch(chunk))
+                                               for chunk in chunks)):
+            for feature in features:
+                if feature:
+                    features_by_id[feature.id] = feature
+
+        return [features_by_id[track_id] for track_id in track_ids if track_id in features_by_id]
@@ -0,0 +1,109 @@
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Callable, List, Sequence
+
+import numpy as np
+
+from metrics import REGISTRY
+from tracing import current_trace, shared_trace
+
+BATCH_SIZE = REGISTRY.histogram(
+    "emotion_batch_size", "Number of texts per model forward pass",
+    buckets=(1, 2, 4, 8, 16, 32, 64, 128))
+BATCH_QUEUE_WAIT = REGISTRY.histogram(
+    "emotion_batch_queue_wait_seconds", "Time a text waits in the batching queue before inference")
+BATCH_INFERENCE = REGISTRY.histogram(
+    "emotion_batch_inference_seconds", "Duration of one batched forward pass")
+BATCH_WINDOW = REGISTRY.gauge(
+    "emotion_batch_window_seconds", "Configured batching window")
+BATCH_MAX_SIZE = REGISTRY.gauge(
+    "emotion_batch_max_size", "Configured maximum batch size")
+
+
+class MicroBatcher:
+    """
+    Collects texts from concurrent callers and runs them through the model together.
+
+    A batch is flushed when it reaches max_batch_size or when max_wait_ms has
+    elapsed since its first text arrived, whichever comes first. Each caller
+    gets back only its own score vector.
+
+    Each text carries its caller's trace, so the time it waited in the queue
+    and the stages of its batch (tokenize, forward) show up in that
+    request's trace even though they run on the batcher thread.
+    """
+
+    def __init__(self, predict_fn: Callable[[List[str]], np.ndarray],
+                 max_batch_size: int = 32, max_wait_ms: float = 5.0):
+        """
+        Args:
+            predict_fn: Function mapping a list of texts to an array of scores,
+                one row per text
+            max_batch_size: Maximum number of texts per forward pass
+            max_wait_ms: Maximum time to wait for more texts after the first one
+        """
+        self.predict_fn = predict_fn
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max(0.0, max_wait_ms) / 1000.0
+        BATCH_WINDOW.set(self.max_wait)
+        BATCH_MAX_SIZE.set(self.max_batch_size)
+
+        self._start()
+        # Threads do not survive fork(): pre-fork workers get their own queue and thread
+        os.register_at_fork(after_in_child=self._start)
+
+    def _start(self):
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name="emotion-batcher", daemon=True)
+        self._thread.start()
+
+    def submit(self, text: str) -> Future:
+        """Queue a text for classification and return a future for its scores."""
+        future = Future()
+        self._queue.put((text, future, time.perf_counter(), current_trace()))
+        return future
+
+    def predict(self, texts: Sequence[str]) -> np.ndarray:
+        """Classify texts through the batching queue, blocking until all are done."""
+        futures = [self.submit(text) for text in texts]
+        return np.stack([future.result() for future in futures])
+
+    def _collect(self):
+        """Block for the first item, then gather more until the window or size limit is hit."""
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            started = time.perf_counter()
+            for _, _, enqueued, trace in batch:
+                BATCH_QUEUE_WAIT.observe(started - enqueued)
+                if trace is not None:
+                    trace.add("batch_queue", enqueued, started - enqueued)
+            BATCH_SIZE.observe(len(batch))
+
+            try:
+                with shared_trace([trace for _, _, _, trace in batch]):
+                    scores = self.predict_fn([text for text, _, _, _ in batch])
+            except Exception as e:
+                for _, future, _, _ in batch:
+                    future.set_exception(e)
+                continue
+            finally:
+                BATCH_INFERENCE.observe(time.perf_counter() - started)
+
+            for (_, future, _, _), row in zip(batch, scores):
+                future.set_result(row)
@@ -0,0 +1,85 @@
+"""
+Benchmark the IVF index against exact search on a local track catalog.
+
+Reports index build time, recall@k and query latency (p50/p99) for several
+nprobe values, using MoodMapper targets plus random full-feature targets.
+
+    python benchmarks/bench_ann.py data/catalog --nprobe 1 4 8 16 --queries 500
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from ann_index import IVFIndex  # noqa: E402
+from catalog import FEATURE_COLUMNS, TrackCatalog  # noqa: E402
+from mood_mapper import MoodMapper  # noqa: E402
+
+
+def make_queries(count, seed=0):
+    """MoodMapper targets for every emotion plus random targets over all features."""
+    rng = np.random.default_rng(seed)
+    mapper = MoodMapper()
+    queries = [mapper.get_features_for_emotion(emotion) for emotion in mapper.emotion_features]
+    while len(queries) < count:
+        target = {f"target_{column}": float(rng.random()) for column in FEATURE_COLUMNS}
+        target["target_tempo"] = float(rng.uniform(60, 200))
+        target["target_mode"] = int(rng.integers(0, 2))
+        queries.append(target)
+    return queries[:count]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("catalog", help="Catalog directory")
+    parser.add_argument("-k", type=int, default=10)
+    parser.add_argument("--nlist", type=int)
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[1, 4, 8, 16, 32])
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--rebuild", action="store_true", help="Rebuild the index even if one exists")
+    parser.add_argument("--json", help="Write results to this JSON file")
+    args = parser.parse_args()
+
+    catalog = TrackCatalog(args.catalog)
+    index_dir = os.path.join(args.catalog, "ivf")
+
+    build_seconds = None
+    if args.rebuild or catalog.index is None:
+        started = time.perf_counter()
+        IVFIndex.build(catalog, index_dir, nlist=args.nlist)
+        build_seconds = time.perf_counter() - started
+    index = IVFIndex(index_dir)
+
+    queries = [catalog.target_vector(target) for target in make_queries(args.queries)]
+    exact = [set(catalog.nearest_rows(columns, target, args.k)[0].tolist()) for columns, target in queries]
+
+    results = {"tracks": len(catalog), "nlist": index.meta["nlist"], "k": args.k,
+               "build_seconds": build_seconds, "runs": []}
+    print(f"tracks={len(catalog)} nlist={index.meta['nlist']} k={args.k} "
+          f"build={'reused' if build_seconds is None else f'{build_seconds:.2f}s'}")
+    print(f"{'nprobe':>6} {'recall@k':>9} {'p50 ms':>8} {'p99 ms':>8}")
+
+    for nprobe in args.nprobe:
+        latencies, hits = [], 0
+        for (columns, target), truth in zip(queries, exact):
+            started = time.perf_counter()
+            rows, _ = index.search(columns, target, args.k, nprobe=nprobe)
+            latencies.append((time.perf_counter() - started) * 1000)
+            hits += len(truth.intersection(rows.tolist()))
+        recall = hits / max(1, sum(len(truth) for truth in exact))
+        p50, p99 = np.percentile(latencies, [50, 99])
+        results["runs"].append({"nprobe": nprobe, "recall": recall, "p50_ms": p50, "p99_ms": p99})
+        print(f"{nprobe:>6} {recall:>9.3f} {p50:>8.3f} {p99:>8.3f}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""
+Benchmark emotion inference backends: load time, resident memory and latency.
+
+Each backend runs in a fresh interpreter so import cost and RSS are not
+shared between them. Latency is measured on the forward pass only
+(tokenization excluded) at several batch sizes.
+
+    python benchmarks/bench_backends.py --backends tf onnx onnx-int8 --json backends.json
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+CORPUS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "emotion_corpus.txt")
+
+WORKER_SCRIPT = """
+import json, sys, time
+import numpy as np
+
+def rss_mb():
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) / 1024
+    return None
+
+name, model_path, corpus, iterations = sys.argv[1], sys.argv[2], sys.argv[3], int(sys.argv[4])
+batch_sizes = [int(b) for b in sys.argv[5].split(",")]
+baseline = rss_mb()
+started = time.perf_counter()
+from transformers import AutoTokenizer
+from inference_backends import create_backend
+tokenizer = AutoTokenizer.from_pretrained(model_path)
+backend = create_backend(name, model_path)
+load_seconds = time.perf_counter() - started
+
+texts = [line.strip() for line in open(corpus, encoding="utf-8") if line.strip()]
+latency = {}
+for batch_size in batch_sizes:
+    batch = (texts * batch_size)[:batch_size]
+    encoded = tokenizer(batch, return_tensors="np", padding=True, truncation=True, max_length=512)
+    backend.predict_logits(encoded)  # warm-up
+    samples = []
+    for _ in range(iterations):
+        t = time.perf_counter()
+        backend.predict_logits(encoded)
+        samples.append((time.perf_counter() - t) * 1000)
+    latency[str(batch_size)] = {"p50_ms": float(np.percentile(samples, 50)),
+                                "p99_ms": float(np.percentile(samples, 99))}
+
+print(json.dumps({"backend": name, "load_seconds": load_seconds, "rss_mb": rss_mb(),
+                  "rss_delta_mb": rss_mb() - baseline, "latency": latency}))
+"""
+
+
+def run_backend(name, model_path, iterations, batch_sizes):
+    result = subprocess.run([sys.executable, "-c", WORKER_SCRIPT, name, model_path, CORPUS,
+                             str(iterations), ",".join(map(str, batch_sizes))],
+                            cwd=BACKEND_DIR, capture_output=True, text=True)
+    if result.returncode != 0:
+        return {"backend": name, "error": result.stderr.strip().splitlines()[-1:]}
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark emotion inference backends")
+    parser.add_argument("--backends", nargs="+", default=["tf", "onnx", "onnx-int8"])
+    parser.add_argument("--model-path", default=os.path.join(BACKEND_DIR, "models", "emotion_model"))
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 8])
+    parser.add_argument("--iterations", type=int, default=50)
+    parser.add_argument("--json", help="Write results to this file")
+    args = parser.parse_args()
+
+    results = [run_backend(name, args.model_path, args.iterations, args.batch_sizes) for name in args.backends]
+
+    print(f"{'backend':<10} {'load s':>7} {'rss MB':>8} " +
+          " ".join(f"{'b' + str(b) + ' p50':>9} {'p99':>7}" for b in args.batch_sizes))
+    for result in results:
+        if "error" in result:
+            print(f"{result['backend']:<10} failed: {' '.join(result['error'])}")
+            continue
+        print(f"{result['backend']:<10} {result['load_seconds']:>7.2f} {result['rss_mb']:>8.0f} " +
+              " ".join(f"{result['latency'][str(b)]['p50_ms']:>9.2f} {result['latency'][str(b)]['p99_ms']:>7.2f}"
+                       for b in args.batch_sizes))
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
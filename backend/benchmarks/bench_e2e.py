@@ -0,0 +1,286 @@
+"""
+Deterministic end-to-end benchmark suite against the local Spotify stand-in.
+
+Drives MoodIntensifyingRecommender.recommend_for_text in-process ("direct")
+and POST /recommend on the Flask and/or ASGI app ("flask", "asgi") at fixed
+concurrency levels, with a fixed number of requests over the texts in
+emotion_corpus.txt. Spotify is served by stub_spotify.py with configurable
+latency, errors and 429s, and the Spotify search and emotion caches are
+disabled unless --warm-caches is given, so every request pays for the model
+and the network.
+
+Per run it records throughput, latency percentiles, model time
+(emotion_forward_seconds) and Spotify time (spotify_request_seconds; the
+searches of one request overlap, so this sum can exceed the latency) per
+request, and process RSS / peak RSS. Results are saved as JSON; --compare
+diffs two result files and fails on throughput or p99 regressions.
+
+    python benchmarks/bench_e2e.py --targets direct flask --concurrency 1 8 32 --json e2e.json
+    python benchmarks/bench_e2e.py --compare baseline.json e2e.json --max-regression 0.10
+"""
+import argparse
+import asyncio
+import json
+import os
+import re
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+BACKEND_DIR = os.path.join(BENCH_DIR, "..")
+sys.path.insert(0, BENCH_DIR)
+
+from stub_spotify import make_server  # noqa: E402
+
+TEXTS = [line.strip() for line in open(os.path.join(BENCH_DIR, "emotion_corpus.txt"), encoding="utf-8")
+         if line.strip()]
+
+SERVERS = {
+    "flask": ["-c", "import app, sys; app.app.run(host='127.0.0.1', port=int(sys.argv[1]), threaded=True)"],
+    "asgi": ["-m", "uvicorn", "asgi_app:app", "--host", "127.0.0.1", "--log-level", "warning", "--port"],
+}
+
+_SAMPLE = re.compile(r"^([a-zA-Z_:][a-zA-Z0-9_:]*)(\{[^}]*\})? (\S+)$")
+
+
+def metric_sums(text, names):
+    """Sum Prometheus samples by metric name over all label sets."""
+    sums = dict.fromkeys(names, 0.0)
+    for line in text.splitlines():
+        match = _SAMPLE.match(line)
+        if match and match.group(1) in sums:
+            sums[match.group(1)] += float(match.group(3))
+    return sums
+
+
+TIMING_METRICS = ["emotion_forward_seconds_sum", "spotify_request_seconds_sum", "spotify_request_seconds_count"]
+
+
+def memory_mb(pid="self"):
+    values = {}
+    with open(f"/proc/{pid}/status") as f:
+        for line in f:
+            if line.startswith(("VmRSS:", "VmHWM:")):
+                values[line.split(":")[0]] = int(line.split()[1]) / 1024
+    return {"rss_mb": values.get("VmRSS"), "peak_rss_mb": values.get("VmHWM")}
+
+
+def summarize(target, concurrency, latencies, errors, elapsed, before, after, memory):
+    latencies_ms = np.array(latencies) * 1000
+    completed = max(1, len(latencies) + errors)
+    percentile = (lambda q: float(np.percentile(latencies_ms, q))) if len(latencies_ms) else (lambda q: None)
+    return {
+        "target": target,
+        "concurrency": concurrency,
+        "requests": len(latencies),
+        "errors": errors,
+        "throughput_rps": len(latencies) / elapsed,
+        "p50_ms": percentile(50),
+        "p90_ms": percentile(90),
+        "p99_ms": percentile(99),
+        "model_ms_per_request": (after["emotion_forward_seconds_sum"]
+                                 - before["emotion_forward_seconds_sum"]) * 1000 / completed,
+        "spotify_ms_per_request": (after["spotify_request_seconds_sum"]
+                                   - before["spotify_request_seconds_sum"]) * 1000 / completed,
+        "spotify_calls_per_request": (after["spotify_request_seconds_count"]
+                                      - before["spotify_request_seconds_count"]) / completed,
+        **memory,
+    }
+
+
+def run_direct(concurrency_levels, args):
+    """Call recommend_for_text from a thread pool inside this process."""
+    sys.path.insert(0, BACKEND_DIR)
+    from inference_engine import get_engine
+    from metrics import REGISTRY
+    from recommender import MoodIntensifyingRecommender
+
+    model_path = os.path.join(BACKEND_DIR, "models", "emotion_model")
+    recommender = MoodIntensifyingRecommender(model_path, engine=get_engine(model_path))
+
+    def one(i):
+        started = time.perf_counter()
+        try:
+            recommender.recommend_for_text(TEXTS[i % len(TEXTS)], num_songs=5, languages=args.languages)
+        except Exception:
+            return None
+        return time.perf_counter() - started
+
+    # Warm-up: model, token and connection pool
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        list(pool.map(one, range(8)))
+
+    results = []
+    for concurrency in concurrency_levels:
+        before = metric_sums(REGISTRY.render(), TIMING_METRICS)
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            outcomes = list(pool.map(one, range(args.requests)))
+        elapsed = time.perf_counter() - started
+        after = metric_sums(REGISTRY.render(), TIMING_METRICS)
+        latencies = [o for o in outcomes if o is not None]
+        results.append(summarize("direct", concurrency, latencies, len(outcomes) - len(latencies),
+                                 elapsed, before, after, memory_mb()))
+    return results
+
+
+async def drive_fixed(url, concurrency, total, languages):
+    """Send exactly `total` requests from `concurrency` workers; return latencies, errors and elapsed time."""
+    import httpx
+
+    latencies, errors = [], 0
+    counter = iter(range(total))
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(limits=limits, timeout=60.0) as client:
+        async def worker():
+            nonlocal errors
+            for i in counter:
+                body = {"user_text": TEXTS[i % len(TEXTS)], "languages": languages}
+                started = time.perf_counter()
+                try:
+                    ok = (await client.post(f"{url}/recommend", json=body)).status_code == 200
+                except httpx.HTTPError:
+                    ok = False
+                if ok:
+                    latencies.append(time.perf_counter() - started)
+                else:
+                    errors += 1
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        return latencies, errors, time.perf_counter() - started
+
+
+def run_http(target, port, concurrency_levels, args):
+    """Start the app in a subprocess and drive POST /recommend over HTTP."""
+    import httpx
+    from load_test import wait_ready
+
+    server = subprocess.Popen([sys.executable] + SERVERS[target] + [str(port)], cwd=BACKEND_DIR,
+                              env=dict(os.environ, MODEL_PRELOAD="eager"),
+                              stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    url = f"http://127.0.0.1:{port}"
+    results = []
+    try:
+        wait_ready(url)
+        asyncio.run(drive_fixed(url, 4, 8, args.languages))
+        for concurrency in concurrency_levels:
+            before = metric_sums(httpx.get(f"{url}/metrics").text, TIMING_METRICS)
+            latencies, errors, elapsed = asyncio.run(drive_fixed(url, concurrency, args.requests, args.languages))
+            after = metric_sums(httpx.get(f"{url}/metrics").text, TIMING_METRICS)
+            results.append(summarize(target, concurrency, latencies, errors, elapsed, before, after,
+                                     memory_mb(server.pid)))
+    finally:
+        server.terminate()
+        server.wait(timeout=30)
+    return results
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR,
+                              capture_output=True, text=True).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def compare(baseline_path, current_path, max_regression):
+    """Print per-run deltas; return False if throughput dropped or p99 grew by more than max_regression."""
+    with open(baseline_path) as f:
+        baseline = {(r["target"], r["concurrency"]): r for r in json.load(f)["results"]}
+    with open(current_path) as f:
+        current = json.load(f)["results"]
+
+    ok = True
+    print(f"{'target':<7} {'conc':>5} {'rps base':>9} {'rps now':>9} {'delta':>7} "
+          f"{'p99 base':>9} {'p99 now':>9} {'delta':>7}")
+    for run in current:
+        base = baseline.get((run["target"], run["concurrency"]))
+        if base is None or not base["p99_ms"] or not run["p99_ms"]:
+            continue
+        rps_delta = run["throughput_rps"] / base["throughput_rps"] - 1
+        p99_delta = run["p99_ms"] / base["p99_ms"] - 1
+        flag = ""
+        if rps_delta < -max_regression or p99_delta > max_regression:
+            ok, flag = False, "  REGRESSION"
+        print(f"{run['target']:<7} {run['concurrency']:>5} {base['throughput_rps']:>9.1f} "
+              f"{run['throughput_rps']:>9.1f} {rps_delta:>+7.1%} {base['p99_ms']:>9.1f} "
+              f"{run['p99_ms']:>9.1f} {p99_delta:>+7.1%}{flag}")
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description="End-to-end benchmark against a local Spotify stand-in")
+    parser.add_argument("--targets", nargs="+", default=["direct", "flask"], choices=["direct"] + list(SERVERS))
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--requests", type=int, default=200, help="Requests per concurrency level")
+    parser.add_argument("--languages", nargs="*", default=[],
+                        help="Languages per request; empty exercises the live Spotify path")
+    parser.add_argument("--warm-caches", action="store_true", help="Keep Spotify search and emotion caches on")
+    parser.add_argument("--spotify-latency-ms", type=float, default=80.0)
+    parser.add_argument("--spotify-jitter-ms", type=float, default=20.0)
+    parser.add_argument("--spotify-error-rate", type=float, default=0.0)
+    parser.add_argument("--spotify-rate-limit-rate", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--port", type=int, default=5300)
+    parser.add_argument("--json", help="Write results to this file")
+    parser.add_argument("--compare", nargs=2, metavar=("BASELINE", "CURRENT"),
+                        help="Compare two result files instead of running")
+    parser.add_argument("--max-regression", type=float, default=0.10)
+    args = parser.parse_args()
+
+    if args.compare:
+        sys.exit(0 if compare(*args.compare, args.max_regression) else 1)
+
+    stub_port = args.port + 99
+    stub = make_server(port=stub_port, latency_ms=args.spotify_latency_ms, jitter_ms=args.spotify_jitter_ms,
+                       error_rate=args.spotify_error_rate, rate_limit_rate=args.spotify_rate_limit_rate,
+                       seed=args.seed)
+    threading.Thread(target=stub.serve_forever, name="stub-spotify", daemon=True).start()
+
+    # Read by config.py in this process and inherited by the app subprocesses
+    stub_url = f"http://127.0.0.1:{stub_port}"
+    os.environ.update({
+        "SPOTIFY_API_URL": stub_url,
+        "SPOTIFY_ACCOUNTS_URL": stub_url,
+        "SPOTIFY_CLIENT_ID": "stub",
+        "SPOTIFY_CLIENT_SECRET": "stub",
+        "CANDIDATE_POOLS": "0",
+        "TRACK_CATALOG_PATH": "",
+    })
+    if not args.warm_caches:
+        os.environ.update({"SPOTIFY_SEARCH_CACHE_SIZE": "0", "SPOTIFY_FEATURES_CACHE_SIZE": "0",
+                           "EMOTION_CACHE": "0"})
+
+    results = []
+    for i, target in enumerate(args.targets):
+        if target == "direct":
+            results.extend(run_direct(args.concurrency, args))
+        else:
+            results.extend(run_http(target, args.port + i, args.concurrency, args))
+    stub.shutdown()
+
+    print(f"{'target':<7} {'conc':>5} {'req/s':>8} {'p50 ms':>8} {'p90 ms':>8} {'p99 ms':>8} "
+          f"{'model ms':>9} {'spotify ms':>10} {'RSS MB':>7} {'errors':>6}")
+    for r in results:
+        print(f"{r['target']:<7} {r['concurrency']:>5} {r['throughput_rps']:>8.1f} {r['p50_ms'] or 0:>8.1f} "
+              f"{r['p90_ms'] or 0:>8.1f} {r['p99_ms'] or 0:>8.1f} {r['model_ms_per_request']:>9.2f} "
+              f"{r['spotify_ms_per_request']:>10.1f} {r['rss_mb'] or 0:>7.0f} {r['errors']:>6}")
+
+    if args.json:
+        report = {
+            "meta": {"commit": git_commit(), "timestamp": time.time(), "args": vars(args),
+                     "spotify_stub": stub.RequestHandlerClass.plan.stats},
+            "results": results,
+        }
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""
+Measure pre-fork scaling: per-worker memory and throughput versus worker count.
+
+For each worker count, starts gunicorn (gunicorn.conf.py), drives POST
+/recommend with a language filter so requests are CPU-bound on emotion
+inference and never leave the box, and reads each worker's RSS, PSS
+(shared pages divided among the processes sharing them) and private memory
+from /proc/<pid>/smaps_rollup.
+
+    EMOTION_BACKEND=onnx-int8 python benchmarks/bench_prefork.py --workers 1 2 4 --json prefork.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+BACKEND_DIR = os.path.join(BENCH_DIR, "..")
+sys.path.insert(0, BENCH_DIR)
+
+from load_test import drive, wait_ready  # noqa: E402
+
+
+def memory_mb(pid):
+    """RSS, PSS and private (unshared) memory of a process in MB."""
+    fields = {}
+    with open(f"/proc/{pid}/smaps_rollup") as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) == 3 and parts[2] == "kB":
+                fields[parts[0].rstrip(":")] = int(parts[1]) / 1024
+    return {"rss_mb": fields.get("Rss", 0.0), "pss_mb": fields.get("Pss", 0.0),
+            "private_mb": fields.get("Private_Clean", 0.0) + fields.get("Private_Dirty", 0.0)}
+
+
+def worker_pids(master_pid):
+    with open(f"/proc/{master_pid}/task/{master_pid}/children") as f:
+        return [int(pid) for pid in f.read().split()]
+
+
+def run(workers, port, args):
+    env = dict(os.environ, WEB_WORKERS=str(workers), BIND=f"127.0.0.1:{port}",
+               CANDIDATE_POOLS="0", TRACK_CATALOG_PATH="", EMOTION_CACHE="0")
+    master = subprocess.Popen([sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py", args.app],
+                              cwd=BACKEND_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    url = f"http://127.0.0.1:{port}"
+    try:
+        wait_ready(url)
+        # Wait until every worker answers, then warm them up
+        deadline = time.monotonic() + 120
+        while len(worker_pids(master.pid)) < workers and time.monotonic() < deadline:
+            time.sleep(0.5)
+        asyncio.run(drive(url, workers * 4, 3.0, args.languages))
+
+        latencies, errors, elapsed = asyncio.run(drive(url, args.concurrency, args.duration, args.languages))
+        per_worker = [memory_mb(pid) for pid in worker_pids(master.pid)]
+        master_memory = memory_mb(master.pid)
+    finally:
+        master.terminate()
+        master.wait(timeout=60)
+
+    average = {key: sum(m[key] for m in per_worker) / len(per_worker) for key in per_worker[0]}
+    return {
+        "workers": workers,
+        "requests_per_second": len(latencies) / elapsed,
+        "errors": errors,
+        "master": master_memory,
+        "worker_avg": average,
+        "total_pss_mb": master_memory["pss_mb"] + sum(m["pss_mb"] for m in per_worker),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark pre-fork memory sharing and throughput scaling")
+    parser.add_argument("--app", default="app:app", help="WSGI/ASGI app for gunicorn")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--languages", nargs="*", default=["hindi"])
+    parser.add_argument("--port", type=int, default=5200)
+    parser.add_argument("--json", help="Write results to this file")
+    args = parser.parse_args()
+
+    results = [run(workers, args.port + i, args) for i, workers in enumerate(args.workers)]
+    base = results[0]["requests_per_second"] / results[0]["workers"]
+
+    print(f"{'workers':>7} {'req/s':>8} {'scaling':>8} {'RSS/wkr':>8} {'PSS/wkr':>8} {'priv/wkr':>8} {'PSS tot':>8}")
+    for r in results:
+        w = r["worker_avg"]
+        print(f"{r['workers']:>7} {r['requests_per_second']:>8.1f} "
+              f"{r['requests_per_second'] / (base * r['workers']):>8.2f} {w['rss_mb']:>8.0f} "
+              f"{w['pss_mb']:>8.0f} {w['private_mb']:>8.0f} {r['total_pss_mb']:>8.0f}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""
+Measure worker cold start: import time breakdown and time until the model is ready.
+
+Runs each measurement in a fresh interpreter so nothing is cached in-process.
+Use --max-import-seconds / --max-ready-seconds to fail CI on regressions.
+
+    python benchmarks/bench_startup.py --json startup.json
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+READY_SCRIPT = """
+import json, time
+started = time.perf_counter()
+import app
+imported = time.perf_counter()
+app.engine.ensure_loaded()
+ready = time.perf_counter()
+import startup
+print(json.dumps({"import_seconds": imported - started, "ready_seconds": ready - started,
+                  "phases": startup.report()["phases"]}))
+"""
+
+
+def run_python(args, env):
+    return subprocess.run([sys.executable] + args, cwd=BACKEND_DIR, env=env,
+                          capture_output=True, text=True, check=True)
+
+
+def import_breakdown(env, top):
+    """Parse `python -X importtime` output into the slowest modules imported by app.py."""
+    result = run_python(["-X", "importtime", "-c", "import app"], env)
+    modules = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        fields = line[len("import time:"):].split("|")
+        if len(fields) != 3 or not fields[0].strip().isdigit():
+            continue  # header line
+        # Nesting depth is encoded as two spaces per level after the separator
+        name = fields[2][1:]
+        modules.append({"module": name.strip(), "depth": (len(name) - len(name.lstrip())) // 2,
+                        "self_ms": int(fields[0]) / 1000, "cumulative_ms": int(fields[1]) / 1000})
+    # Children are printed before their parent: keep the direct imports of app
+    direct, pending = [], []
+    for module in modules:
+        if module["depth"] == 1:
+            pending.append(module)
+        elif module["depth"] == 0:
+            if module["module"] == "app":
+                direct = pending + [module]
+            pending = []
+    return sorted(direct, key=lambda m: m["cumulative_ms"], reverse=True)[:top]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--top", type=int, default=15, help="Number of slowest imports to list")
+    parser.add_argument("--json", help="Write results to this JSON file")
+    parser.add_argument("--max-import-seconds", type=float)
+    parser.add_argument("--max-ready-seconds", type=float)
+    args = parser.parse_args()
+
+    env = dict(os.environ, MODEL_PRELOAD="lazy", CANDIDATE_POOLS="0")
+    imports = import_breakdown(env, args.top)
+    timing = json.loads(run_python(["-c", READY_SCRIPT], env).stdout.strip().splitlines()[-1])
+
+    print(f"import app: {timing['import_seconds']:.3f}s, model ready: {timing['ready_seconds']:.3f}s")
+    for name, seconds in sorted(timing["phases"].items(), key=lambda item: -item[1]):
+        print(f"  phase {name:<12} {seconds:8.3f}s")
+    print("slowest imports:")
+    for module in imports:
+        print(f"  {module['cumulative_ms']:10.1f} ms  {module['module']}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"timing": timing, "imports": imports}, f, indent=2)
+
+    failed = ((args.max_import_seconds is not None and timing["import_seconds"] > args.max_import_seconds) or
+              (args.max_ready_seconds is not None and timing["ready_seconds"] > args.max_ready_seconds))
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
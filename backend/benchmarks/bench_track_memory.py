@@ -0,0 +1,94 @@
+"""
+Memory and decode time of Spotify search results: full JSON objects vs compact records.
+
+Each mode runs in a fresh subprocess that decodes search responses (shaped
+like real ones, from stub_spotify.fake_track) and keeps the results alive,
+as the search cache and a request's candidate list do:
+
+    dicts    json.loads and keep the track objects (the previous behaviour)
+    records  records.parse_search into Track tuples
+
+Peak RSS growth is reported per 10k tracks, and decode time per response.
+
+    python benchmarks/bench_track_memory.py --tracks 50000
+"""
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+BACKEND_DIR = os.path.join(BENCH_DIR, "..")
+sys.path.insert(0, BENCH_DIR)
+sys.path.insert(0, BACKEND_DIR)
+
+PAGE_SIZE = 50
+
+
+def rss_mb():
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2 ** 20
+
+
+def run_mode(mode, tracks):
+    """Decode tracks // PAGE_SIZE search responses and keep the results; runs in the child process."""
+    from records import parse_search
+    from stub_spotify import fake_track
+
+    decode = (lambda body: json.loads(body)["tracks"]["items"]) if mode == "dicts" else parse_search
+    pages = [json.dumps({"tracks": {"items": [fake_track(f"query {page}", i) for i in range(PAGE_SIZE)]}})
+             for page in range(4)]
+
+    start_rss = rss_mb()
+    kept = []
+    decode_seconds = 0.0
+    for page in range(tracks // PAGE_SIZE):
+        # Vary the bodies a little so the decoder cannot share strings across pages
+        body = pages[page % len(pages)].replace("Track ", f"Track{page} ")
+        started = time.perf_counter()
+        kept.extend(decode(body))
+        decode_seconds += time.perf_counter() - started
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    return {
+        "mode": mode,
+        "tracks": len(kept),
+        "retained_mb": rss_mb() - start_rss,
+        "peak_growth_mb": peak_rss - start_rss,
+        "decode_ms_per_response": decode_seconds / (tracks // PAGE_SIZE) * 1000,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare memory of full Spotify track objects and Track records")
+    parser.add_argument("--tracks", type=int, default=50000)
+    parser.add_argument("--modes", nargs="+", default=["dicts", "records"])
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    parser.add_argument("--json", help="Write results to this file")
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(run_mode(args.child, args.tracks)))
+        return
+
+    results = []
+    for mode in args.modes:
+        output = subprocess.run([sys.executable, os.path.abspath(__file__), "--child", mode,
+                                 "--tracks", str(args.tracks)], capture_output=True, text=True, check=True)
+        results.append(json.loads(output.stdout))
+
+    per = 10000 / args.tracks
+    print(f"{'mode':>8} {'tracks':>8} {'peak MB/10k':>12} {'kept MB/10k':>12} {'decode ms/resp':>15}")
+    for r in results:
+        print(f"{r['mode']:>8} {r['tracks']:>8} {r['peak_growth_mb'] * per:>12.1f} {r['retained_mb'] * per:>12.1f} "
+              f"{r['decode_ms_per_response']:>15.2f}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+"""
+First-call vs steady-state forward latency per length bucket, with and without the startup warm-up.
+
+Each configuration is loaded twice in a fresh interpreter: once with
+EMOTION_WARMUP=0 ("cold": the first request of every bucket pays for graph
+tracing / XLA compilation) and once with the warm-up on ("warm": the first
+request after /ready). Inputs are cut from the corpus in reverse, so they
+differ from the warm-up's. Use --max-warm-ratio to fail CI when the first
+call after warm-up is still much slower than steady state.
+
+    python benchmarks/bench_warmup.py --modes tf-eager tf-graph tf-xla --json warmup.json
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+MODES = {
+    "tf-eager": {"EMOTION_BACKEND": "tf", "EMOTION_TF_COMPILE": "0"},
+    "tf-graph": {"EMOTION_BACKEND": "tf", "EMOTION_TF_COMPILE": "1", "EMOTION_TF_XLA": "0"},
+    "tf-xla": {"EMOTION_BACKEND": "tf", "EMOTION_TF_COMPILE": "1", "EMOTION_TF_XLA": "1"},
+    "onnx": {"EMOTION_BACKEND": "onnx"},
+    "onnx-int8": {"EMOTION_BACKEND": "onnx-int8"},
+}
+
+WORKER_SCRIPT = """
+import json, sys, time
+import numpy as np
+
+started = time.perf_counter()
+from inference_engine import EmotionInferenceEngine, read_warmup_corpus
+engine = EmotionInferenceEngine(sys.argv[1])
+ready_seconds = time.perf_counter() - started
+
+steady_calls, rows = int(sys.argv[2]), int(sys.argv[3])
+texts = read_warmup_corpus()[::-1]
+token_ids = [token for ids in engine.tokenizer(texts, add_special_tokens=False)["input_ids"] for token in ids]
+buckets = {}
+for bucket in engine.encoder.buckets:
+    inputs = engine.encoder.filled_batch(token_ids, bucket, rows)
+    timings = []
+    for _ in range(1 + steady_calls):
+        t = time.perf_counter()
+        engine.backend.predict_logits(inputs)
+        timings.append((time.perf_counter() - t) * 1000)
+    buckets[str(bucket)] = {"first_ms": timings[0], "steady_ms": float(np.median(timings[1:]))}
+
+print(json.dumps({"ready_seconds": ready_seconds, "warmup": engine.warmup_report, "buckets": buckets}))
+"""
+
+
+def run_mode(mode, warmup, model_path, steady_calls, rows):
+    env = dict(os.environ, **MODES[mode], EMOTION_WARMUP="1" if warmup else "0", EMOTION_CACHE="0")
+    result = subprocess.run([sys.executable, "-c", WORKER_SCRIPT, model_path, str(steady_calls), str(rows)],
+                            cwd=BACKEND_DIR, env=env, capture_output=True, text=True)
+    if result.returncode != 0:
+        return {"error": result.stderr.strip().splitlines()[-1:]}
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--modes", nargs="+", default=["tf-eager", "tf-graph"], choices=sorted(MODES))
+    parser.add_argument("--model-path", default=os.path.join(BACKEND_DIR, "models", "emotion_model"))
+    parser.add_argument("--rows", type=int, default=1, help="Batch size of the measured calls")
+    parser.add_argument("--steady-calls", type=int, default=10)
+    parser.add_argument("--max-warm-ratio", type=float,
+                        help="Fail if a bucket's first call after warm-up exceeds this multiple of steady state")
+    parser.add_argument("--json", help="Write results to this file")
+    args = parser.parse_args()
+
+    results = {}
+    failed = False
+    print(f"{'mode':<10} {'bucket':>6} {'cold 1st ms':>12} {'warm 1st ms':>12} {'steady ms':>10} {'warm/steady':>12}")
+    for mode in args.modes:
+        cold = run_mode(mode, False, args.model_path, args.steady_calls, args.rows)
+        warm = run_mode(mode, True, args.model_path, args.steady_calls, args.rows)
+        results[mode] = {"cold": cold, "warm": warm}
+        if "error" in cold or "error" in warm:
+            print(f"{mode:<10} failed: {' '.join(cold.get('error') or warm.get('error'))}")
+            failed = True
+            continue
+
+        for bucket, timing in warm["buckets"].items():
+            steady = timing["steady_ms"]
+            ratio = timing["first_ms"] / steady if steady > 0 else float("inf")
+            print(f"{mode:<10} {bucket:>6} {cold['buckets'][bucket]['first_ms']:>12.2f} {timing['first_ms']:>12.2f} "
+                  f"{steady:>10.2f} {ratio:>12.2f}")
+            if args.max_warm_ratio is not None and ratio > args.max_warm_ratio:
+                failed = True
+        print(f"{mode:<10} ready in {cold['ready_seconds']:.2f}s without warm-up, "
+              f"{warm['ready_seconds']:.2f}s with ({len(warm['warmup'])} shapes warmed)")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
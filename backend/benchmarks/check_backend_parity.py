@@ -0,0 +1,84 @@
+"""
+Compare an ONNX backend's logits with the TF model over a fixed corpus.
+
+Exits non-zero if the largest absolute logit difference or the top-label
+disagreement rate exceeds its tolerance, so it can gate an export in CI.
+
+    python benchmarks/check_backend_parity.py --backend onnx-int8 --max-abs-diff 0.5
+"""
+import argparse
+import json
+import os
+import sys
+
+import numpy as np
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, BACKEND_DIR)
+
+from inference_backends import create_backend  # noqa: E402
+
+DEFAULT_CORPUS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "emotion_corpus.txt")
+
+
+def read_corpus(path):
+    with open(path, encoding="utf-8") as f:
+        return [line.strip() for line in f if line.strip()]
+
+
+def batched_logits(backend, tokenizer, texts, batch_size):
+    logits = []
+    for start in range(0, len(texts), batch_size):
+        encoded = tokenizer(texts[start:start + batch_size], return_tensors="np", padding=True,
+                            truncation=True, max_length=512)
+        logits.append(backend.predict_logits(encoded))
+    return np.concatenate(logits)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check ONNX backend logits against the TF model")
+    parser.add_argument("--backend", default="onnx-int8", choices=["onnx", "onnx-int8"])
+    parser.add_argument("--model-path", default=os.path.join(BACKEND_DIR, "models", "emotion_model"))
+    parser.add_argument("--onnx-path", help="Explicit ONNX file (default: <model-path>/onnx/...)")
+    parser.add_argument("--corpus", default=DEFAULT_CORPUS, help="One text per line")
+    parser.add_argument("--batch-size", type=int, default=8)
+    parser.add_argument("--max-abs-diff", type=float, default=None,
+                        help="Logit tolerance (default 1e-3 for onnx, 0.5 for onnx-int8)")
+    parser.add_argument("--max-label-mismatch", type=float, default=0.04,
+                        help="Allowed fraction of texts whose top label differs")
+    parser.add_argument("--json", help="Write the report to this file")
+    args = parser.parse_args()
+
+    from transformers import AutoTokenizer
+
+    texts = read_corpus(args.corpus)
+    tokenizer = AutoTokenizer.from_pretrained(args.model_path)
+    reference = batched_logits(create_backend("tf", args.model_path), tokenizer, texts, args.batch_size)
+    candidate = batched_logits(create_backend(args.backend, args.model_path, args.onnx_path),
+                               tokenizer, texts, args.batch_size)
+
+    abs_diff = np.abs(reference - candidate)
+    mismatch = float((reference.argmax(axis=1) != candidate.argmax(axis=1)).mean())
+    max_abs_diff = args.max_abs_diff
+    if max_abs_diff is None:
+        max_abs_diff = 1e-3 if args.backend == "onnx" else 0.5
+
+    report = {
+        "backend": args.backend,
+        "texts": len(texts),
+        "max_abs_diff": float(abs_diff.max()),
+        "mean_abs_diff": float(abs_diff.mean()),
+        "label_mismatch_rate": mismatch,
+        "tolerances": {"max_abs_diff": max_abs_diff, "label_mismatch_rate": args.max_label_mismatch},
+    }
+    report["passed"] = report["max_abs_diff"] <= max_abs_diff and mismatch <= args.max_label_mismatch
+
+    print(json.dumps(report, indent=2))
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+    sys.exit(0 if report["passed"] else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""
+Label agreement, layers run and latency of early-exit configurations against the full model.
+
+Every configuration runs the same texts through one EarlyExitTFBackend:
+
+    full        every input runs all layers (the reference labels)
+    calibrated  each exit head's calibrated threshold (early_exit.py calibrate)
+    t=<x>       one confidence threshold for every head
+
+Use texts that were not in the calibration corpus. --min-agreement fails CI
+when the calibrated configuration disagrees with the full model too often.
+
+    python benchmarks/eval_early_exit.py --corpus held_out.txt --thresholds 0.8 0.9 0.95 --json early_exit.json
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, BACKEND_DIR)
+
+
+def run_config(backend, batches, threshold):
+    """Classify every batch; returns (labels, layers run per input, milliseconds per batch)."""
+    labels, layers, timings = [], [], []
+    for encoded in batches:
+        started = time.perf_counter()
+        logits, layers_run = backend.predict_with_layers(encoded, threshold=threshold, record=False)
+        timings.append((time.perf_counter() - started) * 1000)
+        labels.append(logits.argmax(axis=1))
+        layers.append(layers_run)
+    return np.concatenate(labels), np.concatenate(layers), np.array(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model-path", default=os.path.join(BACKEND_DIR, "models", "emotion_model"))
+    parser.add_argument("--heads", help="Exit heads file (default <model-path>/early_exit/heads.npz)")
+    parser.add_argument("--corpus", default=os.path.join(BACKEND_DIR, "benchmarks", "emotion_corpus.txt"))
+    parser.add_argument("--thresholds", type=float, nargs="*", default=[0.8, 0.9, 0.95, 0.99])
+    parser.add_argument("--batch-size", type=int, default=1, help="Texts per call; 1 measures per-request latency")
+    parser.add_argument("--repeat", type=int, default=3, help="Passes over the corpus per configuration")
+    parser.add_argument("--min-agreement", type=float, help="Fail if the calibrated configuration agrees less")
+    parser.add_argument("--json", help="Write results to this file")
+    args = parser.parse_args()
+
+    from transformers import AutoTokenizer
+
+    from early_exit import EarlyExitTFBackend
+
+    with open(args.corpus, encoding="utf-8") as f:
+        texts = [line.strip() for line in f if line.strip()]
+    tokenizer = AutoTokenizer.from_pretrained(args.model_path)
+    batches = [tokenizer(texts[i:i + args.batch_size], return_tensors="np", padding=True, truncation=True,
+                         max_length=512) for i in range(0, len(texts), args.batch_size)]
+    backend = EarlyExitTFBackend(args.model_path, args.heads)
+
+    configs = [("full", np.inf), ("calibrated", None)] + [(f"t={t:g}", t) for t in args.thresholds]
+    reference = None
+    results = {}
+    print(f"{'config':<12} {'agreement':>10} {'avg layers':>11} {'p50 ms':>8} {'p95 ms':>8} {'speedup':>8}")
+    for name, threshold in configs:
+        run_config(backend, batches[:1], threshold)
+        timings = []
+        for _ in range(args.repeat):
+            labels, layers, pass_timings = run_config(backend, batches, threshold)
+            timings.append(pass_timings)
+        timings = np.concatenate(timings)
+        if reference is None:
+            reference = labels
+
+        result = results[name] = {
+            "threshold": None if threshold is None else float(threshold),
+            "agreement": float((labels == reference).mean()),
+            "avg_layers": float(layers.mean()),
+            "layer_counts": {str(layer): int(count) for layer, count in zip(*np.unique(layers, return_counts=True))},
+            "p50_ms": float(np.percentile(timings, 50)),
+            "p95_ms": float(np.percentile(timings, 95)),
+            "mean_ms": float(timings.mean()),
+        }
+        result["speedup"] = results["full"]["mean_ms"] / result["mean_ms"] if result["mean_ms"] > 0 else None
+        print(f"{name:<12} {result['agreement']:>10.3f} {result['avg_layers']:>11.2f} {result['p50_ms']:>8.2f} "
+              f"{result['p95_ms']:>8.2f} {result['speedup'] or 0:>7.2f}x")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"texts": len(texts), "batch_size": args.batch_size, "configs": results}, f, indent=2)
+    if args.min_agreement is not None and results["calibrated"]["agreement"] < args.min_agreement:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,154 @@
+"""
+Compare the Flask (app.py) and ASGI (asgi_app.py) serving modes under load.
+
+Starts a stub Spotify server and each server mode in its own process,
+pointed at the stub with the Spotify search cache disabled, so every
+request does the full emotion inference + Spotify fan-out. Then drives
+POST /recommend at a fixed concurrency and reports requests/sec and latency
+percentiles per mode.
+
+    pip install -r requirements-async.txt
+    python benchmarks/load_test.py --concurrency 200 --duration 20 --spotify-latency-ms 80 --json load.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import time
+
+import httpx
+import numpy as np
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+BACKEND_DIR = os.path.join(BENCH_DIR, "..")
+
+TEXTS = [line.strip() for line in open(os.path.join(BENCH_DIR, "emotion_corpus.txt"), encoding="utf-8")
+         if line.strip()]
+
+SERVERS = {
+    "flask": ["-c", "import app, sys; app.app.run(host='127.0.0.1', port=int(sys.argv[1]), threaded=True)"],
+    "asgi": ["-m", "uvicorn", "asgi_app:app", "--host", "127.0.0.1", "--log-level", "warning", "--port"],
+}
+
+
+def server_env(stub_url, spotify_cache):
+    env = dict(os.environ)
+    env.update({
+        "SPOTIFY_API_URL": stub_url,
+        "SPOTIFY_ACCOUNTS_URL": stub_url,
+        "SPOTIFY_CLIENT_ID": "stub",
+        "SPOTIFY_CLIENT_SECRET": "stub",
+        "CANDIDATE_POOLS": "0",
+        "TRACK_CATALOG_PATH": "",
+        "MODEL_PRELOAD": "eager",
+    })
+    if not spotify_cache:
+        env["SPOTIFY_SEARCH_CACHE_SIZE"] = "0"
+    return env
+
+
+def wait_ready(url, timeout=300.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if httpx.get(f"{url}/ready", timeout=2.0).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.5)
+    raise RuntimeError(f"{url} did not become ready within {timeout}s")
+
+
+async def drive(url, concurrency, duration, languages):
+    """Send requests from `concurrency` workers for `duration` seconds; return latencies and errors."""
+    latencies, errors = [], 0
+    stop_at = time.monotonic() + duration
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+
+    async with httpx.AsyncClient(limits=limits, timeout=30.0) as client:
+        async def worker(worker_id):
+            nonlocal errors
+            i = worker_id
+            while time.monotonic() < stop_at:
+                body = {"user_text": TEXTS[i % len(TEXTS)], "languages": languages}
+                i += concurrency
+                started = time.perf_counter()
+                try:
+                    response = await client.post(f"{url}/recommend", json=body)
+                    ok = response.status_code == 200
+                except httpx.HTTPError:
+                    ok = False
+                if ok:
+                    latencies.append(time.perf_counter() - started)
+                else:
+                    errors += 1
+
+        started = time.monotonic()
+        await asyncio.gather(*(worker(i) for i in range(concurrency)))
+        elapsed = time.monotonic() - started
+
+    return latencies, errors, elapsed
+
+
+def run_mode(mode, port, env, args):
+    command = [sys.executable] + SERVERS[mode] + [str(port)]
+    server = subprocess.Popen(command, cwd=BACKEND_DIR, env=env,
+                              stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    url = f"http://127.0.0.1:{port}"
+    try:
+        wait_ready(url)
+        # Warm up connections, caches and the model
+        asyncio.run(drive(url, min(args.concurrency, 8), 2.0, args.languages))
+        latencies, errors, elapsed = asyncio.run(drive(url, args.concurrency, args.duration, args.languages))
+    finally:
+        server.terminate()
+        server.wait(timeout=30)
+
+    latencies_ms = np.array(latencies) * 1000
+    return {
+        "mode": mode,
+        "concurrency": args.concurrency,
+        "requests": len(latencies),
+        "errors": errors,
+        "requests_per_second": len(latencies) / elapsed,
+        "p50_ms": float(np.percentile(latencies_ms, 50)) if len(latencies_ms) else None,
+        "p99_ms": float(np.percentile(latencies_ms, 99)) if len(latencies_ms) else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load-test the Flask and ASGI serving modes")
+    parser.add_argument("--modes", nargs="+", default=["flask", "asgi"], choices=list(SERVERS))
+    parser.add_argument("--concurrency", type=int, default=100)
+    parser.add_argument("--duration", type=float, default=15.0, help="Seconds of load per mode")
+    parser.add_argument("--spotify-latency-ms", type=float, default=80.0, help="Stub Spotify response delay")
+    parser.add_argument("--spotify-cache", action="store_true", help="Keep the Spotify search cache enabled")
+    parser.add_argument("--languages", nargs="*", default=[],
+                        help="Languages sent with each request; empty exercises the live Spotify path")
+    parser.add_argument("--port", type=int, default=5100, help="First port used for the servers")
+    parser.add_argument("--json", help="Write results to this file")
+    args = parser.parse_args()
+
+    stub_port = args.port + 50
+    stub = subprocess.Popen([sys.executable, os.path.join(BENCH_DIR, "stub_spotify.py"), "--port", str(stub_port),
+                             "--latency-ms", str(args.spotify_latency_ms)], stdout=subprocess.DEVNULL)
+    try:
+        env = server_env(f"http://127.0.0.1:{stub_port}", args.spotify_cache)
+        results = [run_mode(mode, args.port + i, env, args) for i, mode in enumerate(args.modes)]
+    finally:
+        stub.terminate()
+
+    print(f"{'mode':<6} {'conc':>5} {'req/s':>8} {'p50 ms':>8} {'p99 ms':>8} {'errors':>7}")
+    for r in results:
+        print(f"{r['mode']:<6} {r['concurrency']:>5} {r['requests_per_second']:>8.1f} "
+              f"{r['p50_ms'] or 0:>8.1f} {r['p99_ms'] or 0:>8.1f} {r['errors']:>7}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,210 @@
+"""
+Local stand-in for the Spotify accounts and Web API used by load tests and benchmarks.
+
+Serves /api/token, /v1/search, /v1/audio-features and /v1/recommendations
+(plus /v1/recommendations/available-genre-seeds) with deterministic fake
+data derived from the request. Latency, jitter, server errors and 429 rate
+limiting are configurable; the fault sequence is drawn from a seeded RNG, so
+the same request order produces the same faults. Point the backend at it with:
+
+    python benchmarks/stub_spotify.py --port 8765 --latency-ms 80 --error-rate 0.01 --rate-limit-rate 0.02
+    SPOTIFY_API_URL=http://127.0.0.1:8765 SPOTIFY_ACCOUNTS_URL=http://127.0.0.1:8765 python app.py
+
+GET /stats returns per-endpoint request and fault counts.
+"""
+import argparse
+import hashlib
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+GENRES = ["acoustic", "bollywood", "chill", "dance", "electronic", "happy", "indian", "malayalam",
+          "pop", "rainy-day", "rock", "sad", "sleep", "study", "work-out"]
+
+
+# Real track objects list the markets they are available in, on the track and on its album
+MARKETS = [f"{chr(65 + i // 26)}{chr(65 + i % 26)}" for i in range(185)]
+
+
+def fake_artist(artist_id, name):
+    return {"external_urls": {"spotify": f"https://open.spotify.com/artist/{artist_id}"},
+            "href": f"https://api.spotify.com/v1/artists/{artist_id}", "id": artist_id, "name": name,
+            "type": "artist", "uri": f"spotify:artist:{artist_id}"}
+
+
+def fake_track(query, i):
+    """A track object with the same shape and roughly the same size as a real search result item."""
+    digest = hashlib.md5(f"{query}:{i}".encode()).hexdigest()
+    track_id, album_id, artist_id = digest[:22], digest[10:32], digest[4:26]
+    artist = fake_artist(artist_id, f"Artist {digest[6:10]}")
+    album = {
+        "album_type": "album", "artists": [artist], "available_markets": MARKETS,
+        "external_urls": {"spotify": f"https://open.spotify.com/album/{album_id}"},
+        "href": f"https://api.spotify.com/v1/albums/{album_id}", "id": album_id,
+        "images": [{"height": size, "url": f"https://i.scdn.co/image/{album_id}{size}", "width": size}
+                   for size in (640, 300, 64)],
+        "name": f"Album {digest[12:16]}", "release_date": "2019-01-01", "release_date_precision": "day",
+        "total_tracks": 12, "type": "album", "uri": f"spotify:album:{album_id}",
+    }
+    return {
+        "album": album, "artists": [artist], "available_markets": MARKETS, "disc_number": 1,
+        "duration_ms": 180000 + int(digest[:4], 16), "explicit": False, "external_ids": {"isrc": f"US{digest[:10]}"},
+        "external_urls": {"spotify": f"https://open.spotify.com/track/{track_id}"},
+        "href": f"https://api.spotify.com/v1/tracks/{track_id}", "id": track_id, "is_local": False,
+        "name": f"Track {digest[:6]}", "popularity": int(digest[10:12], 16) % 100,
+        "preview_url": f"https://p.scdn.co/mp3-preview/{digest}", "track_number": 1 + i % 12, "type": "track",
+        "uri": f"spotify:track:{track_id}",
+    }
+
+
+def fake_features(track_id):
+    digest = hashlib.md5(track_id.encode()).digest()
+    return {"id": track_id, "valence": digest[0] / 255, "energy": digest[1] / 255,
+            "danceability": digest[2] / 255, "acousticness": digest[3] / 255,
+            "instrumentalness": digest[4] / 255, "tempo": 60 + digest[5] / 255 * 120, "mode": digest[6] % 2,
+            "key": digest[7] % 12, "loudness": -digest[8] / 255 * 20, "speechiness": digest[9] / 255,
+            "liveness": digest[10] / 255, "duration_ms": 180000, "time_signature": 4, "type": "audio_features",
+            "uri": f"spotify:track:{track_id}", "track_href": f"https://api.spotify.com/v1/tracks/{track_id}",
+            "analysis_url": f"https://api.spotify.com/v1/audio-analysis/{track_id}"}
+
+
+class FaultPlan:
+    """Seeded, thread-safe source of per-request latency and faults."""
+
+    def __init__(self, latency_ms=50.0, jitter_ms=0.0, error_rate=0.0, rate_limit_rate=0.0,
+                 retry_after=1, seed=0):
+        self.latency = latency_ms / 1000.0
+        self.jitter = jitter_ms / 1000.0
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.retry_after = retry_after
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self.stats = {}
+
+    def draw(self, endpoint):
+        """Return (delay_seconds, fault) for the next request; fault is None, "error" or "rate_limit"."""
+        with self._lock:
+            delay = max(0.0, self.latency + self._rng.uniform(-self.jitter, self.jitter))
+            roll = self._rng.random()
+            fault = None
+            if roll < self.rate_limit_rate:
+                fault = "rate_limit"
+            elif roll < self.rate_limit_rate + self.error_rate:
+                fault = "error"
+            counts = self.stats.setdefault(endpoint, {"requests": 0, "error": 0, "rate_limit": 0})
+            counts["requests"] += 1
+            if fault:
+                counts[fault] += 1
+        return delay, fault
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    plan = FaultPlan()
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_json(self, status, body, headers=None):
+        payload = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        try:
+            self.wfile.write(payload)
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # client gave up (e.g. a search cancelled at its deadline)
+
+    def respond(self, endpoint, build):
+        """Apply the latency and fault plan, then send build()'s (status, body)."""
+        delay, fault = self.plan.draw(endpoint)
+        time.sleep(delay)
+        if fault == "rate_limit":
+            self.send_json(429, {"error": {"status": 429, "message": "API rate limit exceeded"}},
+                           {"Retry-After": str(self.plan.retry_after)})
+        elif fault == "error":
+            self.send_json(500, {"error": {"status": 500, "message": "Server error"}})
+        else:
+            self.send_json(*build())
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        self.rfile.read(length)
+        if urlparse(self.path).path == "/api/token":
+            self.respond("token", lambda: (200, {"access_token": "stub-token", "token_type": "Bearer",
+                                                 "expires_in": 3600}))
+        else:
+            self.send_json(404, {"error": "not found"})
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        params = {key: values[0] for key, values in parse_qs(url.query).items()}
+        path = url.path.rstrip("/")
+
+        if path == "/stats":
+            self.send_json(200, self.plan.stats)
+        elif path == "/v1/search":
+            limit = int(params.get("limit", 20))
+            self.respond("search", lambda: (200, {"tracks": {"items": [
+                fake_track(params.get("q", ""), i) for i in range(limit)]}}))
+        elif path == "/v1/audio-features":
+            ids = [track_id for track_id in params.get("ids", "").split(",") if track_id]
+            self.respond("audio-features", lambda: (200, {"audio_features": [
+                fake_features(track_id) for track_id in ids]}))
+        elif path == "/v1/recommendations/available-genre-seeds":
+            self.respond("genre-seeds", lambda: (200, {"genres": GENRES}))
+        elif path == "/v1/recommendations":
+            self.respond("recommendations", lambda: (200, self.recommendations(params)))
+        else:
+            self.send_json(404, {"error": "not found"})
+
+    @staticmethod
+    def recommendations(params):
+        limit = int(params.get("limit", 20))
+        seeds = [("genre", s) for s in params.get("seed_genres", "").split(",") if s] + \
+                [("track", s) for s in params.get("seed_tracks", "").split(",") if s]
+        # Tracks depend on the seeds and target attributes, so different moods get different tracks
+        key = json.dumps(sorted(params.items()))
+        return {"tracks": [fake_track(key, i) for i in range(limit)],
+                "seeds": [{"id": seed, "type": kind.upper(), "initialPoolSize": 250} for kind, seed in seeds]}
+
+
+class StubServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 1024
+
+
+def make_server(host="127.0.0.1", port=8765, latency_ms=50.0, jitter_ms=0.0, error_rate=0.0,
+                rate_limit_rate=0.0, retry_after=1, seed=0):
+    handler = type("Handler", (StubHandler,), {
+        "plan": FaultPlan(latency_ms, jitter_ms, error_rate, rate_limit_rate, retry_after, seed)})
+    return StubServer((host, port), handler)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Stub Spotify server for load tests")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency-ms", type=float, default=50.0, help="Delay added to every response")
+    parser.add_argument("--jitter-ms", type=float, default=0.0, help="Uniform +/- jitter on the delay")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests answered with 500")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="Fraction answered with 429")
+    parser.add_argument("--retry-after", type=int, default=1, help="Retry-After seconds sent with 429s")
+    parser.add_argument("--seed", type=int, default=0, help="Seed for the latency/fault sequence")
+    args = parser.parse_args()
+
+    server = make_server(args.host, args.port, args.latency_ms, args.jitter_ms, args.error_rate,
+                         args.rate_limit_rate, args.retry_after, args.seed)
+    print(f"Stub Spotify listening on http://{args.host}:{args.port}", flush=True)
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,442 @@
+import fcntl
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from metrics import REGISTRY
+
+CACHE_HITS = REGISTRY.counter("cache_hits_total", "Cache hits", ["cache", "tier"])
+CACHE_MISSES = REGISTRY.counter("cache_misses_total", "Cache misses", ["cache"])
+CACHE_EVICTIONS = REGISTRY.counter("cache_evictions_total", "Entries evicted to respect maxsize", ["cache"])
+CACHE_SIZE = REGISTRY.gauge("cache_entries", "Entries currently held in memory", ["cache"])
+CACHE_TIME_SAVED = REGISTRY.counter(
+    "cache_time_saved_seconds_total", "Estimated compute time avoided by cache hits", ["cache"])
+CACHE_HIT_RATIO = REGISTRY.gauge("cache_hit_ratio", "Hits / lookups since process start", ["cache"])
+
+
+class SQLiteStore:
+    """
+    On-disk key/value store backing one or more TTLCaches.
+
+    Values are stored as JSON together with their expiry time, so a restarted
+    worker can start with a warm cache.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._inherited = None
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS cache ("
+                "namespace TEXT NOT NULL, key TEXT NOT NULL, value TEXT NOT NULL, expires REAL NOT NULL, "
+                "PRIMARY KEY (namespace, key))"
+            )
+            self._conn.commit()
+        # SQLite connections cannot be used across fork, and a lock held at fork time is never released
+        os.register_at_fork(after_in_child=self._after_fork)
+
+    def _after_fork(self):
+        # The parent's connection is kept open but unused: closing it here could checkpoint
+        # and remove the WAL file the parent is still using
+        self._inherited = self._conn
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+
+    def get(self, namespace: str, key: str) -> Optional[Tuple[Any, float]]:
+        """Return (value, expires) for a key, or None if it is not stored."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, expires FROM cache WHERE namespace = ? AND key = ?", (namespace, key)
+            ).fetchone()
+        if row is None:
+            return None
+        return json.loads(row[0]), row[1]
+
+    def set(self, namespace: str, key: str, value: Any, expires: float):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO cache (namespace, key, value, expires) VALUES (?, ?, ?, ?)",
+                (namespace, key, json.dumps(value), expires),
+            )
+            self._conn.commit()
+
+    def get_many(self, namespace: str, keys: Sequence[str]) -> Dict[str, Tuple[Any, float]]:
+        """Return {key: (value, expires)} for the keys that are stored."""
+        found = {}
+        with self._lock:
+            # Stay well under SQLite's limit on bound parameters per statement
+            for i in range(0, len(keys), 500):
+                chunk = keys[i:i + 500]
+                rows = self._conn.execute(
+                    f"SELECT key, value, expires FROM cache WHERE namespace = ? "
+                    f"AND key IN ({','.join('?' * len(chunk))})", (namespace, *chunk)
+                ).fetchall()
+                for key, value, expires in rows:
+                    found[key] = (json.loads(value), expires)
+        return found
+
+    def set_many(self, namespace: str, items: Dict[str, Any], expires: float):
+        """Store several values with the same expiry in one transaction."""
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO cache (namespace, key, value, expires) VALUES (?, ?, ?, ?)",
+                [(namespace, key, json.dumps(value), expires) for key, value in items.items()],
+            )
+            self._conn.commit()
+
+    def purge_expired(self):
+        """Delete every expired entry."""
+        with self._lock:
+            self._conn.execute("DELETE FROM cache WHERE expires < ?", (time.time(),))
+            self._conn.commit()
+
+
+class TTLCache:
+    """
+    Thread-safe in-memory cache with per-entry TTL and LRU eviction.
+
+    Hits, misses and evictions are recorded in the metrics registry under the
+    cache's name. When a SQLiteStore is given, entries are written through to
+    it and memory misses fall back to it before reporting a miss. Expired
+    entries are kept until evicted so get_stale can still serve them while
+    the source of fresh values is unavailable.
+    """
+
+    def __init__(self, name: str, maxsize: int = 1024, ttl: float = 3600, store: Optional[SQLiteStore] = None,
+                 decode: Optional[Callable[[Any], Any]] = None):
+        """
+        Args:
+            name: Cache name used for metrics and as the on-disk namespace
+            maxsize: Maximum number of entries held in memory
+            ttl: Seconds an entry stays valid
+            store: Optional on-disk backing store
+            decode: Rebuilds a value from its JSON form when it is read from the store
+        """
+        self.name = name
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.store = store
+        self.decode = decode
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._lookups = 0
+
+    def get(self, key: str, default: Any = None) -> Any:
+        """Return the cached value for key, or default if absent or expired."""
+        now = time.time()
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None:
+                value, expires = entry
+                if expires > now:
+                    self._data.move_to_end(key)
+                    self._record(1)
+                    CACHE_HITS.inc(cache=self.name, tier="memory")
+                    return value
+
+        if self.store is not None:
+            stored = self.store.get(self.name, key)
+            if stored is not None and stored[1] > now:
+                value = self._decode(stored[0])
+                self._put(key, value, stored[1])
+                with self._lock:
+                    self._record(1)
+                CACHE_HITS.inc(cache=self.name, tier="disk")
+                return value
+
+        with self._lock:
+            self._record(0)
+        CACHE_MISSES.inc(cache=self.name)
+        return default
+
+    def get_many(self, keys: Sequence[str]) -> Dict[str, Any]:
+        """Return {key: value} for the keys that are cached and fresh; the store is queried once for all memory misses."""
+        now = time.time()
+        found = {}
+        missing = []
+        with self._lock:
+            for key in keys:
+                entry = self._data.get(key)
+                if entry is not None and entry[1] > now:
+                    self._data.move_to_end(key)
+                    found[key] = entry[0]
+                else:
+                    missing.append(key)
+        memory_hits = len(found)
+
+        if self.store is not None and missing:
+            stored = {key: (self._decode(value), expires)
+                      for key, (value, expires) in self.store.get_many(self.name, missing).items() if expires > now}
+            self._put_many(stored)
+            found.update((key, value) for key, (value, _) in stored.items())
+
+        with self._lock:
+            self._record(len(found), len(keys))
+        if memory_hits:
+            CACHE_HITS.inc(memory_hits, cache=self.name, tier="memory")
+        if len(found) > memory_hits:
+            CACHE_HITS.inc(len(found) - memory_hits, cache=self.name, tier="disk")
+        if len(found) < len(keys):
+            CACHE_MISSES.inc(len(keys) - len(found), cache=self.name)
+        return found
+
+    def get_stale(self, key: str, default: Any = None) -> Any:
+        """Return the cached value for key even if it has expired, or default if absent."""
+        with self._lock:
+            entry = self._data.get(key)
+        if entry is not None:
+            CACHE_HITS.inc(cache=self.name, tier="stale")
+            return entry[0]
+        if self.store is not None:
+            stored = self.store.get(self.name, key)
+            if stored is not None:
+                CACHE_HITS.inc(cache=self.name, tier="stale")
+                return self._decode(stored[0])
+        return default
+
+    def _decode(self, value: Any) -> Any:
+        return self.decode(value) if self.decode is not None else value
+
+    def _record(self, hits: int, lookups: int = 1):
+        # Called with the lock held
+        self._hits += hits
+        self._lookups += lookups
+        if not self._lookups:
+            return
+        CACHE_HIT_RATIO.set(self._hits / self._lookups, cache=self.name)
+
+    def set(self, key: str, value: Any):
+        """Store a value, evicting the least recently used entries if needed."""
+        expires = time.time() + self.ttl
+        self._put(key, value, expires)
+        if self.store is not None:
+            self.store.set(self.name, key, value, expires)
+
+    def set_many(self, items: Dict[str, Any]):
+        """Store several values, writing them through to the store in one transaction."""
+        expires = time.time() + self.ttl
+        self._put_many({key: (value, expires) for key, value in items.items()})
+        if self.store is not None and items:
+            self.store.set_many(self.name, items, expires)
+
+    def _put(self, key: str, value: Any, expires: float):
+        self._put_many({key: (value, expires)})
+
+    def _put_many(self, entries: Dict[str, Tuple[Any, float]]):
+        with self._lock:
+            for key, entry in entries.items():
+                self._data[key] = entry
+                self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                CACHE_EVICTIONS.inc(cache=self.name)
+            CACHE_SIZE.set(len(self._data), cache=self.name)
+
+    def __len__(self):
+        return len(self._data)
+
+
+_SPACES = re.compile(r"\s+")
+
+
+def normalize_text(text: str) -> str:
+    """Fold case, Unicode forms and whitespace so near-identical inputs share a key."""
+    # Punctuation and emoji stay: ":(" and ":)" carry the emotion of a short text
+    text = unicodedata.normalize("NFKC", text).casefold()
+    return _SPACES.sub(" ", text).strip()
+
+
+def text_key(text: str) -> Optional[int]:
+    """Non-zero 64-bit hash of the normalized text (0 marks an empty slot), or None for blank texts."""
+    normalized = normalize_text(text)
+    if not normalized:
+        return None
+    digest = hashlib.blake2b(normalized.encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "little") or 1
+
+
+class EmotionScoreCache:
+    """
+    Bounded cache of emotion score vectors keyed by a hash of the normalized text.
+
+    Scores are stored as float16 in one fixed-size, set-associative NumPy
+    table: a key maps to a set of WAYS slots and the least recently used
+    slot of that set is replaced when it is full. With a path, the table is
+    a memory-mapped file that every worker process on the host opens, so one
+    worker's results are hits for the others.
+
+    Writers in all processes are serialized by an flock on a ".lock" file
+    next to the table. They clear a slot's key before rewriting it, and
+    readers re-check the key after copying the scores, so a reader never
+    returns a half-written vector. The file header records the table shape
+    and a fingerprint of the model and backend that produced the scores; a
+    file that does not match is replaced by a new one (renamed into place,
+    never truncated, since other workers may have it mapped).
+    """
+
+    WAYS = 8
+    MAGIC = b"EMOSCORE"
+    VERSION = 1
+    HEADER = np.dtype({"names": ["magic", "version", "ways", "num_sets", "num_labels", "count", "fingerprint"],
+                       "formats": ["S8", "<u4", "<u4", "<u8", "<u8", "<u8", "S32"],
+                       "offsets": [0, 8, 12, 16, 24, 32, 40], "itemsize": 128})
+
+    def __init__(self, num_labels: int, capacity: int = 65536, path: Optional[str] = None, name: str = "emotion",
+                 fingerprint: str = ""):
+        """
+        Args:
+            num_labels: Length of each score vector
+            capacity: Maximum number of entries, rounded up to a multiple of WAYS
+            path: Optional file to share the table through; replaced if it has another shape or fingerprint
+            name: Cache name used for metrics
+            fingerprint: Identifies the model and backend the scores come from
+        """
+        self.name = name
+        self.path = path
+        self.tier = "shared" if path else "memory"
+        self.num_sets = max(1, -(-capacity // self.WAYS))
+        self.num_labels = num_labels
+        self.fingerprint = hashlib.blake2b(fingerprint.encode("utf-8"), digest_size=16).hexdigest().encode()
+        self.dtype = np.dtype([("key", "<u8"), ("stamp", "<u8"), ("scores", "<f2", (num_labels,))])
+
+        self._lock = threading.Lock()
+        self._lock_file = None
+        if path:
+            self._open_lock_file()
+            with self._write_lock():
+                if not self._compatible(path):
+                    self._create(path)
+                self.header = np.memmap(path, dtype=self.HEADER, mode="r+", shape=(1,))
+                self.table = np.memmap(path, dtype=self.dtype, mode="r+", offset=self.HEADER.itemsize,
+                                       shape=(self.num_sets, self.WAYS))
+            # An inherited lock file descriptor shares its flock with the parent: workers need their own
+            os.register_at_fork(after_in_child=self._after_fork)
+        else:
+            self.header = np.zeros(1, dtype=self.HEADER)
+            self.table = np.zeros((self.num_sets, self.WAYS), dtype=self.dtype)
+
+        self._hits = 0
+        self._lookups = 0
+        self._compute_seconds = 0.0   # Moving average of the cost of one miss
+
+    def _open_lock_file(self):
+        self._lock_file = open(f"{self.path}.lock", "a")
+
+    def _after_fork(self):
+        self._lock = threading.Lock()
+        self._lock_file.close()
+        self._open_lock_file()
+
+    @contextmanager
+    def _write_lock(self):
+        """Exclusive across the threads of this process and, for a shared table, across processes."""
+        with self._lock:
+            if self._lock_file is None:
+                yield
+                return
+            fcntl.flock(self._lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(self._lock_file, fcntl.LOCK_UN)
+
+    def _file_size(self) -> int:
+        return self.HEADER.itemsize + self.num_sets * self.WAYS * self.dtype.itemsize
+
+    def _compatible(self, path: str) -> bool:
+        """Whether the file at path is a table of this shape filled by the same model and backend."""
+        if not os.path.exists(path) or os.path.getsize(path) != self._file_size():
+            return False
+        header = np.fromfile(path, dtype=self.HEADER, count=1)[0]
+        return (header["magic"] == self.MAGIC and header["version"] == self.VERSION
+                and header["ways"] == self.WAYS and header["num_sets"] == self.num_sets
+                and header["num_labels"] == self.num_labels and header["fingerprint"] == self.fingerprint)
+
+    def _create(self, path: str):
+        """Write an empty table next to path and rename it into place."""
+        if os.path.exists(path):
+            print(f"Emotion score cache {path} was built for another model, backend or size; starting a new one")
+        tmp = f"{path}.{os.getpid()}.tmp"
+        header = np.memmap(tmp, dtype=self.HEADER, mode="w+", shape=(1,))
+        header[0] = (self.MAGIC, self.VERSION, self.WAYS, self.num_sets, self.num_labels, 0, self.fingerprint)
+        header.flush()
+        del header
+        # Extend to the full size; the table is zeros (empty slots) without writing them
+        with open(tmp, "r+b") as f:
+            f.truncate(self._file_size())
+        os.replace(tmp, path)
+
+    def get_many(self, keys: List[Optional[int]]) -> List[Optional[np.ndarray]]:
+        """Look up several keys; returns float32 score vectors or None for misses (always for None keys)."""
+        keys_looked_up = sum(key is not None for key in keys)
+        found = [self._get(key) if key is not None else None for key in keys]
+        hits = sum(scores is not None for scores in found)
+        with self._lock:
+            self._hits += hits
+            self._lookups += keys_looked_up
+            ratio = self._hits / self._lookups if self._lookups else 0.0
+        if hits:
+            CACHE_HITS.inc(hits, cache=self.name, tier=self.tier)
+            CACHE_TIME_SAVED.inc(hits * self._compute_seconds, cache=self.name)
+        if hits < keys_looked_up:
+            CACHE_MISSES.inc(keys_looked_up - hits, cache=self.name)
+        CACHE_HIT_RATIO.set(ratio, cache=self.name)
+        return found
+
+    def _get(self, key: int) -> Optional[np.ndarray]:
+        row = self.table[key % self.num_sets]
+        for way in np.flatnonzero(row["key"] == key):
+            scores = np.array(row["scores"][way], dtype=np.float32)
+            if row["key"][way] == key:
+                row["stamp"][way] = time.monotonic_ns()
+                return scores
+        return None
+
+    def set_many(self, keys: List[int], scores: np.ndarray, compute_seconds: float = 0.0):
+        """
+        Store score vectors for several keys.
+
+        Args:
+            keys: Keys from text_key (not None)
+            scores: (len(keys), num_labels) array
+            compute_seconds: Time it took to compute scores; used to estimate time saved by hits
+        """
+        if len(keys):
+            per_item = compute_seconds / len(keys)
+            self._compute_seconds = per_item if not self._compute_seconds else \
+                0.9 * self._compute_seconds + 0.1 * per_item
+        with self._write_lock():
+            filled = 0
+            for key, vector in zip(keys, scores):
+                row = self.table[key % self.num_sets]
+                matches = np.flatnonzero(row["key"] == key)
+                way = int(matches[0]) if len(matches) else int(row["stamp"].argmin())
+                if not len(matches):
+                    if row["key"][way] != 0:
+                        CACHE_EVICTIONS.inc(cache=self.name)
+                    else:
+                        filled += 1
+                row["key"][way] = 0
+                row["scores"][way] = vector
+                row["stamp"][way] = time.monotonic_ns()
+                row["key"][way] = key
+            self.header["count"][0] += filled
+            size = int(self.header["count"][0])
+        CACHE_SIZE.set(size, cache=self.name)
+
+    def __len__(self):
+        return int(self.header["count"][0])
@@ -0,0 +1,130 @@
+import random
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from metrics import REGISTRY
+from records import Song
+
+# (raw emotion label, language or None for "any", market)
+PoolKey = Tuple[str, Optional[str], str]
+
+POOL_REFRESHES = REGISTRY.counter("candidate_pool_refreshes_total", "Candidate pool refreshes", ["result"])
+POOL_SIZE = REGISTRY.gauge("candidate_pool_tracks", "Tracks in each candidate pool", ["emotion", "language", "market"])
+POOL_AGE = REGISTRY.gauge("candidate_pool_oldest_age_seconds", "Age of the stalest candidate pool")
+
+
+class CandidatePool:
+    """Immutable, ranked snapshot of candidate songs for one pool key."""
+
+    __slots__ = ("songs", "built_at")
+
+    def __init__(self, songs: Sequence[Song], built_at: float):
+        self.songs = tuple(songs)
+        self.built_at = built_at
+
+
+class CandidatePoolRefresher:
+    """
+    Keeps a ranked candidate pool per (emotion, language, market) ready in memory.
+
+    A background thread refreshes one pool at a time, stalest first, spreading
+    a full pass over refresh_interval seconds. New candidates are merged in
+    front of the previous ones (so a failed or partial fetch never empties a
+    pool), and the pool map is replaced with a new dict on every refresh so
+    readers never see a half-built pool.
+    """
+
+    def __init__(self, build_fn: Callable[[str, Optional[str], str], List[Song]], keys: Iterable[PoolKey],
+                 refresh_interval: float = 900.0, max_pool_size: int = 200):
+        """
+        Args:
+            build_fn: Returns ranked candidate songs for (emotion, language, market)
+            keys: Pool keys to keep warm
+            refresh_interval: Seconds for one full refresh pass over all pools
+            max_pool_size: Maximum number of songs kept per pool
+        """
+        self.build_fn = build_fn
+        self.keys = list(keys)
+        self.refresh_interval = refresh_interval
+        self.max_pool_size = max_pool_size
+        self._pools: Dict[PoolKey, CandidatePool] = {}
+        self._thread = None
+
+    def start(self):
+        """Start refreshing in the background; pools fill up one by one."""
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name="candidate-pool-refresher", daemon=True)
+            self._thread.start()
+
+    def get(self, key: PoolKey) -> Optional[CandidatePool]:
+        return self._pools.get(key)
+
+    def ready(self) -> bool:
+        """True once every pool has been built at least once."""
+        return all(key in self._pools for key in self.keys)
+
+    def _stalest_key(self) -> PoolKey:
+        return min(self.keys, key=lambda key: self._pools[key].built_at if key in self._pools else 0.0)
+
+    def refresh(self, key: PoolKey):
+        """Rebuild one pool and swap it in."""
+        try:
+            fresh = self.build_fn(*key)
+        except Exception as e:
+            POOL_REFRESHES.inc(result="error")
+            print(f"Error refreshing candidate pool {key}: {e}")
+            fresh = []
+        else:
+            POOL_REFRESHES.inc(result="ok")
+
+        previous = self._pools.get(key)
+        merged = list(dict.fromkeys(list(fresh) + list(previous.songs if previous else ())))
+        pools = dict(self._pools)
+        pools[key] = CandidatePool(merged[:self.max_pool_size], time.time())
+        self._pools = pools
+
+        emotion, language, market = key
+        POOL_SIZE.set(len(pools[key].songs), emotion=emotion, language=language or "any", market=market)
+        POOL_AGE.set(time.time() - min(pool.built_at for pool in pools.values()))
+
+    def _run(self):
+        # Fill every pool once, then refresh incrementally
+        for key in self.keys:
+            if key not in self._pools:
+                self.refresh(key)
+        step = self.refresh_interval / max(1, len(self.keys))
+        while True:
+            time.sleep(step)
+            self.refresh(self._stalest_key())
+
+    def sample(self, key: PoolKey, num_songs: int, exclude: Optional[set] = None) -> List[Song]:
+        """
+        Draw songs from a pool, favouring its top-ranked candidates and distinct artists.
+
+        Args:
+            key: Pool to draw from
+            num_songs: Number of songs wanted
+            exclude: Songs that must not be returned (e.g. already picked)
+
+        Returns:
+            Up to num_songs songs; empty if the pool is not built yet
+        """
+        pool = self._pools.get(key)
+        if pool is None:
+            return []
+
+        exclude = exclude or set()
+        head = [song for song in pool.songs[:max(4 * num_songs, 20)] if song not in exclude]
+        random.shuffle(head)
+
+        picked, seen_artists, leftovers = [], set(), []
+        for song in head:
+            if song.artist in seen_artists:
+                leftovers.append(song)
+                continue
+            seen_artists.add(song.artist)
+            picked.append(song)
+            if len(picked) == num_songs:
+                return picked
+        return (picked + leftovers)[:num_songs]
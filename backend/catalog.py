@@ -0,0 +1,295 @@
+import argparse
+import csv
+import json
+import os
+import uuid
+from array import array
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence
+
+import numpy as np
+
+# Audio feature columns stored in the catalog, in matrix column order
+FEATURE_COLUMNS = ["valence", "energy", "danceability", "tempo", "mode", "instrumentalness", "acousticness"]
+
+# Divisors that bring every feature to roughly [0, 1] before computing distances
+FEATURE_SCALE = np.array([1.0, 1.0, 1.0, 250.0, 1.0, 1.0, 1.0], dtype=np.float32)
+
+STRING_COLUMNS = ["id", "name", "artist"]
+CATEGORY_COLUMNS = ["language", "genre"]
+
+
+def _iter_csv(path: str) -> Iterator[Dict[str, str]]:
+    with open(path, newline="", encoding="utf-8") as f:
+        yield from csv.DictReader(f)
+
+
+def _iter_parquet(path: str) -> Iterator[Dict[str, object]]:
+    try:
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise ImportError("Reading Parquet files requires pyarrow (pip install pyarrow)")
+
+    for batch in pq.ParquetFile(path).iter_batches():
+        yield from batch.to_pylist()
+
+
+def iter_rows(path: str) -> Iterator[Dict[str, object]]:
+    """Iterate over the rows of a CSV or Parquet track file."""
+    if path.endswith(".parquet"):
+        return _iter_parquet(path)
+    return _iter_csv(path)
+
+
+def build_catalog(rows: Iterable[Dict[str, object]], out_dir: str) -> int:
+    """
+    Write tracks to a columnar catalog directory.
+
+    Each row needs id, name, artist and the FEATURE_COLUMNS; language and
+    genre are optional. Features are stored as one float32 matrix, categories
+    as small integer codes and strings as UTF-8 blobs with offset arrays, so
+    every file can be memory-mapped at load time.
+
+    Args:
+        rows: Track rows (dict-like)
+        out_dir: Directory to write the catalog to
+
+    Returns:
+        The number of tracks written
+    """
+    os.makedirs(out_dir, exist_ok=True)
+
+    features = array("f")
+    codes = {column: array("H") for column in CATEGORY_COLUMNS}
+    vocab = {column: {} for column in CATEGORY_COLUMNS}
+    offsets = {column: array("q", [0]) for column in STRING_COLUMNS}
+    blobs = {column: open(os.path.join(out_dir, f"{column}.bin"), "wb") for column in STRING_COLUMNS}
+
+    count = 0
+    try:
+        for row in rows:
+            for column in STRING_COLUMNS:
+                data = str(row.get(column) or "").encode("utf-8")
+                blobs[column].write(data)
+                offsets[column].append(offsets[column][-1] + len(data))
+
+            for column in CATEGORY_COLUMNS:
+                value = str(row.get(column) or "unknown").strip().lower()
+                codes[column].append(vocab[column].setdefault(value, len(vocab[column])))
+
+            features.extend(float(row.get(column) or 0.0) for column in FEATURE_COLUMNS)
+            count += 1
+    finally:
+        for blob in blobs.values():
+            blob.close()
+
+    np.save(os.path.join(out_dir, "features.npy"),
+            np.frombuffer(features, dtype=np.float32).reshape(count, len(FEATURE_COLUMNS)))
+    for column in CATEGORY_COLUMNS:
+        np.save(os.path.join(out_dir, f"{column}.npy"), np.frombuffer(codes[column], dtype=np.uint16))
+    for column in STRING_COLUMNS:
+        np.save(os.path.join(out_dir, f"{column}.offsets.npy"), np.frombuffer(offsets[column], dtype=np.int64))
+
+    meta = {
+        "count": count,
+        # Copied into indexes built over this catalog, so a stale index can be detected
+        "build_id": uuid.uuid4().hex,
+        "feature_columns": FEATURE_COLUMNS,
+        "vocab": {column: sorted(values, key=values.get) for column, values in vocab.items()},
+    }
+    with open(os.path.join(out_dir, "meta.json"), "w") as f:
+        json.dump(meta, f)
+
+    return count
+
+
+class TrackCatalog:
+    """
+    Memory-mapped local track catalog.
+
+    Answers "nearest tracks to these MoodMapper target features" with a
+    vectorized distance computation over the feature matrix, without any
+    network calls. If the catalog directory contains an IVF index (built with
+    `python ann_index.py <catalog>`), lookups go through it instead of a full scan.
+    """
+
+    # Rows scored per step, bounding temporary memory on very large catalogs
+    CHUNK_SIZE = 1_000_000
+
+    def __init__(self, path: str):
+        """
+        Args:
+            path: Catalog directory written by build_catalog
+        """
+        self.path = path
+        with open(os.path.join(path, "meta.json")) as f:
+            meta = json.load(f)
+
+        self.count = meta["count"]
+        self.build_id = meta.get("build_id")
+        self.vocab = meta["vocab"]
+        self.codes = {column: {value: i for i, value in enumerate(values)} for column, values in self.vocab.items()}
+
+        self.features = np.load(os.path.join(path, "features.npy"), mmap_mode="r")
+        self.categories = {column: np.load(os.path.join(path, f"{column}.npy"), mmap_mode="r")
+                           for column in CATEGORY_COLUMNS}
+        self._offsets = {column: np.load(os.path.join(path, f"{column}.offsets.npy"), mmap_mode="r")
+                         for column in STRING_COLUMNS}
+        self._blobs = {}
+        for column in STRING_COLUMNS:
+            blob_path = os.path.join(path, f"{column}.bin")
+            # np.memmap cannot map empty files
+            self._blobs[column] = (np.memmap(blob_path, dtype=np.uint8, mode="r")
+                                   if os.path.getsize(blob_path) else np.zeros(0, dtype=np.uint8))
+
+        self.index = None
+        if os.path.exists(os.path.join(path, "ivf", "meta.json")):
+            from ann_index import IVFIndex
+            index = IVFIndex(os.path.join(path, "ivf"))
+            if index.meta.get("count") == self.count and index.meta.get("catalog_build_id") == self.build_id:
+                self.index = index
+            else:
+                # Its row ids would point at the wrong tracks, or past the end
+                print(f"Ignoring the IVF index in {path}: it was built for another version of the catalog; "
+                      f"rebuild it with `python ann_index.py {path}`")
+
+    def __len__(self):
+        return self.count
+
+    def _string(self, column: str, index: int) -> str:
+        offsets = self._offsets[column]
+        return bytes(self._blobs[column][offsets[index]:offsets[index + 1]]).decode("utf-8")
+
+    def track(self, index: int) -> Dict[str, object]:
+        """Return the metadata of the track at a row index."""
+        track = {column: self._string(column, index) for column in STRING_COLUMNS}
+        for column in CATEGORY_COLUMNS:
+            track[column] = self.vocab[column][self.categories[column][index]]
+        return track
+
+    def target_vector(self, target_features: Dict[str, object]):
+        """
+        Convert MoodMapper target features (target_valence, target_tempo, ...)
+        into matrix column indices and scaled target values.
+        """
+        columns, values = [], []
+        for i, column in enumerate(FEATURE_COLUMNS):
+            key = f"target_{column}"
+            if key in target_features:
+                columns.append(i)
+                values.append(float(target_features[key]) / FEATURE_SCALE[i])
+        return np.array(columns, dtype=np.intp), np.array(values, dtype=np.float32)
+
+    def category_codes(self, languages: Optional[Sequence[str]] = None,
+                       genres: Optional[Sequence[str]] = None) -> Dict[str, List[int]]:
+        """Translate language/genre filter values into category codes."""
+        codes = {}
+        for column, wanted in (("language", languages), ("genre", genres)):
+            if wanted:
+                codes[column] = [self.codes[column][v.lower()] for v in wanted if v.lower() in self.codes[column]]
+        return codes
+
+    def nearest_rows(self, columns: np.ndarray, target: np.ndarray, k: int,
+                     category_codes: Optional[Dict[str, List[int]]] = None):
+        """
+        Exact k-nearest search over every row.
+
+        Returns:
+            (row_ids, squared_distances), closest first
+        """
+        scale = FEATURE_SCALE[columns]
+        best_index = np.empty(0, dtype=np.int64)
+        best_distance = np.empty(0, dtype=np.float32)
+
+        for start in range(0, self.count, self.CHUNK_SIZE):
+            stop = min(start + self.CHUNK_SIZE, self.count)
+            diff = self.features[start:stop][:, columns] / scale - target
+            distance = np.einsum("ij,ij->i", diff, diff)
+
+            for column, codes in (category_codes or {}).items():
+                distance[~np.isin(self.categories[column][start:stop], codes)] = np.inf
+
+            # Keep only the best k of this chunk, then merge with the running best
+            if len(distance) > k:
+                top = np.argpartition(distance, k)[:k]
+            else:
+                top = np.arange(len(distance))
+            best_index = np.concatenate([best_index, top + start])
+            best_distance = np.concatenate([best_distance, distance[top]])
+            if len(best_distance) > k:
+                keep = np.argpartition(best_distance, k)[:k]
+                best_index, best_distance = best_index[keep], best_distance[keep]
+
+        order = np.argsort(best_distance, kind="stable")
+        order = order[np.isfinite(best_distance[order])]
+        return best_index[order], best_distance[order]
+
+    def nearest(self, target_features: Dict[str, object], k: int = 10,
+                languages: Optional[Sequence[str]] = None,
+                genres: Optional[Sequence[str]] = None,
+                exact: bool = False) -> List[Dict[str, object]]:
+        """
+        Find the k tracks closest to the target features.
+
+        Args:
+            target_features: MoodMapper feature dict for an emotion
+            k: Number of tracks to return
+            languages: Only consider tracks in these languages
+            genres: Only consider tracks in these genres
+            exact: Scan every row even if an ANN index is available
+
+        Returns:
+            Track dicts (id, name, artist, language, genre, distance), closest first
+        """
+        columns, target = self.target_vector(target_features)
+        if self.count == 0 or k <= 0 or len(columns) == 0:
+            return []
+
+        codes = self.category_codes(languages, genres)
+        if any(not values for values in codes.values()):
+            # A filter none of whose values is in the catalog matches no track
+            return []
+        rows = distances = None
+        if self.index is not None and not exact:
+            rows, distances = self.index.search(columns, target, k, category_codes=codes)
+        # Selective filters can leave the probed partitions short of k matches
+        if rows is None or len(rows) < k:
+            rows, distances = self.nearest_rows(columns, target, k, codes)
+
+        results = []
+        for row, distance in zip(rows, distances):
+            track = self.track(int(row))
+            track["distance"] = float(distance)
+            results.append(track)
+        return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build or query the local track catalog")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    ingest = subparsers.add_parser("ingest", help="Build a catalog from a CSV or Parquet file")
+    ingest.add_argument("source", help="CSV or Parquet file with track metadata and audio features")
+    ingest.add_argument("catalog", help="Output catalog directory")
+
+    query = subparsers.add_parser("query", help="Find tracks matching an emotion")
+    query.add_argument("catalog", help="Catalog directory")
+    query.add_argument("emotion", help="Emotion (sad, angry, fearful, happy, neutral)")
+    query.add_argument("-k", type=int, default=10)
+    query.add_argument("--languages", nargs="*")
+    query.add_argument("--genres", nargs="*")
+
+    args = parser.parse_args()
+    if args.command == "ingest":
+        count = build_catalog(iter_rows(args.source), args.catalog)
+        print(f"Wrote {count} tracks to {args.catalog}")
+    else:
+        from mood_mapper import MoodMapper
+
+        catalog = TrackCatalog(args.catalog)
+        target = MoodMapper().get_features_for_emotion(args.emotion)
+        for track in catalog.nearest(target, args.k, args.languages, args.genres):
+            print(f"{track['distance']:.4f}  '{track['name']}' by {track['artist']} ({track['language']})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,218 @@
+import threading
+from operator import attrgetter
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from records import AudioFeatures, Track
+
+# Audio features used for clustering, in matrix column order
+FEATURE_KEYS = ["energy", "valence", "danceability", "acousticness", "instrumentalness", "tempo"]
+ENERGY, VALENCE, DANCEABILITY, ACOUSTICNESS, INSTRUMENTALNESS, TEMPO = range(len(FEATURE_KEYS))
+
+# Tempo is divided by this to bring it to roughly [0, 1]
+TEMPO_SCALE = 200.0
+
+_feature_values = attrgetter(*FEATURE_KEYS)
+
+
+def features_matrix(features: List[AudioFeatures]) -> np.ndarray:
+    """Build the (n_tracks, n_features) clustering matrix from audio features."""
+    matrix = np.array([_feature_values(feature) for feature in features],
+                      dtype=np.float64).reshape(len(features), len(FEATURE_KEYS))
+    matrix[:, TEMPO] /= TEMPO_SCALE
+    return matrix
+
+
+def score_cluster_means(means: np.ndarray, emotion: str) -> np.ndarray:
+    """
+    Score every cluster's mean feature vector for how well it matches an emotion.
+
+    Args:
+        means: (n_clusters, n_features) matrix of per-cluster mean features
+        emotion: Raw emotion label (e.g. "sadness")
+
+    Returns:
+        One score per cluster, higher is a better match
+    """
+    energy, valence = means[:, ENERGY], means[:, VALENCE]
+    dance, tempo = means[:, DANCEABILITY], means[:, TEMPO]
+
+    # Score based on emotion (customize these mappings based on music psychology)
+    if emotion == "joy":
+        return (valence * 0.5) + (energy * 0.3) + (dance * 0.2)
+    if emotion == "sadness":
+        return ((1 - valence) * 0.5) + ((1 - energy) * 0.3) + ((1 - tempo) * 0.2)
+    if emotion == "anger":
+        return (energy * 0.6) + ((1 - valence) * 0.4)
+    if emotion == "fear":
+        return ((1 - valence) * 0.4) + (energy * 0.3) + ((1 - dance) * 0.3)
+    # Neutral or other: no preference
+    return np.full(len(means), 0.5)
+
+
+def cluster_means(matrix: np.ndarray, labels: np.ndarray, n_clusters: int) -> np.ndarray:
+    """Per-cluster mean of every feature, computed in one grouped reduction (empty clusters are NaN)."""
+    counts = np.bincount(labels, minlength=n_clusters).astype(np.float64)
+    sums = np.zeros((n_clusters, matrix.shape[1]))
+    np.add.at(sums, labels, matrix)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return sums / counts[:, None]
+
+
+class IncrementalKMeans:
+    """
+    Mini-batch k-means whose centroids persist between calls.
+
+    The first batch seeds the centroids with a full fit (k-means++ starts and
+    Lloyd iterations, best of n_init). Each later partial_fit moves every
+    centroid toward the mean of its rows in the batch with a rate of
+    1 / (points seen), but never less than min_rate, so the centroids keep
+    following the candidate pool instead of freezing after a few requests.
+
+    Updates build a new centroid array and swap it in, so predict never sees
+    a half-updated one.
+    """
+
+    def __init__(self, n_clusters: int = 3, seed: int = 42, min_rate: float = 0.1, n_init: int = 4,
+                 seed_iterations: int = 20):
+        """
+        Args:
+            n_clusters: Number of clusters
+            seed: Random seed of the initial fit
+            min_rate: Lower bound of the per-centroid update rate
+            n_init: k-means++ restarts of the initial fit
+            seed_iterations: Maximum Lloyd iterations of the initial fit
+        """
+        self.n_clusters = n_clusters
+        self.min_rate = min_rate
+        self.n_init = max(1, n_init)
+        self.seed_iterations = seed_iterations
+        self.centroids: Optional[np.ndarray] = None
+        self.counts = np.zeros(n_clusters)
+        self._rng = np.random.default_rng(seed)
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _assign(matrix: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+        distances = ((matrix[:, None, :] - centroids[None, :, :]) ** 2).sum(axis=2)
+        return distances.argmin(axis=1)
+
+    def predict(self, matrix: np.ndarray) -> np.ndarray:
+        """Nearest centroid for every row."""
+        return self._assign(matrix, self.centroids)
+
+    def _kmeans_plus_plus(self, matrix: np.ndarray) -> np.ndarray:
+        centroids = [matrix[self._rng.integers(len(matrix))]]
+        for _ in range(1, self.n_clusters):
+            distances = ((matrix[:, None, :] - np.array(centroids)[None, :, :]) ** 2).sum(axis=2).min(axis=1)
+            total = distances.sum()
+            probabilities = distances / total if total > 0 else None
+            centroids.append(matrix[self._rng.choice(len(matrix), p=probabilities)])
+        return np.array(centroids)
+
+    def _fit(self, matrix: np.ndarray) -> np.ndarray:
+        """Full k-means fit of one batch; returns the centroids with the lowest inertia."""
+        best, best_inertia = None, np.inf
+        for _ in range(self.n_init):
+            centroids = self._kmeans_plus_plus(matrix)
+            for _ in range(self.seed_iterations):
+                labels = self._assign(matrix, centroids)
+                means = cluster_means(matrix, labels, self.n_clusters)
+                # An empty cluster keeps its centroid
+                means = np.where(np.isnan(means), centroids, means)
+                converged = np.allclose(means, centroids)
+                centroids = means
+                if converged:
+                    break
+            inertia = ((matrix - centroids[self._assign(matrix, centroids)]) ** 2).sum()
+            if inertia < best_inertia:
+                best, best_inertia = centroids, inertia
+        return best
+
+    def partial_fit(self, matrix: np.ndarray) -> "IncrementalKMeans":
+        """Update the centroids with a mini-batch of rows (or fit them on the first one)."""
+        with self._lock:
+            if self.centroids is None:
+                if len(matrix) < self.n_clusters:
+                    return self
+                centroids = self._fit(matrix)
+                self.counts = np.bincount(self._assign(matrix, centroids), minlength=self.n_clusters).astype(float)
+                self.centroids = centroids
+                return self
+
+            labels = self.predict(matrix)
+            batch_counts = np.bincount(labels, minlength=self.n_clusters)
+            batch_means = cluster_means(matrix, labels, self.n_clusters)
+
+            updated = batch_counts > 0
+            counts = self.counts.copy()
+            counts[updated] += batch_counts[updated]
+            rate = np.maximum(batch_counts[updated] / counts[updated], self.min_rate)
+            centroids = self.centroids.copy()
+            centroids[updated] += rate[:, None] * (batch_means[updated] - centroids[updated])
+            self.counts = counts
+            self.centroids = centroids
+        return self
+
+    @property
+    def fitted(self) -> bool:
+        return self.centroids is not None
+
+
+class ClusterScorer:
+    """
+    Picks the tracks whose audio-feature cluster best matches an emotion.
+
+    Features are kept in one NumPy matrix, clusters come from a warm-started
+    IncrementalKMeans per emotion (candidate pools of different emotions
+    have different feature distributions), and every cluster is scored at
+    once from its mean feature vector.
+    """
+
+    def __init__(self, n_clusters: int = 3):
+        self.n_clusters = n_clusters
+        self.models: Dict[str, IncrementalKMeans] = {}
+        self._lock = threading.Lock()
+
+    def model(self, emotion: str) -> IncrementalKMeans:
+        """The k-means model of an emotion, created on first use."""
+        kmeans = self.models.get(emotion)
+        if kmeans is None:
+            with self._lock:
+                kmeans = self.models.setdefault(emotion, IncrementalKMeans(self.n_clusters))
+        return kmeans
+
+    def select(self, tracks: List[Track], features: List[AudioFeatures], emotion: str) -> List[Track]:
+        """
+        Return the tracks in the best matching cluster.
+
+        Features are matched to tracks by Spotify ID; tracks without features
+        are left out of clustering.
+
+        Args:
+            tracks: Candidate tracks
+            features: Audio features for (some of) the tracks
+            emotion: Raw emotion label
+
+        Returns:
+            The tracks of the best cluster, or all tracks if clustering is not possible
+        """
+        by_id = {feature.id: feature for feature in features if feature and feature.id}
+        clustered_tracks = [track for track in tracks if track.id in by_id]
+        # Only cluster if we have enough songs
+        if len(clustered_tracks) < self.n_clusters:
+            return tracks
+
+        matrix = features_matrix([by_id[track.id] for track in clustered_tracks])
+        kmeans = self.model(emotion).partial_fit(matrix)
+        if not kmeans.fitted:
+            return tracks
+
+        labels = kmeans.predict(matrix)
+        scores = score_cluster_means(cluster_means(matrix, labels, self.n_clusters), emotion)
+        scores = np.where(np.isnan(scores), -np.inf, scores)
+        best_cluster = int(scores.argmax())
+
+        best_tracks = [track for track, label in zip(clustered_tracks, labels) if label == best_cluster]
+        return best_tracks if best_tracks else tracks
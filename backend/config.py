@@ -0,0 +1,152 @@
+import os
+from dotenv import load_dotenv
+
+# Load environment variables before any setting is read
+load_dotenv()
+
+
+def _get_bool(name, default):
+    value = os.getenv(name)
+    if value is None:
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+
+def _get_int(name, default):
+    value = os.getenv(name)
+    return int(value) if value else default
+
+
+def _get_list(name, default):
+    value = os.getenv(name)
+    if value is None:
+        return default
+    return [item.strip() for item in value.split(",") if item.strip()]
+
+
+def _get_float(name, default):
+    value = os.getenv(name)
+    return float(value) if value else default
+
+
+# When the emotion model is loaded by app.py: "eager" (at import), "background"
+# (in a thread at startup) or "lazy" (on the first request)
+MODEL_PRELOAD = os.getenv("MODEL_PRELOAD", "background").strip().lower()
+
+# Request limits: num_songs above MAX_SONGS_PER_REQUEST is clamped, and a
+# /recommend/batch request with more than MAX_BATCH_TEXTS texts is refused
+MAX_SONGS_PER_REQUEST = _get_int("MAX_SONGS_PER_REQUEST", 20)
+MAX_BATCH_TEXTS = _get_int("MAX_BATCH_TEXTS", 100)
+
+# Set by gunicorn.conf.py: the app is imported once in the parent and forked into
+# WEB_WORKERS workers, which start their own background threads
+PREFORK = _get_bool("PREFORK", False)
+WEB_WORKERS = _get_int("WEB_WORKERS", os.cpu_count() or 1)
+
+# Emotion inference backend: "tf", "onnx", "onnx-int8" (see export_onnx.py) or
+# "tf-early-exit" (see early_exit.py)
+EMOTION_BACKEND = os.getenv("EMOTION_BACKEND", "tf").strip().lower()
+EMOTION_ONNX_PATH = os.getenv("EMOTION_ONNX_PATH", "")
+ONNX_INTRA_OP_THREADS = _get_int("ONNX_INTRA_OP_THREADS", 0)
+
+# TF backend: run the model as one compiled graph per length bucket (tf.function
+# with a fixed [batch, length] input signature) instead of eagerly, optionally
+# XLA-compiled
+EMOTION_TF_COMPILE = _get_bool("EMOTION_TF_COMPILE", True)
+EMOTION_TF_XLA = _get_bool("EMOTION_TF_XLA", False)
+
+# Run a text corpus through every length bucket when the model is loaded, before
+# the worker reports ready, so graph tracing and compilation stay off requests
+EMOTION_WARMUP = _get_bool("EMOTION_WARMUP", True)
+EMOTION_WARMUP_CORPUS = os.getenv(
+    "EMOTION_WARMUP_CORPUS", os.path.join(os.path.dirname(__file__), "benchmarks", "emotion_corpus.txt"))
+EMOTION_WARMUP_STEADY_CALLS = _get_int("EMOTION_WARMUP_STEADY_CALLS", 2)
+
+# Early-exit backend: calibrated exit heads (default <model>/early_exit/heads.npz)
+# and one confidence threshold for every head (0 = each head's calibrated one)
+EMOTION_EARLY_EXIT_PATH = os.getenv("EMOTION_EARLY_EXIT_PATH", "")
+EMOTION_EARLY_EXIT_THRESHOLD = _get_float("EMOTION_EARLY_EXIT_THRESHOLD", 0.0)
+
+# Tokenization: inputs are grouped into these padded lengths, and texts longer
+# than EMOTION_MAX_LENGTH tokens use EMOTION_LONG_TEXT_STRATEGY ("truncate",
+# "head_tail" or "sliding_window"; see tokenization.py)
+EMOTION_MAX_LENGTH = _get_int("EMOTION_MAX_LENGTH", 512)
+EMOTION_LENGTH_BUCKETS = [int(b) for b in _get_list("EMOTION_LENGTH_BUCKETS", ["16", "32", "64", "128", "256", "512"])]
+EMOTION_LONG_TEXT_STRATEGY = os.getenv("EMOTION_LONG_TEXT_STRATEGY", "truncate").strip().lower()
+EMOTION_HEAD_TOKENS = _get_int("EMOTION_HEAD_TOKENS", 128)
+EMOTION_WINDOW_STRIDE = _get_int("EMOTION_WINDOW_STRIDE", 256)
+EMOTION_MAX_WINDOWS = _get_int("EMOTION_MAX_WINDOWS", 8)
+EMOTION_MAX_BATCH_TOKENS = _get_int("EMOTION_MAX_BATCH_TOKENS", 8192)
+
+# Emotion score cache keyed by normalized text; set EMOTION_CACHE_PATH to a file
+# (e.g. under /dev/shm) to share it between worker processes. The file is
+# replaced when the model, backend or tokenization settings change
+EMOTION_CACHE = _get_bool("EMOTION_CACHE", True)
+EMOTION_CACHE_SIZE = _get_int("EMOTION_CACHE_SIZE", 65536)
+EMOTION_CACHE_PATH = os.getenv("EMOTION_CACHE_PATH", "")
+
+# Emotion inference micro-batching
+EMOTION_BATCHING = _get_bool("EMOTION_BATCHING", True)
+EMOTION_BATCH_MAX_SIZE = _get_int("EMOTION_BATCH_MAX_SIZE", 32)
+EMOTION_BATCH_WINDOW_MS = _get_float("EMOTION_BATCH_WINDOW_MS", 5.0)
+
+# Spotify endpoints; point these at a local stub server for load tests
+SPOTIFY_API_URL = os.getenv("SPOTIFY_API_URL", "https://api.spotify.com").rstrip("/")
+SPOTIFY_ACCOUNTS_URL = os.getenv("SPOTIFY_ACCOUNTS_URL", "https://accounts.spotify.com").rstrip("/")
+
+# Spotify HTTP client
+SPOTIFY_POOL_SIZE = _get_int("SPOTIFY_POOL_SIZE", 16)
+SPOTIFY_MAX_WORKERS = _get_int("SPOTIFY_MAX_WORKERS", 16)
+SPOTIFY_REQUEST_TIMEOUT_S = _get_float("SPOTIFY_REQUEST_TIMEOUT_S", 5.0)
+SPOTIFY_SEARCH_DEADLINE_S = _get_float("SPOTIFY_SEARCH_DEADLINE_S", 2.0)
+
+# Spotify rate limiting and failure handling (per process, see spotify_guard.py):
+# a token bucket of SPOTIFY_RATE_LIMIT_RPS requests/s, retries with backoff (or
+# the 429's Retry-After), and a circuit breaker that opens after
+# SPOTIFY_BREAKER_FAILURES consecutive failures for SPOTIFY_BREAKER_RESET_S
+SPOTIFY_RATE_LIMIT_RPS = _get_float("SPOTIFY_RATE_LIMIT_RPS", 20.0)
+SPOTIFY_RATE_LIMIT_BURST = _get_int("SPOTIFY_RATE_LIMIT_BURST", 40)
+SPOTIFY_MAX_RETRIES = _get_int("SPOTIFY_MAX_RETRIES", 2)
+SPOTIFY_RETRY_BACKOFF_S = _get_float("SPOTIFY_RETRY_BACKOFF_S", 0.2)
+SPOTIFY_BREAKER_FAILURES = _get_int("SPOTIFY_BREAKER_FAILURES", 5)
+SPOTIFY_BREAKER_RESET_S = _get_float("SPOTIFY_BREAKER_RESET_S", 30.0)
+
+# Spotify response caches; set SPOTIFY_CACHE_DB to a file path to persist them
+SPOTIFY_CACHE_DB = os.getenv("SPOTIFY_CACHE_DB", "")
+SPOTIFY_SEARCH_CACHE_SIZE = _get_int("SPOTIFY_SEARCH_CACHE_SIZE", 1024)
+SPOTIFY_SEARCH_CACHE_TTL_S = _get_float("SPOTIFY_SEARCH_CACHE_TTL_S", 6 * 3600)
+SPOTIFY_FEATURES_CACHE_SIZE = _get_int("SPOTIFY_FEATURES_CACHE_SIZE", 50000)
+SPOTIFY_FEATURES_CACHE_TTL_S = _get_float("SPOTIFY_FEATURES_CACHE_TTL_S", 7 * 24 * 3600)
+
+# Audio features: SQLite feature store (defaults to SPOTIFY_CACHE_DB; shared with
+# `python feature_fetcher.py` warm-up jobs), chunks fetched in parallel, and
+# attempts per chunk in warm-up jobs (request paths rely on the client's retries)
+SPOTIFY_FEATURE_STORE = os.getenv("SPOTIFY_FEATURE_STORE", "")
+SPOTIFY_FEATURE_CONCURRENCY = _get_int("SPOTIFY_FEATURE_CONCURRENCY", 8)
+SPOTIFY_FEATURE_MAX_ATTEMPTS = _get_int("SPOTIFY_FEATURE_MAX_ATTEMPTS", 3)
+
+# Spotify access tokens are renewed in the background this long before they expire
+SPOTIFY_TOKEN_REFRESH_MARGIN_S = _get_float("SPOTIFY_TOKEN_REFRESH_MARGIN_S", 300)
+
+# Local track catalog directory built with `python catalog.py ingest`; empty disables it
+TRACK_CATALOG_PATH = os.getenv("TRACK_CATALOG_PATH", os.path.join(os.path.dirname(__file__), "data", "catalog"))
+
+# Song database (CSV or Parquet with emotion, language, title, artist) used for
+# language-filtered recommendations; see song_store.py
+SONG_DATABASE_PATH = os.getenv("SONG_DATABASE_PATH", os.path.join(os.path.dirname(__file__), "data", "songs.csv"))
+
+# Precomputed per-(emotion, language, market) candidate pools refreshed in the background
+CANDIDATE_POOLS = _get_bool("CANDIDATE_POOLS", True)
+CANDIDATE_POOL_LANGUAGES = _get_list("CANDIDATE_POOL_LANGUAGES", ["hindi", "malayalam"])
+CANDIDATE_POOL_MARKETS = _get_list("CANDIDATE_POOL_MARKETS", ["US"])
+CANDIDATE_POOL_REFRESH_S = _get_float("CANDIDATE_POOL_REFRESH_S", 900)
+CANDIDATE_POOL_SIZE = _get_int("CANDIDATE_POOL_SIZE", 200)
+
+# Async (ASGI) serving mode, see asgi_app.py
+ASGI_INFERENCE_WORKERS = _get_int("ASGI_INFERENCE_WORKERS", 4)
+ASGI_MAX_PENDING_INFERENCE = _get_int("ASGI_MAX_PENDING_INFERENCE", 256)
+ASGI_SPOTIFY_MAX_CONNECTIONS = _get_int("ASGI_SPOTIFY_MAX_CONNECTIONS", 100)
+
+# Per-request tracing: when enabled, requests sent with an X-Debug-Trace header
+# get their stage timings back in Server-Timing and X-Debug-Trace headers
+TRACE_HEADER = _get_bool("TRACE_HEADER", False)
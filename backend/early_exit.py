@@ -0,0 +1,371 @@
+"""
+Confidence-based early exit for the emotion model.
+
+Exit heads (one linear layer on the <s> token, like the model's own
+classifier reads) sit after intermediate transformer layers. They are fitted
+offline to reproduce the full model's predictions on a text corpus, then
+calibrated on held-out texts: each head gets a softmax temperature and a
+confidence threshold, the lowest at which the texts it is that confident
+about agree with the full model at the target rate. At inference a batch
+runs layer by layer; every text whose head clears its threshold stops there
+and the rest continue, so short unambiguous texts use a fraction of the
+layers while hard ones still get the full model.
+
+    python early_exit.py calibrate --corpus texts.txt      # writes <model>/early_exit/heads.npz
+    EMOTION_BACKEND=tf-early-exit python app.py
+    python benchmarks/eval_early_exit.py --corpus held_out.txt
+"""
+import argparse
+import json
+import os
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+import config
+from inference_backends import warmup_batch_sizes
+from metrics import REGISTRY
+
+EXIT_LAYERS = REGISTRY.histogram(
+    "emotion_exit_layer", "Transformer layers run per input by the early-exit backend",
+    buckets=(1, 2, 3, 4, 5, 6, 8, 12, 24))
+
+
+def early_exit_path(model_path: str) -> str:
+    """Location of the calibrated exit heads inside a model directory."""
+    return os.path.join(model_path, "early_exit", "heads.npz")
+
+
+def softmax(logits: np.ndarray) -> np.ndarray:
+    logits = logits - logits.max(axis=1, keepdims=True)
+    exp = np.exp(logits)
+    return exp / exp.sum(axis=1, keepdims=True)
+
+
+class ExitHeads:
+    """Linear exit heads after some transformer layers, with their temperatures and thresholds."""
+
+    def __init__(self, layers: Sequence[int], weights: np.ndarray, biases: np.ndarray,
+                 temperatures: np.ndarray, thresholds: np.ndarray):
+        """
+        Args:
+            layers: 1-based transformer layer each head reads the output of
+            weights: (heads, hidden_size, num_labels)
+            biases: (heads, num_labels)
+            temperatures: Softmax temperature per head
+            thresholds: Confidence (top probability) at which a head's prediction is used; inf disables it
+        """
+        self.layers = [int(layer) for layer in layers]
+        self.weights = np.asarray(weights, dtype=np.float32)
+        self.biases = np.asarray(biases, dtype=np.float32)
+        self.temperatures = np.asarray(temperatures, dtype=np.float32)
+        self.thresholds = np.asarray(thresholds, dtype=np.float64)
+        self.by_layer = {layer: i for i, layer in enumerate(self.layers)}
+
+    @classmethod
+    def load(cls, path: str) -> "ExitHeads":
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"Early-exit heads not found at {path}; run `python early_exit.py calibrate` first")
+        data = np.load(path)
+        return cls(data["layers"], data["weights"], data["biases"], data["temperatures"], data["thresholds"])
+
+    def save(self, path: str):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        np.savez(path, layers=np.array(self.layers), weights=self.weights, biases=self.biases,
+                 temperatures=self.temperatures, thresholds=self.thresholds)
+
+    def logits(self, head: int, states: np.ndarray) -> np.ndarray:
+        """Temperature-scaled logits of one head for <s> hidden states of shape (rows, hidden_size)."""
+        return (states @ self.weights[head] + self.biases[head]) / self.temperatures[head]
+
+
+class LayerwiseModel:
+    """
+    Runs a TFRobertaForSequenceClassification one transformer layer at a time.
+
+    Each step is a tf.function with a fixed signature (dynamic batch and
+    length) when EMOTION_TF_COMPILE is on, so it is traced once per process.
+    """
+
+    def __init__(self, model, compiled: Optional[bool] = None):
+        import tensorflow as tf
+
+        self.model = model
+        self.layers = model.roberta.encoder.layer
+        compiled = config.EMOTION_TF_COMPILE if compiled is None else compiled
+        hidden_size = model.config.hidden_size
+        tokens = tf.TensorSpec([None, None], tf.int64)
+        hidden = tf.TensorSpec([None, None, hidden_size], tf.float32)
+        mask = tf.TensorSpec([None, 1, 1, None], tf.float32)
+
+        def wrap(fn, *signature):
+            return tf.function(fn, input_signature=list(signature)) if compiled else fn
+
+        self.embed = wrap(self._embed, tokens, tokens)
+        self.classify = wrap(self._classify, hidden)
+        self._steps = [wrap(self._layer_step(layer), hidden, mask) for layer in self.layers]
+
+    def _embed(self, input_ids, attention_mask):
+        import tensorflow as tf
+
+        hidden = self.model.roberta.embeddings(input_ids=input_ids, training=False)
+        # Same additive mask TFRobertaMainLayer builds: 0 for tokens, -10000 for padding
+        mask = tf.cast(attention_mask[:, None, None, :], hidden.dtype)
+        return hidden, (1.0 - mask) * -10000.0
+
+    def _classify(self, hidden):
+        return self.model.classifier(hidden, training=False)
+
+    @staticmethod
+    def _layer_step(layer):
+        def step(hidden, mask):
+            return layer(hidden_states=hidden, attention_mask=mask, head_mask=None, encoder_hidden_states=None,
+                         encoder_attention_mask=None, past_key_value=None, output_attentions=False,
+                         training=False)[0]
+        return step
+
+    def layer(self, index: int, hidden, mask):
+        """Run the transformer layer at a 0-based index."""
+        return self._steps[index](hidden, mask)
+
+    def cls_states(self, input_ids: np.ndarray, attention_mask: np.ndarray) -> Tuple[List[np.ndarray], np.ndarray]:
+        """
+        Run every layer on a batch.
+
+        Returns:
+            (<s> hidden state after each layer, final logits)
+        """
+        hidden, mask = self.embed(input_ids, attention_mask)
+        states = []
+        for index in range(len(self.layers)):
+            hidden = self.layer(index, hidden, mask)
+            states.append(hidden[:, 0, :].numpy())
+        return states, self.classify(hidden).numpy()
+
+
+class EarlyExitTFBackend:
+    """Runs the classifier layer by layer and stops each input at the first confident exit head."""
+
+    name = "tf-early-exit"
+
+    def __init__(self, model_path: str, heads_path: Optional[str] = None, threshold: Optional[float] = None):
+        """
+        Args:
+            model_path: Local emotion model directory
+            heads_path: Calibrated exit heads (default <model_path>/early_exit/heads.npz)
+            threshold: One confidence threshold for every head instead of the calibrated
+                ones (default EMOTION_EARLY_EXIT_THRESHOLD; 0 means calibrated)
+        """
+        from transformers import TFAutoModelForSequenceClassification
+
+        self.model = LayerwiseModel(TFAutoModelForSequenceClassification.from_pretrained(model_path))
+        self.heads = ExitHeads.load(heads_path or early_exit_path(model_path))
+        threshold = config.EMOTION_EARLY_EXIT_THRESHOLD if threshold is None else threshold
+        self.threshold = threshold or None
+        self.num_layers = len(self.model.layers)
+        # Trace every step now: exits mean a warm-up batch may never reach the last layers
+        self.predict_with_layers({"input_ids": np.array([[0, 2]]), "attention_mask": np.ones((1, 2))},
+                                 threshold=np.inf, record=False)
+
+    def warmup_batch_sizes(self, max_rows: int) -> List[int]:
+        return warmup_batch_sizes(max_rows)
+
+    def predict_logits(self, encoded: Dict[str, np.ndarray]) -> np.ndarray:
+        """Return the logits for a batch of tokenized inputs."""
+        return self.predict_with_layers(encoded)[0]
+
+    def warmup_logits(self, encoded: Dict[str, np.ndarray]) -> np.ndarray:
+        """predict_logits for warm-up batches, which are left out of the emotion_exit_layer histogram."""
+        return self.predict_with_layers(encoded, record=False)[0]
+
+    def predict_with_layers(self, encoded: Dict[str, np.ndarray], threshold: Optional[float] = None,
+                            record: bool = True) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Classify a batch, letting each input exit at the first head confident enough.
+
+        Args:
+            encoded: input_ids / attention_mask arrays
+            threshold: Confidence threshold for every head; None uses the backend's
+                (calibrated per head unless overridden), inf runs the full model
+            record: Record the layers run in the emotion_exit_layer histogram
+
+        Returns:
+            (logits, number of transformer layers run per input)
+        """
+        import tensorflow as tf
+
+        input_ids = np.asarray(encoded["input_ids"], dtype=np.int64)
+        attention_mask = np.asarray(encoded["attention_mask"], dtype=np.int64)
+        rows = len(input_ids)
+        threshold = self.threshold if threshold is None else threshold
+        logits = np.zeros((rows, self.heads.biases.shape[1]), dtype=np.float32)
+        layers_run = np.full(rows, self.num_layers)
+        active = np.arange(rows)
+
+        hidden, mask = self.model.embed(input_ids, attention_mask)
+        for index in range(self.num_layers):
+            hidden = self.model.layer(index, hidden, mask)
+            head = self.heads.by_layer.get(index + 1)
+            if head is None or index + 1 == self.num_layers:
+                continue
+            head_logits = self.heads.logits(head, hidden[:, 0, :].numpy())
+            head_threshold = self.heads.thresholds[head] if threshold is None else threshold
+            confident = softmax(head_logits).max(axis=1) >= head_threshold
+            if not confident.any():
+                continue
+            logits[active[confident]] = head_logits[confident]
+            layers_run[active[confident]] = index + 1
+            keep = np.flatnonzero(~confident)
+            active = active[keep]
+            if not len(active):
+                break
+            hidden, mask = tf.gather(hidden, keep), tf.gather(mask, keep)
+
+        if len(active):
+            logits[active] = self.model.classify(hidden).numpy()
+        if record:
+            for layers in layers_run:
+                EXIT_LAYERS.observe(layers)
+        return logits, layers_run
+
+
+def fit_head(states: np.ndarray, teacher_logits: np.ndarray, l2: float = 1e-3, steps: int = 500,
+             learning_rate: float = 0.5) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Fit a linear head to the full model's probabilities (softmax regression on soft targets).
+
+    Features are standardized for the gradient descent and the scaling is
+    folded back into the returned weights, so the head applies to raw states.
+
+    Returns:
+        (weights of shape (hidden_size, num_labels), biases of shape (num_labels,))
+    """
+    mean, std = states.mean(axis=0), states.std(axis=0) + 1e-6
+    x = (states - mean) / std
+    targets = softmax(teacher_logits)
+    weights = np.zeros((x.shape[1], targets.shape[1]))
+    biases = np.zeros(targets.shape[1])
+    for _ in range(steps):
+        gradient = (softmax(x @ weights + biases) - targets) / len(x)
+        weights -= learning_rate * (x.T @ gradient + l2 * weights)
+        biases -= learning_rate * gradient.sum(axis=0)
+    weights = weights / std[:, None]
+    return weights, biases - mean @ weights
+
+
+def fit_temperature(logits: np.ndarray, labels: np.ndarray) -> float:
+    """Temperature minimizing the negative log-likelihood of the full model's labels."""
+    best, best_nll = 1.0, np.inf
+    for temperature in np.geomspace(0.25, 4.0, 41):
+        probabilities = softmax(logits / temperature)
+        nll = -np.log(probabilities[np.arange(len(labels)), labels] + 1e-12).mean()
+        if nll < best_nll:
+            best, best_nll = float(temperature), nll
+    return best
+
+
+def pick_threshold(confidence: np.ndarray, agrees: np.ndarray, target_agreement: float,
+                   min_support: int = 10) -> float:
+    """
+    Lowest confidence threshold at which the inputs above it agree with the full model at target_agreement.
+
+    Returns inf (head never used) if no threshold with at least min_support inputs reaches it.
+    """
+    order = np.argsort(-confidence, kind="stable")
+    agreement = np.cumsum(agrees[order]) / np.arange(1, len(order) + 1)
+    ok = np.flatnonzero((agreement >= target_agreement) & (np.arange(1, len(order) + 1) >= min_support))
+    # Only cut where the confidence changes, so equal confidences are all in or all out
+    ok = [i for i in ok if i + 1 == len(order) or confidence[order[i + 1]] < confidence[order[i]]]
+    return float(confidence[order[ok[-1]]]) if ok else float("inf")
+
+
+def calibrate(model: LayerwiseModel, tokenizer, texts: Sequence[str], layers: Sequence[int],
+              target_agreement: float = 0.98, held_out: float = 0.2, batch_size: int = 16,
+              seed: int = 0) -> Tuple[ExitHeads, Dict[str, object]]:
+    """
+    Fit and calibrate exit heads against the full model.
+
+    Heads are fitted on (1 - held_out) of the texts; temperatures, thresholds
+    and the reported agreement come from the held-out rest.
+
+    Returns:
+        (heads, report with per-layer agreement, threshold and exit rate)
+    """
+    states, final_logits = [[] for _ in model.layers], []
+    for start in range(0, len(texts), batch_size):
+        encoded = tokenizer(list(texts[start:start + batch_size]), return_tensors="np", padding=True,
+                            truncation=True, max_length=512)
+        batch_states, batch_logits = model.cls_states(encoded["input_ids"], encoded["attention_mask"])
+        for index, layer_states in enumerate(batch_states):
+            states[index].append(layer_states)
+        final_logits.append(batch_logits)
+    final_logits = np.concatenate(final_logits)
+    labels = final_logits.argmax(axis=1)
+
+    order = np.random.default_rng(seed).permutation(len(texts))
+    split = max(1, int(len(texts) * (1 - held_out)))
+    train, test = order[:split], order[split:] if split < len(texts) else order[:split]
+
+    weights, biases, temperatures, thresholds, report = [], [], [], [], {"layers": []}
+    for layer in layers:
+        layer_states = np.concatenate(states[layer - 1])
+        head_weights, head_biases = fit_head(layer_states[train], final_logits[train])
+        logits = layer_states[test] @ head_weights + head_biases
+        temperature = fit_temperature(logits, labels[test])
+        probabilities = softmax(logits / temperature)
+        agrees = probabilities.argmax(axis=1) == labels[test]
+        threshold = pick_threshold(probabilities.max(axis=1), agrees, target_agreement)
+        exits = probabilities.max(axis=1) >= threshold
+
+        weights.append(head_weights)
+        biases.append(head_biases)
+        temperatures.append(temperature)
+        thresholds.append(threshold)
+        report["layers"].append({
+            "layer": layer, "agreement": float(agrees.mean()), "temperature": temperature,
+            "threshold": threshold, "exit_rate": float(exits.mean()),
+            "exit_agreement": float(agrees[exits].mean()) if exits.any() else None,
+        })
+
+    report.update(texts=len(texts), held_out=len(test), target_agreement=target_agreement)
+    return ExitHeads(layers, np.stack(weights), np.stack(biases), np.array(temperatures), np.array(thresholds)), report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fit and calibrate early-exit heads for the emotion model")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    command = subparsers.add_parser("calibrate", help="Fit exit heads against the full model on a text corpus")
+    command.add_argument("--model-path", default="models/emotion_model", help="Local TF model directory")
+    command.add_argument("--corpus", default=config.EMOTION_WARMUP_CORPUS, help="One text per line")
+    command.add_argument("--layers", type=int, nargs="*", help="Layers to put exit heads after (default: all but the last)")
+    command.add_argument("--target-agreement", type=float, default=0.98,
+                         help="Agreement with the full model required of the inputs a head lets exit")
+    command.add_argument("--held-out", type=float, default=0.2, help="Fraction of texts kept for calibration")
+    command.add_argument("--batch-size", type=int, default=16)
+    command.add_argument("--out", help="Heads file (default <model-path>/early_exit/heads.npz)")
+    args = parser.parse_args()
+
+    from transformers import AutoTokenizer, TFAutoModelForSequenceClassification
+
+    with open(args.corpus, encoding="utf-8") as f:
+        texts = [line.strip() for line in f if line.strip()]
+    if len(texts) < 1000:
+        print(f"Only {len(texts)} texts in {args.corpus}; thresholds from a small corpus are unreliable")
+
+    model = LayerwiseModel(TFAutoModelForSequenceClassification.from_pretrained(args.model_path))
+    layers = args.layers or list(range(1, len(model.layers)))
+    heads, report = calibrate(model, AutoTokenizer.from_pretrained(args.model_path), texts, layers,
+                              args.target_agreement, args.held_out, args.batch_size)
+
+    out = args.out or early_exit_path(args.model_path)
+    heads.save(out)
+    with open(os.path.splitext(out)[0] + ".json", "w") as f:
+        json.dump(report, f, indent=2)
+    for layer in report["layers"]:
+        print(f"layer {layer['layer']}: agreement {layer['agreement']:.3f}, threshold {layer['threshold']:.3f}, "
+              f"exit rate {layer['exit_rate']:.2f}")
+    print(f"Wrote exit heads to {out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+"""
+Export the TF emotion model to ONNX and write a dynamically quantized int8 copy.
+
+    pip install -r requirements-onnx.txt
+    python export_onnx.py                      # models/emotion_model/onnx/model{,.int8}.onnx
+    EMOTION_BACKEND=onnx-int8 python app.py
+
+Check the result with benchmarks/check_backend_parity.py before switching backends.
+"""
+import argparse
+import os
+
+from inference_backends import onnx_model_path
+
+
+def export_fp32(model_path: str, out_path: str, opset: int):
+    """Convert the TF SavedModel weights in model_path to an ONNX graph with dynamic batch/sequence axes."""
+    import tensorflow as tf
+    import tf2onnx
+    from transformers import TFAutoModelForSequenceClassification
+
+    model = TFAutoModelForSequenceClassification.from_pretrained(model_path)
+
+    @tf.function(input_signature=[tf.TensorSpec([None, None], tf.int64, name="input_ids"),
+                                  tf.TensorSpec([None, None], tf.int64, name="attention_mask")])
+    def serve(input_ids, attention_mask):
+        return {"logits": model({"input_ids": input_ids, "attention_mask": attention_mask}).logits}
+
+    tf2onnx.convert.from_function(serve, input_signature=serve.input_signature, opset=opset, output_path=out_path)
+    print(f"Exported fp32 ONNX model to {out_path}")
+
+
+def quantize_int8(fp32_path: str, out_path: str):
+    """Dynamic (weight-only, activations quantized at run time) int8 quantization of the fp32 graph."""
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+
+    quantize_dynamic(fp32_path, out_path, weight_type=QuantType.QInt8)
+    print(f"Wrote int8 ONNX model to {out_path}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export the emotion model to ONNX (fp32 and int8)")
+    parser.add_argument("--model-path", default="models/emotion_model", help="Local TF model directory")
+    parser.add_argument("--opset", type=int, default=13, help="ONNX opset version")
+    parser.add_argument("--skip-quantize", action="store_true", help="Only write the fp32 model")
+    args = parser.parse_args()
+
+    fp32_path = onnx_model_path(args.model_path, quantized=False)
+    os.makedirs(os.path.dirname(fp32_path), exist_ok=True)
+    export_fp32(args.model_path, fp32_path, args.opset)
+    if not args.skip_quantize:
+        quantize_int8(fp32_path, onnx_model_path(args.model_path, quantized=True))
+
+
+if __name__ == "__main__":
+    main()
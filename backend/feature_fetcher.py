@@ -0,0 +1,245 @@
+"""
+Bulk audio-feature fetching for request paths and catalog warm-up jobs.
+
+IDs are de-duplicated and looked up in the feature cache (and its on-disk
+store) in bulk; only the rest goes to Spotify, in chunks of 100 fetched
+concurrently. Results are yielded as each chunk arrives, so a caller can
+write them out while later chunks are still in flight.
+
+To add audio features to a track list before `python catalog.py ingest`:
+
+    python feature_fetcher.py tracks.csv tracks_with_features.csv --concurrency 8
+"""
+import argparse
+import csv
+import itertools
+import os
+import random
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+import config
+from cache import SQLiteStore, TTLCache
+from catalog import FEATURE_COLUMNS, iter_rows
+from metrics import REGISTRY
+from records import AudioFeatures
+
+FEATURES_FETCHED = REGISTRY.counter(
+    "audio_features_total", "Audio features served, by source (cache or spotify)", ["source"])
+FEATURE_CHUNK_FAILURES = REGISTRY.counter(
+    "audio_feature_chunk_failures_total", "Audio-feature chunks that failed, by outcome (retried or dropped)",
+    ["outcome"])
+
+# Spotify's limit on IDs per audio-features request
+CHUNK_SIZE = 100
+
+
+@dataclass
+class FetchProgress:
+    """Running totals of one fetch, passed to the progress callback after every chunk."""
+
+    total: int = 0
+    cached: int = 0
+    fetched: int = 0
+    not_found: int = 0
+    failed: List[str] = field(default_factory=list)
+    started: float = field(default_factory=time.monotonic)
+
+    @property
+    def done(self) -> int:
+        return self.cached + self.fetched + self.not_found + len(self.failed)
+
+    @property
+    def elapsed(self) -> float:
+        return time.monotonic() - self.started
+
+    @property
+    def ids_per_second(self) -> float:
+        """Throughput of the IDs that needed a Spotify call."""
+        elapsed = self.elapsed
+        return (self.fetched + self.not_found) / elapsed if elapsed > 0 else 0.0
+
+    def __str__(self):
+        return (f"{self.done}/{self.total} ids ({self.cached} cached, {self.fetched} fetched, "
+                f"{self.not_found} not found, {len(self.failed)} failed) in {self.elapsed:.1f}s, "
+                f"{self.ids_per_second:.0f} ids/s")
+
+
+class FeatureFetcher:
+    """
+    Fetches audio features for many track IDs with bounded parallelism and retry.
+
+    A chunk that fails is retried up to max_attempts times with backoff (on
+    top of the per-request retries of the Spotify client); IDs of chunks that
+    still fail are reported in FetchProgress.failed instead of being dropped
+    silently.
+    """
+
+    def __init__(self, fetch_chunk: Callable[[Sequence[str]], List[AudioFeatures]], cache: TTLCache,
+                 concurrency: int = None, max_attempts: int = None, retry_backoff: float = None):
+        """
+        Args:
+            fetch_chunk: Fetches features for up to 100 IDs from Spotify; raises on failure
+            cache: Feature cache; its store, if any, is the persistent feature store
+            concurrency: Maximum number of chunks in flight
+            max_attempts: Attempts per chunk
+            retry_backoff: Base of the exponential backoff between attempts, in seconds
+        """
+        self.fetch_chunk = fetch_chunk
+        self.cache = cache
+        self.concurrency = max(1, concurrency or config.SPOTIFY_FEATURE_CONCURRENCY)
+        self.max_attempts = max(1, max_attempts or config.SPOTIFY_FEATURE_MAX_ATTEMPTS)
+        self.retry_backoff = retry_backoff if retry_backoff is not None else config.SPOTIFY_RETRY_BACKOFF_S
+        self._open()
+        # Executor threads do not survive fork(): pre-fork workers get their own
+        os.register_at_fork(after_in_child=self._open)
+
+    def _open(self):
+        self._executor = ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="audio-features")
+
+    def _fetch_with_retry(self, chunk: Tuple[str, ...]) -> List[AudioFeatures]:
+        for attempt in range(self.max_attempts):
+            try:
+                return self.fetch_chunk(chunk)
+            except Exception as e:
+                if attempt + 1 == self.max_attempts:
+                    FEATURE_CHUNK_FAILURES.inc(outcome="dropped")
+                    raise
+                FEATURE_CHUNK_FAILURES.inc(outcome="retried")
+                print(f"Audio-features chunk failed ({e}), retrying")
+                time.sleep(random.uniform(0.5, 1.0) * self.retry_backoff * 2 ** attempt)
+
+    def fetch(self, track_ids: Iterable[str],
+              progress: Optional[Callable[[FetchProgress], None]] = None,
+              state: Optional[FetchProgress] = None) -> Iterator[AudioFeatures]:
+        """
+        Yield the audio features of track_ids as they become available.
+
+        Cached features come first, then each fetched chunk as it completes
+        (not in input order). IDs Spotify has no features for are skipped.
+
+        Args:
+            track_ids: Spotify track IDs; duplicates are fetched once
+            progress: Called with the running totals after every chunk
+            state: Progress object to update, e.g. to read the failed IDs after the call
+
+        Yields:
+            AudioFeatures records
+        """
+        ids = list(dict.fromkeys(track_ids))
+        state = state or FetchProgress()
+        state.total += len(ids)
+
+        cached = self.cache.get_many(ids)
+        state.cached += len(cached)
+        FEATURES_FETCHED.inc(len(cached), source="cache")
+        yield from cached.values()
+
+        missing = [track_id for track_id in ids if track_id not in cached]
+        chunks = (tuple(missing[i:i + CHUNK_SIZE]) for i in range(0, len(missing), CHUNK_SIZE))
+        in_flight: Dict[Future, Tuple[str, ...]] = {}
+        # Keep a couple of chunks queued per worker so none sits idle between chunks
+        window = self.concurrency * 2
+
+        def submit():
+            for chunk in chunks:
+                in_flight[self._executor.submit(self._fetch_with_retry, chunk)] = chunk
+                if len(in_flight) >= window:
+                    break
+
+        submit()
+        while in_flight:
+            done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in done:
+                chunk = in_flight.pop(future)
+                try:
+                    features = future.result()
+                except Exception as e:
+                    print(f"Giving up on audio features for {len(chunk)} tracks: {e}")
+                    state.failed.extend(chunk)
+                    continue
+                self.cache.set_many({feature.id: feature for feature in features})
+                state.fetched += len(features)
+                state.not_found += len(chunk) - len(features)
+                FEATURES_FETCHED.inc(len(features), source="spotify")
+                yield from features
+            submit()
+            if progress is not None:
+                progress(state)
+
+
+def enrich_rows(rows: Iterable[Dict[str, str]], fetcher: FeatureFetcher, block_size: int = 10000,
+                progress: Optional[Callable[[FetchProgress], None]] = None,
+                state: Optional[FetchProgress] = None) -> Iterator[Dict[str, object]]:
+    """
+    Add audio-feature columns to track rows with an "id" column, block_size rows at a time.
+
+    Rows whose features could not be fetched are left out.
+    """
+    rows = iter(rows)
+    while True:
+        block = list(itertools.islice(rows, block_size))
+        if not block:
+            return
+        features = {feature.id: feature
+                    for feature in fetcher.fetch((row["id"] for row in block), progress, state)}
+        for row in block:
+            feature = features.get(row["id"])
+            if feature is not None:
+                yield {**row, **{column: getattr(feature, column) for column in FEATURE_COLUMNS}}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Add Spotify audio features to a CSV of tracks")
+    parser.add_argument("source", help="CSV with an id column (plus name, artist, language, genre)")
+    parser.add_argument("out", help="Output CSV, ready for `python catalog.py ingest`")
+    parser.add_argument("--store", default=config.SPOTIFY_FEATURE_STORE or config.SPOTIFY_CACHE_DB or None,
+                        help="SQLite feature store; IDs already in it are not fetched again "
+                             "(default: SPOTIFY_FEATURE_STORE, then SPOTIFY_CACHE_DB)")
+    parser.add_argument("--concurrency", type=int, default=config.SPOTIFY_FEATURE_CONCURRENCY)
+    parser.add_argument("--block-size", type=int, default=10000, help="Rows read and written per step")
+    args = parser.parse_args()
+    if not args.store:
+        parser.error("no feature store: pass --store or set SPOTIFY_FEATURE_STORE")
+
+    from spotify_api import SpotifyWebAPI
+    from token_manager import get_token_manager
+
+    spotify = SpotifyWebAPI(get_token_manager().get_token)
+    # Same namespace as the app's feature cache, so the app can serve from a warmed-up store
+    cache = TTLCache("spotify_audio_features", maxsize=config.SPOTIFY_FEATURES_CACHE_SIZE,
+                     ttl=config.SPOTIFY_FEATURES_CACHE_TTL_S, store=SQLiteStore(args.store),
+                     decode=AudioFeatures.from_stored)
+    fetcher = FeatureFetcher(spotify.fetch_audio_features, cache, args.concurrency)
+    state = FetchProgress()
+    last_report = [0.0]
+
+    def report(progress):
+        if time.monotonic() - last_report[0] >= 2.0:
+            last_report[0] = time.monotonic()
+            print(progress, flush=True)
+
+    rows = iter_rows(args.source)
+    first = next(rows, None)
+    if first is None:
+        print("No rows in source")
+        return
+    fieldnames = list(first) + [column for column in FEATURE_COLUMNS if column not in first]
+    written = 0
+    with open(args.out, "w", newline="", encoding="utf-8") as f:
+        writer = csv.DictWriter(f, fieldnames=fieldnames, extrasaction="ignore")
+        writer.writeheader()
+        for row in enrich_rows(itertools.chain([first], rows), fetcher, args.block_size, report, state):
+            writer.writerow(row)
+            written += 1
+
+    print(state)
+    print(f"Wrote {written} tracks with audio features to {args.out}")
+    if state.failed:
+        print(f"{len(state.failed)} tracks failed; re-run to retry them (fetched features are kept in the store)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+"""
+Pre-fork serving mode: load the app and model once, then fork the workers.
+
+    EMOTION_BACKEND=onnx-int8 WEB_WORKERS=4 gunicorn app:app
+    EMOTION_BACKEND=onnx-int8 WEB_WORKER_CLASS=uvicorn.workers.UvicornWorker gunicorn asgi_app:app
+
+With an ONNX backend the parent loads the session with a single intra-op
+thread, so it is safe to fork and every worker shares the weights
+copy-on-write (they are never written). The parent freezes the garbage
+collector before forking so collections in the workers do not touch, and
+therefore copy, the shared objects. TensorFlow cannot be forked after
+initialisation, so with EMOTION_BACKEND=tf or tf-early-exit each worker loads
+its own model.
+
+Graceful reload: `kill -HUP <master>` replaces the workers from the
+already-loaded parent (new config, same code and model); to pick up new
+code or model files, start a new master with `kill -USR2 <master>` and then
+stop the old one with `kill -QUIT <old master>`.
+"""
+import gc
+import os
+
+os.environ["PREFORK"] = "1"
+_shared_model = os.environ.get("EMOTION_BACKEND", "tf").strip().lower().startswith("onnx")
+if _shared_model:
+    os.environ.setdefault("MODEL_PRELOAD", "eager")
+    # One ORT thread per worker: no thread pool in the parent, and the workers provide the parallelism
+    os.environ.setdefault("ONNX_INTRA_OP_THREADS", "1")
+else:
+    os.environ["MODEL_PRELOAD"] = "background"
+
+# Not `config`: gunicorn treats every module-level name here as a setting
+import config as backend_config  # noqa: E402  (reads the environment set above)
+
+bind = os.environ.get("BIND", f"0.0.0.0:{os.environ.get('PORT', 5000)}")
+workers = backend_config.WEB_WORKERS
+worker_class = os.environ.get("WEB_WORKER_CLASS", "gthread")
+threads = int(os.environ.get("WEB_THREADS", 8))
+preload_app = True
+timeout = 120
+graceful_timeout = 30
+# Recycle workers now and then so fragmentation cannot grow without bound
+max_requests = int(os.environ.get("WEB_MAX_REQUESTS", 0))
+max_requests_jitter = max_requests // 10
+
+# Objects created while importing the app are kept out of the collector's
+# reach until fork, then frozen (see pre_fork)
+gc.disable()
+
+
+def when_ready(server):
+    server.log.info(f"Pre-fork master ready: {workers} workers, model shared: {_shared_model}")
+
+
+def pre_fork(server, worker):
+    gc.freeze()
+
+
+def post_fork(server, worker):
+    gc.enable()
+    import services
+
+    services.start_background_tasks()
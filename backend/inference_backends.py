@@ -0,0 +1,147 @@
+import os
+import threading
+from typing import Dict, List, Optional
+
+import numpy as np
+
+import config
+
+
+def warmup_batch_sizes(max_rows: int) -> List[int]:
+    """Batch sizes to warm up per length bucket for backends with a dynamic batch dimension."""
+    return sorted({1, max(1, max_rows)})
+
+
+class TFBackend:
+    """
+    Runs the classifier with TFAutoModelForSequenceClassification.
+
+    By default every padded length gets its own tf.function with a fixed
+    [batch, length] input signature, traced on its first call, so requests run
+    a graph instead of the model's eager Python code and never retrace. With
+    XLA every concrete shape is compiled separately, so batches are padded to
+    a power-of-two number of rows to keep the number of compilations small.
+    """
+
+    name = "tf"
+
+    def __init__(self, model_path: str, compiled: Optional[bool] = None, xla: Optional[bool] = None):
+        """
+        Args:
+            model_path: Local emotion model directory
+            compiled: Run compiled graphs per length bucket (default EMOTION_TF_COMPILE)
+            xla: XLA-compile those graphs (default EMOTION_TF_XLA)
+        """
+        from transformers import TFAutoModelForSequenceClassification
+
+        self.model = TFAutoModelForSequenceClassification.from_pretrained(model_path)
+        self.compiled = config.EMOTION_TF_COMPILE if compiled is None else compiled
+        self.xla = self.compiled and (config.EMOTION_TF_XLA if xla is None else xla)
+        if self.xla:
+            self.name = "tf-xla"
+        self._graphs = {}
+        self._lock = threading.Lock()
+
+    def _graph(self, length: int):
+        graph = self._graphs.get(length)
+        if graph is None:
+            with self._lock:
+                graph = self._graphs.get(length)
+                if graph is None:
+                    graph = self._graphs[length] = self._build_graph(length)
+        return graph
+
+    def _build_graph(self, length: int):
+        import tensorflow as tf
+
+        spec = tf.TensorSpec([None, length], tf.int64)
+
+        def forward(input_ids, attention_mask):
+            return self.model({"input_ids": input_ids, "attention_mask": attention_mask}, training=False).logits
+
+        return tf.function(forward, input_signature=[spec, spec], jit_compile=self.xla)
+
+    def warmup_batch_sizes(self, max_rows: int) -> List[int]:
+        if self.xla:
+            # Every power of two a batch of up to max_rows rows can be padded to
+            return [1 << i for i in range((max(1, max_rows) - 1).bit_length() + 1)]
+        return warmup_batch_sizes(max_rows)
+
+    def predict_logits(self, encoded: Dict[str, np.ndarray]) -> np.ndarray:
+        """Return the logits for a batch of tokenized inputs."""
+        if not self.compiled:
+            return self.model(dict(encoded)).logits.numpy()
+
+        input_ids, attention_mask = encoded["input_ids"], encoded["attention_mask"]
+        rows = len(input_ids)
+        if self.xla and rows & (rows - 1):
+            # Repeat the last row up to the next power of two; its logits are dropped below
+            extra = (1 << (rows - 1).bit_length()) - rows
+            input_ids = np.pad(input_ids, ((0, extra), (0, 0)), mode="edge")
+            attention_mask = np.pad(attention_mask, ((0, extra), (0, 0)), mode="edge")
+        logits = self._graph(input_ids.shape[1])(input_ids, attention_mask)
+        return logits.numpy()[:rows]
+
+
+class ONNXBackend:
+    """
+    Runs an exported ONNX graph of the classifier with ONNX Runtime on CPU.
+
+    Use export_onnx.py to create the fp32 graph and its dynamically quantized
+    int8 variant inside the model directory.
+    """
+
+    name = "onnx"
+
+    def __init__(self, onnx_path: str):
+        try:
+            import onnxruntime as ort
+        except ImportError:
+            raise ImportError("The ONNX backend requires onnxruntime (pip install -r requirements-onnx.txt)")
+
+        if not os.path.exists(onnx_path):
+            raise FileNotFoundError(f"ONNX model not found at {onnx_path}; run export_onnx.py first")
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if config.ONNX_INTRA_OP_THREADS:
+            options.intra_op_num_threads = config.ONNX_INTRA_OP_THREADS
+        self.session = ort.InferenceSession(onnx_path, options, providers=["CPUExecutionProvider"])
+        self.input_names = [i.name for i in self.session.get_inputs()]
+
+    def warmup_batch_sizes(self, max_rows: int) -> List[int]:
+        return warmup_batch_sizes(max_rows)
+
+    def predict_logits(self, encoded: Dict[str, np.ndarray]) -> np.ndarray:
+        """Return the logits for a batch of tokenized inputs."""
+        feed = {name: np.asarray(encoded[name], dtype=np.int64) for name in self.input_names}
+        return self.session.run(None, feed)[0]
+
+
+def onnx_model_path(model_path: str, quantized: bool) -> str:
+    """Location of the exported ONNX graph inside a model directory."""
+    return os.path.join(model_path, "onnx", "model.int8.onnx" if quantized else "model.onnx")
+
+
+def create_backend(name: str, model_path: str, onnx_path: Optional[str] = None):
+    """
+    Create an inference backend by name.
+
+    Args:
+        name: "tf", "onnx" (fp32), "onnx-int8" (dynamically quantized) or "tf-early-exit"
+        model_path: Local emotion model directory
+        onnx_path: Explicit ONNX file, overriding the default location for ONNX backends
+
+    Returns:
+        An object with predict_logits(encoded) and warmup_batch_sizes(max_rows) methods
+    """
+    if name == "tf":
+        return TFBackend(model_path)
+    if name in ("onnx", "onnx-int8"):
+        backend = ONNXBackend(onnx_path or onnx_model_path(model_path, quantized=name == "onnx-int8"))
+        backend.name = name
+        return backend
+    if name == "tf-early-exit":
+        from early_exit import EarlyExitTFBackend
+        return EarlyExitTFBackend(model_path, config.EMOTION_EARLY_EXIT_PATH or None)
+    raise ValueError(f"Unknown inference backend '{name}' (expected tf, onnx, onnx-int8 or tf-early-exit)")
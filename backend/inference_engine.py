@@ -0,0 +1,364 @@
+import json
+import os
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+import config
+import startup
+from batching import MicroBatcher
+from cache import EmotionScoreCache, text_key
+from inference_backends import create_backend
+from metrics import REGISTRY
+from tokenization import LengthBucketedEncoder
+from tracing import stage
+
+FORWARD_SECONDS = REGISTRY.histogram(
+    "emotion_forward_seconds", "Model time (tokenization and forward passes) per engine call")
+WARMUP_CALL_SECONDS = REGISTRY.gauge(
+    "emotion_warmup_call_seconds", "Forward pass time during the startup warm-up, first call vs steady state",
+    ["bucket", "rows", "call"])
+
+# Used when EMOTION_WARMUP_CORPUS is missing
+WARMUP_TEXTS = (
+    "I just got the job offer and I can't stop smiling!",
+    "My dog passed away this morning and the house feels empty.",
+    "Why does everyone keep ignoring my messages? This is infuriating.",
+    "I heard footsteps downstairs and nobody else is home.",
+    "The meeting is at three, please bring the slides.",
+)
+
+
+def read_warmup_corpus(path: Optional[str] = None) -> List[str]:
+    """Non-empty lines of the warm-up corpus file, or WARMUP_TEXTS if it does not exist."""
+    path = path or config.EMOTION_WARMUP_CORPUS
+    if path and os.path.exists(path):
+        with open(path, encoding="utf-8") as f:
+            texts = [line.strip() for line in f if line.strip()]
+        if texts:
+            return texts
+    return list(WARMUP_TEXTS)
+
+
+@dataclass
+class EmotionResult:
+    """Result of classifying a single text."""
+    label: str                      # Raw model label, e.g. "sadness"
+    emotion: str                    # Simplified label used by the app, e.g. "sad"
+    scores: Dict[str, float] = field(default_factory=dict)
+
+
+class EmotionInferenceEngine:
+    """
+    Process-wide emotion classifier.
+
+    Loads the tokenizer and model once and runs a single forward pass per text.
+    transformers/TensorFlow are only imported when the model is loaded, which
+    can be deferred (lazy=True) so a worker starts serving health checks
+    immediately and loads the model on first use or in the background.
+    Both EmotionDetector and MoodIntensifyingRecommender share one instance
+    (see get_engine) so a request is never classified twice. When batching is
+    enabled, concurrent callers are grouped into batches by a MicroBatcher;
+    a LengthBucketedEncoder then pads each batch only to its length bucket.
+    Repeated inputs are answered from an EmotionScoreCache.
+    """
+
+    DEFAULT_MODEL_ID = "j-hartmann/emotion-english-distilroberta-base"
+
+    # Raw model labels to the simplified emotion categories used by the app
+    EMOTION_MAP = {
+        "sadness": "sad",
+        "anger": "angry",
+        "fear": "fearful",
+        "joy": "happy",
+    }
+
+    def __init__(self, model_path: Optional[str] = None, lazy: bool = False):
+        """
+        Args:
+            model_path: Path to the local emotion model directory. The model is
+                downloaded and saved there if the directory does not exist.
+            lazy: Defer loading the model until ensure_loaded() or first use
+        """
+        self.model_path = model_path or "models/emotion_model"
+        self.tokenizer = None
+        self.encoder = None
+        self.backend = None
+        self.score_cache = None
+        # Per input shape: first-call and steady-state latency measured by warm_up()
+        self.warmup_report: List[Dict[str, float]] = []
+        self._load_lock = threading.Lock()
+        self._emotion_labels = self._read_labels()
+        if not lazy:
+            self.ensure_loaded()
+
+        self.batcher = None
+        if config.EMOTION_BATCHING:
+            self.batcher = MicroBatcher(self._forward,
+                                        max_batch_size=config.EMOTION_BATCH_MAX_SIZE,
+                                        max_wait_ms=config.EMOTION_BATCH_WINDOW_MS)
+
+        if self._emotion_labels is not None:
+            self._create_score_cache()
+
+    def _create_score_cache(self):
+        if config.EMOTION_CACHE and self.score_cache is None:
+            self.score_cache = EmotionScoreCache(len(self._emotion_labels),
+                                                 capacity=config.EMOTION_CACHE_SIZE,
+                                                 path=config.EMOTION_CACHE_PATH or None,
+                                                 fingerprint=self.score_fingerprint())
+
+    def score_fingerprint(self) -> str:
+        """
+        Identify everything that changes the scores for a text: model files, backend and tokenization.
+
+        A shared score cache written under another fingerprint is discarded.
+        """
+        files = []
+        for directory in (self.model_path, os.path.join(self.model_path, "early_exit")):
+            if os.path.isdir(directory):
+                for name in sorted(os.listdir(directory)):
+                    stat = os.stat(os.path.join(directory, name))
+                    files.append((os.path.relpath(os.path.join(directory, name), self.model_path),
+                                  stat.st_size, stat.st_mtime_ns))
+        return json.dumps({
+            "model": os.path.abspath(self.model_path),
+            "files": files,
+            "backend": config.EMOTION_BACKEND,
+            "onnx_path": config.EMOTION_ONNX_PATH,
+            "tf_xla": config.EMOTION_TF_XLA,
+            "early_exit": [config.EMOTION_EARLY_EXIT_PATH, config.EMOTION_EARLY_EXIT_THRESHOLD],
+            "tokenization": [config.EMOTION_MAX_LENGTH, config.EMOTION_LONG_TEXT_STRATEGY,
+                             config.EMOTION_HEAD_TOKENS, config.EMOTION_WINDOW_STRIDE, config.EMOTION_MAX_WINDOWS],
+        }, sort_keys=True)
+
+    def _read_labels(self) -> Optional[Dict[int, str]]:
+        """Read id2label from the local model config without importing transformers."""
+        config_path = os.path.join(self.model_path, "config.json")
+        if not os.path.exists(config_path):
+            return None
+        with open(config_path) as f:
+            return {int(i): label for i, label in json.load(f)["id2label"].items()}
+
+    @property
+    def loaded(self) -> bool:
+        return self.backend is not None
+
+    @property
+    def emotion_labels(self) -> Dict[int, str]:
+        if self._emotion_labels is None:
+            self.ensure_loaded()
+        return self._emotion_labels
+
+    def ensure_loaded(self):
+        """Load the model if it is not loaded yet; safe to call from several threads."""
+        if self.backend is None:
+            with self._load_lock:
+                if self.backend is None:
+                    with startup.phase("model_load"):
+                        self.load_model()
+
+    def load_model(self):
+        """Load the tokenizer and the configured inference backend, downloading the model on first run."""
+        from transformers import AutoTokenizer
+
+        if os.path.exists(self.model_path):
+            print(f"Loading emotion model from local path: {self.model_path}")
+        else:
+            self.download_model()
+
+        tokenizer = AutoTokenizer.from_pretrained(self.model_path)
+        backend = create_backend(config.EMOTION_BACKEND, self.model_path, config.EMOTION_ONNX_PATH or None)
+
+        if self._emotion_labels is None:
+            self._emotion_labels = self._read_labels()
+        self.tokenizer = tokenizer
+        self.encoder = LengthBucketedEncoder(
+            tokenizer,
+            max_length=config.EMOTION_MAX_LENGTH,
+            buckets=config.EMOTION_LENGTH_BUCKETS,
+            strategy=config.EMOTION_LONG_TEXT_STRATEGY,
+            head_tokens=config.EMOTION_HEAD_TOKENS,
+            window_stride=config.EMOTION_WINDOW_STRIDE,
+            max_windows=config.EMOTION_MAX_WINDOWS,
+            max_batch_tokens=config.EMOTION_MAX_BATCH_TOKENS,
+        )
+        if config.EMOTION_WARMUP:
+            with startup.phase("warmup"):
+                self.warmup_report = self.warm_up(backend)
+        self._create_score_cache()
+        # Assigned last: other threads treat a non-None backend as "loaded"
+        self.backend = backend
+        print(f"Emotion model loaded successfully with {len(self.emotion_labels)} emotions "
+              f"({backend.name} backend)")
+
+    def warm_up(self, backend, texts: Optional[Sequence[str]] = None,
+                steady_calls: Optional[int] = None) -> List[Dict[str, float]]:
+        """
+        Run a text corpus through every length bucket of a backend.
+
+        TF graphs are traced (and XLA-compiled) on the first call of each
+        input shape, and ONNX Runtime sizes its buffers then; load_model calls
+        this before publishing the backend, so that cost is paid before the
+        worker reports ready instead of by the first requests. Each shape is
+        then run steady_calls more times for the first-call vs steady-state
+        report.
+
+        Args:
+            backend: Inference backend to warm up
+            texts: Corpus the inputs are cut from (default EMOTION_WARMUP_CORPUS)
+            steady_calls: Calls per shape after the first (default EMOTION_WARMUP_STEADY_CALLS)
+
+        Returns:
+            One dict per input shape: bucket, rows, first_ms, steady_ms
+        """
+        texts = list(texts or read_warmup_corpus())
+        steady_calls = config.EMOTION_WARMUP_STEADY_CALLS if steady_calls is None else steady_calls
+        token_ids = [token for ids in self.tokenizer(texts, add_special_tokens=False, truncation=False)["input_ids"]
+                     for token in ids] or [self.encoder.pad_id]
+        # Micro-batches never exceed EMOTION_BATCH_MAX_SIZE texts or the encoder's token budget
+        batch_size = config.EMOTION_BATCH_MAX_SIZE if config.EMOTION_BATCHING else 1
+
+        # Backends with request metrics of their own (early exit) keep warm-up calls out of them
+        predict_logits = getattr(backend, "warmup_logits", backend.predict_logits)
+
+        started = time.perf_counter()
+        report = []
+        for bucket in self.encoder.buckets:
+            max_rows = min(batch_size, max(1, self.encoder.max_batch_tokens // bucket))
+            for rows in backend.warmup_batch_sizes(max_rows):
+                inputs = self.encoder.filled_batch(token_ids, bucket, rows)
+                timings = []
+                for _ in range(1 + max(0, steady_calls)):
+                    call_started = time.perf_counter()
+                    predict_logits(inputs)
+                    timings.append(time.perf_counter() - call_started)
+                first, steady = timings[0], float(np.median(timings[1:] or timings))
+                WARMUP_CALL_SECONDS.set(first, bucket=bucket, rows=rows, call="first")
+                WARMUP_CALL_SECONDS.set(steady, bucket=bucket, rows=rows, call="steady")
+                report.append({"bucket": bucket, "rows": rows,
+                               "first_ms": round(first * 1000, 3), "steady_ms": round(steady * 1000, 3)})
+
+        print(f"Warmed up {len(report)} input shapes in {time.perf_counter() - started:.2f}s "
+              f"(first calls {sum(r['first_ms'] for r in report) / 1000:.2f}s, "
+              f"steady state {sum(r['steady_ms'] for r in report) / 1000:.2f}s)")
+        return report
+
+    def download_model(self):
+        """Download the tokenizer and TF model from the Hugging Face hub into model_path."""
+        from transformers import AutoTokenizer, TFAutoModelForSequenceClassification
+
+        print("Downloading emotion model (first run only)...")
+        AutoTokenizer.from_pretrained(self.DEFAULT_MODEL_ID).save_pretrained(self.model_path)
+        TFAutoModelForSequenceClassification.from_pretrained(self.DEFAULT_MODEL_ID).save_pretrained(self.model_path)
+        print(f"Model saved to {self.model_path}")
+
+    def map_emotion(self, label: str) -> str:
+        """Map a raw model label to the simplified emotion category."""
+        return self.EMOTION_MAP.get(label, "neutral")
+
+    def predict_scores(self, texts: List[str]) -> np.ndarray:
+        """
+        Classify a list of texts, answering repeated inputs from the score cache.
+
+        Texts are looked up by a hash of their normalized form; only distinct
+        misses go to the model. Blank texts have no key and always do.
+
+        Returns:
+            An array of shape (len(texts), num_labels) with softmax probabilities
+        """
+        if self.score_cache is None:
+            return self._predict_uncached(texts)
+
+        keys = [text_key(text) for text in texts]
+        cached = self.score_cache.get_many(keys)
+        missing = {}
+        for i, scores in enumerate(cached):
+            if scores is None and keys[i] is not None:
+                missing.setdefault(keys[i], i)
+        blank = [i for i, key in enumerate(keys) if key is None]
+        if not missing and not blank:
+            return np.stack(cached)
+
+        started = time.perf_counter()
+        fresh = self._predict_uncached([texts[i] for i in list(missing.values()) + blank])
+        self.score_cache.set_many(list(missing), fresh[:len(missing)], time.perf_counter() - started)
+
+        fresh_by_key = dict(zip(missing, fresh))
+        fresh_by_index = dict(zip(blank, fresh[len(missing):]))
+        return np.stack([scores if scores is not None else fresh_by_key.get(key, fresh_by_index.get(i))
+                         for i, (key, scores) in enumerate(zip(keys, cached))])
+
+    def _predict_uncached(self, texts: List[str]) -> np.ndarray:
+        """Run texts through the model, going through the micro-batcher when enabled."""
+        if self.batcher is not None:
+            return self.batcher.predict(texts)
+        return self._forward(texts)
+
+    def _forward(self, texts: List[str]) -> np.ndarray:
+        """
+        Run texts through the model in length-bucketed batches and return softmax probabilities.
+
+        Texts split into several windows get the token-weighted mean of their
+        windows' probabilities.
+        """
+        self.ensure_loaded()
+        started = time.perf_counter()
+        probabilities = np.zeros((len(texts), len(self.emotion_labels)))
+        weights = np.zeros(len(texts))
+        with stage("tokenize"):
+            batches = list(self.encoder.encode(texts))
+        with stage("forward"):
+            for batch in batches:
+                logits = self.backend.predict_logits(batch.inputs)
+
+                # Numerically stable softmax
+                logits = logits - logits.max(axis=1, keepdims=True)
+                exp = np.exp(logits)
+                batch_probabilities = exp / exp.sum(axis=1, keepdims=True)
+
+                np.add.at(probabilities, batch.owners, batch_probabilities * batch.weights[:, None])
+                np.add.at(weights, batch.owners, batch.weights)
+        FORWARD_SECONDS.observe(time.perf_counter() - started)
+        return probabilities / weights[:, None]
+
+    def to_result(self, probabilities: np.ndarray) -> EmotionResult:
+        """Build an EmotionResult from one row of probabilities."""
+        scores = {self.emotion_labels[i]: float(p) for i, p in enumerate(probabilities)}
+        label = max(scores, key=scores.get)
+        return EmotionResult(label=label, emotion=self.map_emotion(label), scores=scores)
+
+    def classify(self, text: str) -> EmotionResult:
+        """Classify a single text."""
+        return self.classify_batch([text])[0]
+
+    def classify_batch(self, texts: List[str]) -> List[EmotionResult]:
+        """Classify several texts; they are batched together on the way to the model."""
+        if not texts:
+            return []
+        return [self.to_result(row) for row in self.predict_scores(list(texts))]
+
+
+_engine = None
+_engine_lock = threading.Lock()
+
+
+def get_engine(model_path: Optional[str] = None, lazy: bool = False) -> EmotionInferenceEngine:
+    """
+    Return the process-wide inference engine, creating it on first use.
+
+    Args:
+        model_path: Path to the local emotion model directory
+        lazy: Create the engine without loading the model yet
+    """
+    global _engine
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                _engine = EmotionInferenceEngine(model_path, lazy=lazy)
+    if not lazy:
+        _engine.ensure_loaded()
+    return _engine
@@ -1,4 +1,5 @@
 from recommender import MoodIntensifyingRecommender
+from inference_engine import get_engine
 import os
 from dotenv import load_dotenv
 
@@ -9,8 +10,8 @@ def main():
     # Path to local model
     model_path = os.path.join(os.path.dirname(__file__), "models", "emotion_model")
     
-    # Create recommender with local model path
-    recommender = MoodIntensifyingRecommender(model_path)
+    # Create recommender on top of the shared inference engine
+    recommender = MoodIntensifyingRecommender(model_path, engine=get_engine(model_path))
     
     print("===== Mood-Intensifying Music Recommender =====")
     print("This system will recommend songs that match and intensify your current mood.")
@@ -30,8 +31,9 @@ def main():
         )
         
         print("\nBased on your mood, here are songs that might intensify what you're feeling:")
-        for i, (title, artist) in enumerate(recommendations, 1):
-            print(f"{i}. '{title}' by {artist}")
+        for i, song in enumerate(recommendations, 1):
+            language = f" ({song.language})" if song.language else ""
+            print(f"{i}. '{song.title}' by {song.artist}{language}")
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -1,18 +1,24 @@
-from emotion_detector import EmotionDetector
-from spotify_client import SpotifyClient
 from mood_mapper import MoodMapper
-import pandas as pd
-from sklearn.cluster import KMeans
 import os
-import json
-import base64
-import numpy as np
-import requests
-from typing import List, Tuple, Dict, Optional
-from transformers import AutoTokenizer, TFAutoModelForSequenceClassification
-import tensorflow as tf
-from datetime import datetime, timedelta
-import random
+from typing import Iterator, List, Tuple, Dict, Optional
+from inference_engine import EmotionInferenceEngine, EmotionResult, get_engine
+from spotify_api import SpotifyWebAPI
+from records import AudioFeatures, Song, Track
+from token_manager import get_token_manager
+from catalog import TrackCatalog
+from song_store import SongStore
+from candidate_pools import CandidatePoolRefresher
+from clustering import ClusterScorer
+from metrics import REGISTRY
+from tracing import stage
+import time
+import config
+from itertools import zip_longest
+
+CLUSTERING_SECONDS = REGISTRY.histogram(
+    "recommend_clustering_seconds", "Extra time spent fetching audio features and clustering when use_clustering is set")
+LOCAL_FALLBACKS = REGISTRY.counter(
+    "recommend_local_fallback_total", "Requests answered locally because Spotify returned no candidates", ["reason"])
 
 class MoodIntensifyingRecommender:
     """
@@ -21,8 +27,7 @@ class MoodIntensifyingRecommender:
     and potentially intensifies the detected emotion.
     """
     
-    SPOTIFY_TOKEN_URL = "https://accounts.spotify.com/api/token"
-    SPOTIFY_SEARCH_URL = "https://api.spotify.com/v1/search"
+    SPOTIFY_SEARCH_URL = f"{config.SPOTIFY_API_URL}/v1/search"
     
     # Emotion to music genre/mood mapping
     EMOTION_MAPPING = {
@@ -34,155 +39,49 @@ class MoodIntensifyingRecommender:
         "neutral": ["chill", "relaxed", "ambient", "easy listening"]
     }
     
-    def __init__(self, model_path: str):
+    def __init__(self, model_path: str, engine: Optional[EmotionInferenceEngine] = None):
         """
         Initialize the recommender with a local emotion detection model.
         
         Args:
             model_path: Path to the local emotion detection model directory
+            engine: Shared inference engine; defaults to the process-wide one
         """
         self.model_path = model_path
+        self.engine = engine
         self.load_model()
-        self.spotify_token = None
-        self.token_expiry = 0
-        
-        # Sample song database organized by emotion and language
-        # In a real implementation, this would come from a database or API
-        self.song_database = {
-            "happy": {
-                "hindi": [
-                    ("Badtameez Dil", "Pritam, Benny Dayal"),
-                    ("Balam Pichkari", "Vishal-Shekhar, Shalmali Kholgade"),
-                    ("Desi Girl", "Shankar-Ehsaan-Loy, Vishal Dadlani"),
-                    ("Kala Chashma", "Badshah, Neha Kakkar"),
-                    ("Gallan Goodiyaan", "Shankar-Ehsaan-Loy, Yashita Sharma")
-                ],
-                "malayalam": [
-                    ("Jimmiki Kammal", "Vidya Vox, Kutty"),
-                    ("Entammede Jimikki Kammal", "Vineeth Sreenivasan"),
-                    ("Manikya Malaraya Poovi", "Vineeth Sreenivasan"),
-                    ("Appangal Embadum", "Vineeth Sreenivasan"),
-                    ("Lailakame", "Vijay Yesudas")
-                ]
-            },
-            "sad": {
-                "hindi": [
-                    ("Channa Mereya", "Arijit Singh"),
-                    ("Judaai", "Arijit Singh"),
-                    ("Tum Hi Ho", "Arijit Singh"),
-                    ("Kabira", "Tochi Raina, Rekha Bhardwaj"),
-                    ("Agar Tum Saath Ho", "Alka Yagnik, Arijit Singh")
-                ],
-                "malayalam": [
-                    ("Akale", "Vineeth Sreenivasan"),
-                    ("Pranayame", "Shreya Ghoshal"),
-                    ("Mazha Padum", "K.J. Yesudas"),
-                    ("Aaromale", "Benny Dayal"),
-                    ("Karalil Tharum", "K.S. Chithra")
-                ]
-            },
-            "angry": {
-                "hindi": [
-                    ("Chikni Chameli", "Shreya Ghoshal"),
-                    ("Jumme Ki Raat", "Mika Singh"),
-                    ("Dhoom Machale", "Sunidhi Chauhan"),
-                    ("Desi Boyz", "Sonia Mangal"),
-                    ("Zinda", "Siddharth Mahadevan")
-                ],
-                "malayalam": [
-                    ("Kalippu", "Najim Arshad"),
-                    ("Kadali Kanmani", "K J Yesudas"),
-                    ("Minnaminni", "K J Yesudas"),
-                    ("Ee Puzhayum", "K J Yesudas"),
-                    ("Kaadum Thazharayum", "P. Jayachandran")
-                ]
-            },
-            "fearful": {
-                "hindi": [
-                    ("Darr Ke Aage Jeet Hai", "Sukhwinder Singh"),
-                    ("Main Rahoon Ya Na Rahoon", "Amaal Mallik, Armaan Malik"),
-                    ("Sooraj Dooba Hain", "Amaal Mallik, Arijit Singh"),
-                    ("Zehnaseeb", "Chinmayi, Shekhar Ravjiani"),
-                    ("Hasi", "Ami Mishra")
-                ],
-                "malayalam": [
-                    ("Ee Kalbitha", "K.S. Chithra"),
-                    ("Onnam Ragam", "K.S. Chithra"),
-                    ("Mizhiyoram", "K.S. Chithra"),
-                    ("Aaromale", "Benny Dayal"),
-                    ("Thamarapoovil", "K.S. Chithra, K.J. Yesudas")
-                ]
-            },
-            "neutral": {
-                "hindi": [
-                    ("Kun Faya Kun", "A.R. Rahman, Javed Ali"),
-                    ("Iktara", "Amit Trivedi, Kavita Seth"),
-                    ("Phir Le Aya Dil", "Arijit Singh"),
-                    ("Ilahi", "Arijit Singh"),
-                    ("Tum Saath Ho", "Alka Yagnik, Arijit Singh")
-                ],
-                "malayalam": [
-                    ("Malare", "Vijay Yesudas"),
-                    ("Kannadi Koodum", "Najeem Arshad"),
-                    ("Ethu Kari Raavilum", "Vijay Yesudas"),
-                    ("Pranayame", "Shreya Ghoshal"),
-                    ("Aaro Nenjil", "K.S. Chithra")
-                ]
-            }
-        }
+        # Background candidate pools, started with start_candidate_pools()
+        self.pools = None
+        # Warm-started cluster scorers keyed by number of clusters
+        self.cluster_scorers = {}
+        
+        # Optional offline track catalog; when present it is used before Spotify
+        self.mood_mapper = MoodMapper()
+        self.catalog = None
+        if config.TRACK_CATALOG_PATH and os.path.exists(config.TRACK_CATALOG_PATH):
+            self.catalog = TrackCatalog(config.TRACK_CATALOG_PATH)
+            print(f"Loaded local track catalog with {len(self.catalog)} tracks")
+        
+        # Pooled keep-alive Spotify client shared by every search of this recommender
+        self.spotify = SpotifyWebAPI(get_token_manager().get_token)
+        
+        # Song database indexed by (emotion, language), used for language-filtered requests
+        self.songs = SongStore.load(config.SONG_DATABASE_PATH)
     
     def load_model(self):
-        """Load the emotion detection model and tokenizer from the provided path."""
-        try:
-            self.tokenizer = AutoTokenizer.from_pretrained(self.model_path)
-            self.model = TFAutoModelForSequenceClassification.from_pretrained(self.model_path)
-            # Get emotion labels from model config
-            self.emotion_labels = self.model.config.id2label if hasattr(self.model.config, 'id2label') else {
-                0: "joy", 1: "sadness", 2: "anger", 3: "fear", 4: "surprise", 5: "neutral"
-            }
-            print(f"Emotion model loaded successfully with {len(self.emotion_labels)} emotions")
-        except Exception as e:
-            print(f"Error loading emotion model: {e}")
-            raise
+        """Attach to the shared emotion inference engine (loaded once per process)."""
+        if self.engine is None:
+            self.engine = get_engine(self.model_path)
+        self.emotion_labels = self.engine.emotion_labels
     
     def get_spotify_token(self) -> str:
         """
-        Get a valid Spotify API token using client credentials flow.
+        Get a valid Spotify API token from the process-wide token manager.
         
         Returns:
             A valid Spotify access token
         """
-        import time
-        
-        # Return existing token if it's still valid
-        if self.spotify_token and time.time() < self.token_expiry:
-            return self.spotify_token
-        
-        # Get credentials from environment variables
-        client_id = os.getenv("SPOTIFY_CLIENT_ID")
-        client_secret = os.getenv("SPOTIFY_CLIENT_SECRET")
-        
-        if not client_id or not client_secret:
-            raise ValueError("Spotify API credentials not found in environment variables")
-        
-        # Encode client ID and secret as required by Spotify
-        auth_header = base64.b64encode(f"{client_id}:{client_secret}".encode()).decode()
-        
-        # Request a new token
-        headers = {"Authorization": f"Basic {auth_header}"}
-        data = {"grant_type": "client_credentials"}
-        
-        response = requests.post(self.SPOTIFY_TOKEN_URL, headers=headers, data=data)
-        
-        if response.status_code != 200:
-            raise Exception(f"Failed to get Spotify token: {response.json()}")
-        
-        token_data = response.json()
-        self.spotify_token = token_data["access_token"]
-        # Set token expiry time (subtract 60 seconds as a buffer)
-        self.token_expiry = time.time() + token_data["expires_in"] - 60
-        
-        return self.spotify_token
+        return get_token_manager().get_token()
     
     def detect_emotion(self, text: str) -> Tuple[str, Dict[str, float]]:
         """
@@ -194,25 +93,10 @@ class MoodIntensifyingRecommender:
         Returns:
             A tuple containing (primary_emotion, emotion_scores_dict)
         """
-        # Tokenize the input
-        inputs = self.tokenizer(text, return_tensors="tf", padding=True, truncation=True, max_length=512)
-        
-        # Get prediction from model
-        outputs = self.model(inputs)
-        logits = outputs.logits.numpy()[0]
-        
-        # Convert logits to probabilities
-        probabilities = np.exp(logits) / np.sum(np.exp(logits))
-        
-        # Create a dictionary of emotions and their scores
-        emotion_scores = {self.emotion_labels[i]: float(prob) for i, prob in enumerate(probabilities)}
-        
-        # Find the dominant emotion
-        primary_emotion = max(emotion_scores, key=emotion_scores.get)
-        
-        return primary_emotion, emotion_scores
+        result = self.engine.classify(text)
+        return result.label, result.scores
     
-    def search_spotify_for_songs(self, query: str, limit: int = 20) -> List[Dict]:
+    def search_spotify_for_songs(self, query: str, limit: int = 20) -> List[Track]:
         """
         Search Spotify for songs based on the query.
         
@@ -221,28 +105,11 @@ class MoodIntensifyingRecommender:
             limit: Maximum number of results to return
             
         Returns:
-            A list of track objects from Spotify
+            A list of tracks
         """
-        token = self.get_spotify_token()
-        
-        headers = {"Authorization": f"Bearer {token}"}
-        params = {
-            "q": query,
-            "type": "track",
-            "limit": limit,
-            "market": "US"  # Can be changed to match user's region
-        }
-        
-        response = requests.get(self.SPOTIFY_SEARCH_URL, headers=headers, params=params)
-        
-        if response.status_code != 200:
-            print(f"Error searching Spotify: {response.json()}")
-            return []
-        
-        results = response.json()
-        return results.get("tracks", {}).get("items", [])
+        return self.spotify.search_tracks(query, limit=limit)
     
-    def get_song_features(self, track_ids: List[str]) -> List[Dict]:
+    def get_song_features(self, track_ids: List[str]) -> List[AudioFeatures]:
         """
         Get audio features for multiple tracks from Spotify.
         
@@ -250,119 +117,259 @@ class MoodIntensifyingRecommender:
             track_ids: List of Spotify track IDs
             
         Returns:
-            A list of audio feature objects for each track
+            Audio features for each track found
         """
         if not track_ids:
             return []
             
-        token = self.get_spotify_token()
-        url = "https://api.spotify.com/v1/audio-features"
-        headers = {"Authorization": f"Bearer {token}"}
-        
-        # Split into chunks of 100 (Spotify's limit)
-        feature_results = []
-        for i in range(0, len(track_ids), 100):
-            chunk = track_ids[i:i+100]
-            params = {"ids": ",".join(chunk)}
-            response = requests.get(url, headers=headers, params=params)
-            
-            if response.status_code == 200:
-                feature_results.extend(response.json().get("audio_features", []))
-        
-        return [f for f in feature_results if f is not None]
+        return self.spotify.get_audio_features(track_ids)
     
-    def cluster_songs(self, tracks: List[Dict], features: List[Dict], emotion: str, n_clusters: int = 3) -> List[Dict]:
+    def cluster_songs(self, tracks: List[Track], features: List[AudioFeatures], emotion: str,
+                      n_clusters: int = 3) -> List[Track]:
         """
         Cluster songs by audio features and select the cluster that best matches the emotion.
         
+        Centroids are warm-started across calls, per emotion (see clustering.ClusterScorer),
+        so each call after the first only does an incremental update instead of a full fit.
+        
         Args:
-            tracks: List of track objects from Spotify
-            features: List of audio features for each track
-            emotion: The detected emotion
+            tracks: Candidate tracks
+            features: List of audio features for the tracks
+            emotion: The detected emotion (raw model label)
             n_clusters: Number of clusters to create
             
         Returns:
-            A list of track objects from the best matching cluster
+            The tracks of the best matching cluster
         """
         if not tracks or not features:
             return []
+        
+        scorer = self.cluster_scorers.get(n_clusters)
+        if scorer is None:
+            scorer = self.cluster_scorers.setdefault(n_clusters, ClusterScorer(n_clusters))
+        return scorer.select(tracks, features, emotion)
+    
+    def fetch_candidate_tracks(self, emotion: str, num_songs: int = 5, market: str = "US") -> List[Track]:
+        """
+        Collect candidate Spotify tracks for a raw emotion label.
+        
+        Args:
+            emotion: Raw model label (e.g. "sadness")
+            num_songs: Number of songs the caller wants; used for the last-resort query
+            market: Spotify market to search in
             
-        # Create feature vectors for clustering
-        feature_vectors = []
-        for feature in features:
-            # Select relevant features for clustering
-            vector = [
-                feature.get("energy", 0),
-                feature.get("valence", 0),  # happiness/positivity
-                feature.get("danceability", 0),
-                feature.get("acousticness", 0),
-                feature.get("instrumentalness", 0),
-                feature.get("tempo", 0) / 200  # normalize tempo
-            ]
-            feature_vectors.append(vector)
-        
-        # Only cluster if we have enough songs
-        if len(feature_vectors) < n_clusters:
-            return tracks
-            
-        # Perform clustering
-        kmeans = KMeans(n_clusters=n_clusters, random_state=42)
-        clusters = kmeans.fit_predict(feature_vectors)
+        Returns:
+            A list of tracks
+        """
+        # Collect songs from all searches concurrently; a search that misses
+        # the deadline contributes nothing instead of holding up the request
+        all_tracks = []
+        for tracks in self.spotify.search_many(self.candidate_queries(emotion), market=market):
+            all_tracks.extend(tracks)
         
-        # Determine which cluster best matches the emotion
-        cluster_scores = self._score_clusters_for_emotion(features, clusters, n_clusters, emotion)
-        best_cluster = max(cluster_scores, key=cluster_scores.get)
+        # If no songs found, fall back to more generic searches one at a time
+        for query, limit in self.fallback_queries(emotion, num_songs):
+            if all_tracks:
+                break
+            all_tracks = self.spotify.search_tracks(query, limit=limit, market=market)
         
-        # Return tracks from the best cluster
-        clustered_tracks = [track for i, track in enumerate(tracks) if clusters[i] == best_cluster]
+        return all_tracks
+    
+    def stream_candidate_songs(self, emotion: str, num_songs: int = 5, market: str = "US") -> Iterator[Song]:
+        """
+        Yield up to num_songs distinct Spotify songs for a raw emotion label as the searches return.
         
-        return clustered_tracks if clustered_tracks else tracks
+        Unlike fetch_candidate_tracks, songs from the first search to answer
+        are yielded while the other searches are still running, and the rest
+        are cancelled once num_songs songs have been found.
+        """
+        seen = set()
+        searches = self.spotify.search_as_completed(self.candidate_queries(emotion), market=market)
+        try:
+            for _, tracks in searches:
+                for track in tracks:
+                    song = Song(track.name, track.artist)
+                    if song not in seen:
+                        seen.add(song)
+                        yield song
+                        if len(seen) == num_songs:
+                            return
+        finally:
+            searches.close()
+        
+        # If no songs found, fall back to more generic searches one at a time
+        for query, limit in self.fallback_queries(emotion, num_songs):
+            if seen:
+                break
+            songs = self.format_tracks(self.spotify.search_tracks(query, limit=limit, market=market), num_songs)
+            seen.update(songs)
+            yield from songs
+    
+    def candidate_queries(self, emotion: str) -> List[Tuple[str, int]]:
+        """(query, limit) pairs searched concurrently for a raw emotion label."""
+        return [(f"{term} music", 10) for term in self.EMOTION_MAPPING.get(emotion, ["music"])]
     
-    def _score_clusters_for_emotion(self, features: List[Dict], clusters: List[int], n_clusters: int, emotion: str) -> Dict[int, float]:
+    def fallback_queries(self, emotion: str, num_songs: int) -> List[Tuple[str, int]]:
+        """(query, limit) pairs tried in order when the candidate queries find nothing."""
+        return [(f"{emotion} mood", 20), ("popular music", num_songs)]
+    
+    def format_tracks(self, tracks: List[Track], num_songs: int) -> List[Song]:
+        """Turn the first num_songs Spotify tracks into songs (Spotify search does not tell their language)."""
+        # Use basic sorting - this could be improved with additional logic
+        return [Song(track.name, track.artist) for track in tracks[:num_songs]]
+    
+    def recommend_from_database(self, emotion: str, languages: List[str], num_songs: int) -> List[Song]:
         """
-        Score each cluster based on how well it matches the target emotion.
+        Pick songs in the requested languages from the local song database.
         
         Args:
-            features: List of audio features for each track
-            clusters: Cluster assignment for each track
-            n_clusters: Number of clusters
-            emotion: Target emotion
+            emotion: Simplified emotion category (e.g. "sad")
+            languages: Languages to include, in order of preference
+            num_songs: Number of songs to recommend
             
         Returns:
-            Dictionary mapping cluster IDs to their emotion matching scores
+            A list of songs
+        """
+        return self.songs.sample(emotion, languages, num_songs)
+    
+    def build_candidate_pool(self, emotion: str, language: Optional[str], market: str) -> List[Song]:
         """
-        cluster_scores = {i: 0.0 for i in range(n_clusters)}
+        Build the ranked candidate list for one (emotion, language, market) pool.
         
-        for i in range(n_clusters):
-            # Get features for this cluster
-            cluster_features = [f for j, f in enumerate(features) if clusters[j] == i]
-            
-            if not cluster_features:
-                continue
-                
-            # Calculate average features for the cluster
-            avg_energy = np.mean([f.get("energy", 0) for f in cluster_features])
-            avg_valence = np.mean([f.get("valence", 0) for f in cluster_features])
-            avg_tempo = np.mean([f.get("tempo", 0) for f in cluster_features])
-            avg_dance = np.mean([f.get("danceability", 0) for f in cluster_features])
+        Args:
+            emotion: Raw model label (e.g. "sadness")
+            language: Language of the pool, or None for Spotify results in any language
+            market: Spotify market
             
-            # Score based on emotion (customize these mappings based on music psychology)
-            if emotion == "joy":
-                score = (avg_valence * 0.5) + (avg_energy * 0.3) + (avg_dance * 0.2)
-            elif emotion == "sadness":
-                score = ((1-avg_valence) * 0.5) + ((1-avg_energy) * 0.3) + ((1-avg_tempo/200) * 0.2)
-            elif emotion == "anger":
-                score = (avg_energy * 0.6) + ((1-avg_valence) * 0.4)
-            elif emotion == "fear":
-                score = ((1-avg_valence) * 0.4) + (avg_energy * 0.3) + ((1-avg_dance) * 0.3)
-            else:  # neutral or other
-                score = 0.5  # No preference for neutral
-                
-            cluster_scores[i] = score
+        Returns:
+            A list of songs, best candidates first
+        """
+        if language is None:
+            tracks = self.fetch_candidate_tracks(emotion, num_songs=config.CANDIDATE_POOL_SIZE, market=market)
+            return self.format_tracks(tracks, len(tracks))
+        
+        simplified = self.engine.map_emotion(emotion)
+        songs = []
+        if self.catalog is not None:
+            target = self.mood_mapper.get_features_for_emotion(simplified)
+            songs.extend(Song(track["name"], track["artist"], track["language"])
+                         for track in self.catalog.nearest(target, config.CANDIDATE_POOL_SIZE, [language]))
+        songs.extend(self.songs.songs(simplified, language))
+        return songs
+    
+    def start_candidate_pools(self, languages: Optional[List[str]] = None, markets: Optional[List[str]] = None):
+        """
+        Start keeping per-(emotion, language, market) candidate pools warm in the background.
+        
+        Args:
+            languages: Languages to keep pools for, in addition to the any-language pool
+            markets: Spotify markets to keep pools for
+        """
+        languages = languages if languages is not None else config.CANDIDATE_POOL_LANGUAGES
+        markets = markets or config.CANDIDATE_POOL_MARKETS
+        keys = [(emotion, language, market)
+                for emotion in self.emotion_labels.values()
+                for language in [None] + list(languages)
+                for market in markets]
+        self.pools = CandidatePoolRefresher(self.build_candidate_pool, keys,
+                                            refresh_interval=config.CANDIDATE_POOL_REFRESH_S,
+                                            max_pool_size=config.CANDIDATE_POOL_SIZE)
+        self.pools.start()
+    
+    def recommend_from_pools(self, emotion_result: EmotionResult, languages: Optional[List[str]], num_songs: int,
+                             market: str = "US") -> List[Song]:
+        """
+        Sample recommendations from the precomputed candidate pools (no I/O).
+        
+        With several languages, picks are interleaved so each language is represented.
+        
+        Returns:
+            A list of songs; empty if the pools are not ready
+        """
+        if self.pools is None:
+            return []
+        if not languages:
+            return self.pools.sample((emotion_result.label, None, market), num_songs)
+        
+        picked = set()
+        per_language = []
+        for language in languages:
+            songs = self.pools.sample((emotion_result.label, language, market), num_songs, exclude=picked)
+            picked.update(songs)
+            per_language.append(songs)
+        
+        recommendations = [song for group in zip_longest(*per_language) for song in group if song is not None]
+        return recommendations[:num_songs]
+    
+    def recommend_from_catalog(self, emotion: str, languages: Optional[List[str]], num_songs: int) -> List[Song]:
+        """
+        Pick the tracks closest to the emotion's target audio features from the local catalog.
+        
+        Args:
+            emotion: Simplified emotion category (e.g. "sad")
+            languages: Only consider tracks in these languages, if given
+            num_songs: Number of songs to recommend
             
-        return cluster_scores
+        Returns:
+            A list of songs; empty if no catalog is loaded
+        """
+        if self.catalog is None:
+            return []
+        target = self.mood_mapper.get_features_for_emotion(emotion)
+        return [Song(track["name"], track["artist"], track["language"])
+                for track in self.catalog.nearest(target, num_songs, languages)]
+    
+    def recommend_local_fallback(self, emotion_result: EmotionResult, num_songs: int) -> List[Song]:
+        """
+        Recommend without Spotify when it returned no candidates (e.g. while it is rate limiting us).
+        
+        Uses the local catalog in any language, then the song database.
+        """
+        LOCAL_FALLBACKS.inc(reason="spotify_degraded" if self.spotify.degraded else "no_results")
+        return (self.recommend_from_catalog(emotion_result.emotion, None, num_songs)
+                or self.recommend_from_database(emotion_result.emotion,
+                                                self.songs.languages(emotion_result.emotion), num_songs))
+    
+    def cluster_candidate_tracks(self, tracks: List[Track], emotion: str) -> List[Track]:
+        """Keep the candidate tracks whose audio-feature cluster best matches the emotion."""
+        started = time.perf_counter()
+        with stage("clustering"):
+            features = self.get_song_features([track.id for track in tracks if track.id])
+            clustered = self.cluster_songs(tracks, features, emotion) or tracks
+        CLUSTERING_SECONDS.observe(time.perf_counter() - started)
+        return clustered
+    
+    def recommend_offline(self, emotion_result: EmotionResult, num_songs: int = 5,
+                          languages: Optional[List[str]] = None,
+                          use_clustering: bool = False) -> Optional[List[Song]]:
+        """
+        Recommend from the sources that need no network calls.
+        
+        Returns:
+            A list of songs, or None if live Spotify
+            candidates are needed
+        """
+        # Precomputed pools and the local catalog need no network calls, so try them
+        # first, unless clustering of live Spotify candidates was explicitly requested
+        if languages or not use_clustering:
+            with stage("pools"):
+                recommendations = self.recommend_from_pools(emotion_result, languages, num_songs)
+            if not recommendations:
+                with stage("catalog"):
+                    recommendations = self.recommend_from_catalog(emotion_result.emotion, languages, num_songs)
+            if recommendations:
+                return recommendations
+        
+        # Language-filtered recommendations come from the song database only,
+        # so there is no point searching Spotify for them
+        if languages:
+            with stage("database"):
+                return self.recommend_from_database(emotion_result.emotion, languages, num_songs)
+        return None
     
-    def recommend_for_text(self, text: str, num_songs: int = 5, languages: Optional[List[str]] = None) -> List[Tuple[str, str]]:
+    def recommend_for_text(self, text: str, num_songs: int = 5, languages: Optional[List[str]] = None,
+                           emotion_result: Optional[EmotionResult] = None,
+                           use_clustering: bool = False) -> List[Song]:
         """
         Generate song recommendations based on the emotional content of text.
         
@@ -370,70 +377,98 @@ class MoodIntensifyingRecommender:
             text: Text describing the user's mood or emotional state
             num_songs: Number of songs to recommend
             languages: List of languages to include (e.g., ["hindi", "malayalam"])
+            emotion_result: Result already computed for this text by the shared
+                inference engine; the text is only classified if this is None
+            use_clustering: Re-rank live Spotify candidates by clustering their
+                audio features (costs an extra audio-features call per request)
             
         Returns:
-            A list of tuples containing (song_title, artist_name)
+            A list of songs (title, artist, language)
         """
-        # Detect emotion in the text
-        emotion, emotion_scores = self.detect_emotion(text)
-        print(f"Detected emotion: {emotion}")
-        
-        # Get search terms for this emotion
-        search_terms = self.EMOTION_MAPPING.get(emotion, ["music"])
-        
-        # Collect songs from multiple searches
-        all_tracks = []
-        for term in search_terms:
-            query = f"{term} music"
-            tracks = self.search_spotify_for_songs(query, limit=10)
-            all_tracks.extend(tracks)
-        
-        # If no songs found, try a more generic search
-        if not all_tracks:
-            all_tracks = self.search_spotify_for_songs(f"{emotion} mood", limit=20)
+        # Detect emotion in the text (once per request)
+        if emotion_result is None:
+            emotion_result = self.engine.classify(text)
+        print(f"Detected emotion: {emotion_result.label}")
+        
+        recommendations = self.recommend_offline(emotion_result, num_songs, languages, use_clustering)
+        if recommendations is not None:
+            return recommendations
+        
+        with stage("spotify_candidates"):
+            tracks = self.fetch_candidate_tracks(emotion_result.label, num_songs)
+        if not tracks:
+            return self.recommend_local_fallback(emotion_result, num_songs)
+        if use_clustering:
+            tracks = self.cluster_candidate_tracks(tracks, emotion_result.label)
+        return self.format_tracks(tracks, num_songs)
+    
+    def iter_recommendations(self, emotion_result: EmotionResult, num_songs: int = 5,
+                             languages: Optional[List[str]] = None,
+                             use_clustering: bool = False) -> Iterator[Song]:
+        """
+        Generate recommendations one at a time, each as soon as it is known.
         
-        # Still no results? Use a default query
-        if not all_tracks:
-            all_tracks = self.search_spotify_for_songs("popular music", limit=num_songs)
+        Same sources and fallbacks as recommend_for_text; without clustering,
+        live Spotify candidates are yielded as each search returns instead of
+        after all of them.
         
-        # Use basic sorting - this could be improved with additional logic
-        selected_tracks = all_tracks[:num_songs]
+        Args:
+            emotion_result: Classification of the user's text
+            num_songs: Number of songs to recommend
+            languages: List of languages to include (e.g., ["hindi", "malayalam"])
+            use_clustering: Re-rank live Spotify candidates by clustering their
+                audio features (needs every candidate, so nothing is yielded early)
+            
+        Yields:
+            Songs (title, artist, language)
+        """
+        recommendations = self.recommend_offline(emotion_result, num_songs, languages, use_clustering)
+        if recommendations is not None:
+            yield from recommendations
+            return
+        
+        if use_clustering:
+            tracks = self.fetch_candidate_tracks(emotion_result.label, num_songs)
+            if tracks:
+                yield from self.format_tracks(self.cluster_candidate_tracks(tracks, emotion_result.label), num_songs)
+                return
+        else:
+            found = False
+            for song in self.stream_candidate_songs(emotion_result.label, num_songs):
+                found = True
+                yield song
+            if found:
+                return
+        yield from self.recommend_local_fallback(emotion_result, num_songs)
+    
+    def recommend_for_texts(self, texts: List[str], num_songs: int = 5, languages: Optional[List[str]] = None,
+                            batch_size: int = 64) -> Iterator[Tuple[int, EmotionResult, List[Song]]]:
+        """
+        Generate recommendations for many texts, yielding each result as soon as it is ready.
         
-        # Format results
-        recommendations = []
-        for track in selected_tracks:
-            title = track.get("name", "Unknown Title")
-            artist = track.get("artists", [{}])[0].get("name", "Unknown Artist") if track.get("artists") else "Unknown Artist"
-            recommendations.append((title, artist))
+        Texts are classified in batches of batch_size, and Spotify candidates are
+        fetched once per emotion for the whole call instead of once per text.
         
-        # Filter recommendations by language if specified
-        if languages:
-            filtered_recommendations = []
-            for lang in languages:
-                # Get songs for this language
-                lang_songs = self.song_database.get(emotion, {}).get(lang, [])
-                
-                # Add random songs from this language
-                if lang_songs:
-                    selected_songs = random.sample(lang_songs, min(len(lang_songs), num_songs))
-                    filtered_recommendations.extend(selected_songs)
-            
-            # If we couldn't find enough songs in the preferred languages, fall back to any available
-            if len(filtered_recommendations) < num_songs:
-                additional_needed = num_songs - len(filtered_recommendations)
-                for lang in languages:
-                    if additional_needed <= 0:
-                        break
-                    
-                    # Get additional songs from this language
-                    lang_songs = self.song_database.get(emotion, {}).get(lang, [])
-                    for song in lang_songs:
-                        if song not in filtered_recommendations:
-                            filtered_recommendations.append(song)
-                            additional_needed -= 1
-                            if additional_needed <= 0:
-                                break
+        Args:
+            texts: Texts describing users' moods
+            num_songs: Number of songs to recommend per text
+            languages: List of languages to include (e.g., ["hindi", "malayalam"])
+            batch_size: Number of texts classified per engine call
             
-            recommendations = filtered_recommendations
-        
-        return recommendations[:num_songs]
\ No newline at end of file
+        Yields:
+            Tuples of (index_in_texts, emotion_result, recommendations)
+        """
+        candidates = {}
+        for start in range(0, len(texts), batch_size):
+            chunk = texts[start:start + batch_size]
+            for offset, emotion_result in enumerate(self.engine.classify_batch(chunk)):
+                recommendations = (self.recommend_from_pools(emotion_result, languages, num_songs)
+                                   or self.recommend_from_catalog(emotion_result.emotion, languages, num_songs))
+                if not recommendations and languages:
+                    recommendations = self.recommend_from_database(emotion_result.emotion, languages, num_songs)
+                elif not recommendations:
+                    if emotion_result.label not in candidates:
+                        candidates[emotion_result.label] = self.fetch_candidate_tracks(emotion_result.label, num_songs)
+                    recommendations = (self.format_tracks(candidates[emotion_result.label], num_songs)
+                                       or self.recommend_local_fallback(emotion_result, num_songs))
+                yield start + offset, emotion_result, recommendations
@@ -0,0 +1,86 @@
+"""
+Compact track and audio-feature records, and selective parsers for Spotify responses.
+
+A Spotify search result item carries the album, images, available markets
+(often ~185 country codes, twice) and external URLs; the recommender only
+reads the ID, name, first artist and popularity. The parsers here decode
+response bodies with an object_pairs_hook that keeps only the wanted keys,
+so the discarded parts of each object are freed as soon as they are parsed
+instead of living as long as the response, and the results are stored as
+tuples rather than dicts.
+"""
+import json
+from typing import Any, Dict, FrozenSet, List, NamedTuple, Optional, Union
+
+from catalog import FEATURE_COLUMNS
+
+
+class Track(NamedTuple):
+    """A Spotify track as used for recommendations."""
+
+    id: str
+    name: str
+    artist: str
+    popularity: int = 0
+
+    @classmethod
+    def from_item(cls, item: Dict[str, Any]) -> "Track":
+        """Build a Track from a Spotify track object (full or selectively parsed)."""
+        artists = item.get("artists") or [{}]
+        return cls(item.get("id") or "", item.get("name") or "Unknown Title",
+                   artists[0].get("name") or "Unknown Artist", item.get("popularity") or 0)
+
+    @classmethod
+    def from_stored(cls, value: Union[list, Dict[str, Any]]) -> "Track":
+        """Rebuild a Track read back from JSON (stores written before records existed hold full objects)."""
+        return cls.from_item(value) if isinstance(value, dict) else cls(*value)
+
+
+class Song(NamedTuple):
+    """A recommended song; language is None when its source does not know it (Spotify search)."""
+
+    title: str
+    artist: str
+    language: Optional[str] = None
+
+
+class AudioFeatures(NamedTuple):
+    """Audio features of one track, in catalog.FEATURE_COLUMNS order after the ID."""
+
+    id: str
+    valence: float
+    energy: float
+    danceability: float
+    tempo: float
+    mode: float
+    instrumentalness: float
+    acousticness: float
+
+    @classmethod
+    def from_item(cls, item: Dict[str, Any]) -> "AudioFeatures":
+        return cls(item["id"], *(float(item.get(column) or 0.0) for column in FEATURE_COLUMNS))
+
+    @classmethod
+    def from_stored(cls, value: Union[list, Dict[str, Any]]) -> "AudioFeatures":
+        return cls.from_item(value) if isinstance(value, dict) else cls(*value)
+
+
+SEARCH_FIELDS = frozenset({"tracks", "items", "id", "name", "artists", "popularity"})
+AUDIO_FEATURE_FIELDS = frozenset({"audio_features", "id", *FEATURE_COLUMNS})
+
+
+def selective_loads(body: Union[str, bytes], fields: FrozenSet[str]) -> Any:
+    """Decode JSON keeping only the given keys of every object (at any depth)."""
+    return json.loads(body, object_pairs_hook=lambda pairs: {key: value for key, value in pairs if key in fields})
+
+
+def parse_search(body: Union[str, bytes]) -> List[Track]:
+    """Tracks of a /v1/search?type=track response body."""
+    items = selective_loads(body, SEARCH_FIELDS).get("tracks", {}).get("items") or []
+    return [Track.from_item(item) for item in items if item]
+
+
+def parse_audio_features(body: Union[str, bytes]) -> List[AudioFeatures]:
+    """Audio features of a /v1/audio-features response body (IDs Spotify has no features for are skipped)."""
+    items = selective_loads(body, AUDIO_FEATURE_FIELDS).get("audio_features") or []
+    return [AudioFeatures.from_item(item) for item in items if item]
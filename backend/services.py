@@ -0,0 +1,133 @@
+"""
+Objects and helpers shared by the Flask (app.py) and ASGI (asgi_app.py) servers:
+the inference engine, emotion detector and recommender, the per-process
+background tasks, request validation and response formatting. Importing this
+module does not import either web framework.
+"""
+import startup  # first import, so the startup clock covers everything below
+from emotion_detector import EmotionDetector
+from inference_engine import get_engine
+from tracing import HTTP_STREAM_SECONDS
+import config
+from recommender import MoodIntensifyingRecommender
+import os
+from dotenv import load_dotenv
+import logging
+import json
+import threading
+import time
+
+startup.mark("imports")
+
+logger = logging.getLogger(__name__)
+
+# Load environment variables
+load_dotenv()
+
+# Path to local model
+model_path = os.path.join(os.path.dirname(__file__), "models", "emotion_model")
+
+# Initialize the shared inference engine, emotion detector and recommender.
+# With MODEL_PRELOAD=eager the model is loaded here; with "background" it is
+# loaded in a thread while the app already answers /health; with "lazy" it is
+# loaded by the first request. /ready reports when the model is usable.
+try:
+    engine = get_engine(model_path, lazy=config.MODEL_PRELOAD != "eager")
+    emotion_detector = EmotionDetector(engine=engine)
+    recommender = MoodIntensifyingRecommender(model_path, engine=engine)
+    startup.mark("components")
+    logger.info("Emotion detector and recommender initialized successfully")
+except Exception as e:
+    logger.error(f"Error initializing components: {str(e)}")
+    raise
+
+def _preload_model():
+    try:
+        engine.ensure_loaded()
+        logger.info("Emotion model loaded in background")
+    except Exception as e:
+        logger.error(f"Error loading emotion model: {str(e)}")
+
+def start_background_tasks():
+    """Start the per-process background threads (candidate pools, model preload)."""
+    if config.CANDIDATE_POOLS:
+        recommender.start_candidate_pools()
+    if config.MODEL_PRELOAD == "background":
+        threading.Thread(target=_preload_model, name="model-preload", daemon=True).start()
+
+DEFAULT_LANGUAGES = ["hindi", "malayalam"]
+
+def parse_recommend_request(data, batch=False):
+    """
+    Validate a /recommend* JSON body.
+
+    Args:
+        data: Decoded JSON body (None if it was missing or not JSON)
+        batch: Expect a 'texts' list (/recommend/batch) instead of 'user_text'
+
+    Returns:
+        Dict with user_text or texts, languages, use_clustering and num_songs
+        (clamped to MAX_SONGS_PER_REQUEST)
+
+    Raises:
+        ValueError: With the message of the 400 response
+    """
+    if not isinstance(data, dict):
+        raise ValueError("Request body must be a JSON object")
+    
+    params = {}
+    if batch:
+        texts = data.get('texts')
+        if not isinstance(texts, list) or not all(isinstance(text, str) for text in texts):
+            raise ValueError("Missing required field 'texts' (list of strings)")
+        if len(texts) > config.MAX_BATCH_TEXTS:
+            raise ValueError(f"'texts' has {len(texts)} entries; at most {config.MAX_BATCH_TEXTS} are allowed")
+        params['texts'] = texts
+    else:
+        if 'user_text' not in data:
+            raise ValueError("Missing required field 'user_text'")
+        if not isinstance(data['user_text'], str):
+            raise ValueError("'user_text' must be a string")
+        params['user_text'] = data['user_text']
+    
+    languages = data.get('languages', DEFAULT_LANGUAGES)
+    if not isinstance(languages, list) or not all(isinstance(language, str) for language in languages):
+        raise ValueError("'languages' must be a list of strings")
+    params['languages'] = languages
+    params['use_clustering'] = bool(data.get('use_clustering', False))
+    
+    num_songs = data.get('num_songs', 5)
+    # bool is an int subclass, but true/false is not a song count
+    if isinstance(num_songs, bool) or not isinstance(num_songs, (int, str)):
+        raise ValueError("'num_songs' must be a positive integer")
+    try:
+        num_songs = int(num_songs)
+    except ValueError:
+        raise ValueError("'num_songs' must be a positive integer")
+    if num_songs < 1:
+        raise ValueError("'num_songs' must be a positive integer")
+    params['num_songs'] = min(num_songs, config.MAX_SONGS_PER_REQUEST)
+    return params
+
+def format_song(song):
+    """Format one song according to the API specification"""
+    # Language is the song's own (None for Spotify results, whose language is unknown)
+    return {"title": song.title, "artist": song.artist, "language": song.language}
+
+def format_recommendations(raw_recommendations):
+    """Format songs according to the API specification"""
+    return [format_song(song) for song in raw_recommendations]
+
+def stream_event(event, **fields):
+    """One NDJSON line of a /recommend/stream response"""
+    return json.dumps({"event": event, **fields}) + "\n"
+
+def stream_timings(started, first_byte, first_recommendation, route):
+    """Record the stream latency metrics and return the timings of the final "done" event"""
+    total = time.perf_counter() - started
+    HTTP_STREAM_SECONDS.observe(total, route=route)
+    return {
+        "ttfb_ms": round(first_byte * 1000, 2),
+        "first_recommendation_ms": round(first_recommendation * 1000, 2) if first_recommendation is not None else None,
+        "total_ms": round(total * 1000, 2)
+    }
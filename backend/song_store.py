@@ -0,0 +1,98 @@
+"""
+Local song database indexed by (emotion, language).
+
+Songs are read once from a CSV or Parquet file with emotion, language, title
+and artist columns (data/songs.csv by default) into one tuple per
+(emotion, language), so looking up the songs for a request is a single dict
+access however large the regional catalogs in the file are.
+"""
+import os
+import random
+import sys
+from typing import Dict, Iterable, List, Sequence, Tuple
+
+from catalog import iter_rows
+from records import Song
+
+
+def _normalize(value: object) -> str:
+    # Interned, so every song of a language shares one string
+    return sys.intern(str(value or "").strip().lower())
+
+
+class SongStore:
+    """Songs by (simplified emotion, language), each with its real language."""
+
+    def __init__(self, rows: Iterable[Dict[str, object]] = ()):
+        """
+        Args:
+            rows: Song rows with emotion, language, title and artist
+        """
+        index: Dict[Tuple[str, str], List[Song]] = {}
+        for row in rows:
+            emotion, language = _normalize(row.get("emotion")), _normalize(row.get("language"))
+            title, artist = str(row.get("title") or "").strip(), str(row.get("artist") or "").strip()
+            if emotion and language and title:
+                index.setdefault((emotion, language), []).append(Song(title, artist, language))
+
+        self._songs: Dict[Tuple[str, str], Tuple[Song, ...]] = {key: tuple(songs) for key, songs in index.items()}
+        languages: Dict[str, List[str]] = {}
+        for emotion, language in self._songs:
+            languages.setdefault(emotion, []).append(language)
+        self._languages = {emotion: tuple(values) for emotion, values in languages.items()}
+
+    @classmethod
+    def load(cls, path: str) -> "SongStore":
+        """Load the store from a CSV or Parquet file; a missing file gives an empty store."""
+        if not path or not os.path.exists(path):
+            print(f"Song database {path!r} not found, language-filtered recommendations will be empty")
+            return cls()
+        return cls(iter_rows(path))
+
+    def __len__(self):
+        return sum(len(songs) for songs in self._songs.values())
+
+    def songs(self, emotion: str, language: str) -> Tuple[Song, ...]:
+        """All songs for one (emotion, language), in file order."""
+        return self._songs.get((emotion, language.lower()), ())
+
+    def languages(self, emotion: str) -> Tuple[str, ...]:
+        """Languages that have songs for an emotion, in file order."""
+        return self._languages.get(emotion, ())
+
+    def sample(self, emotion: str, languages: Sequence[str], num_songs: int) -> List[Song]:
+        """
+        Pick random songs for an emotion, preferring the earlier languages.
+
+        Args:
+            emotion: Simplified emotion category (e.g. "sad")
+            languages: Languages to include, in order of preference
+            num_songs: Number of songs wanted
+
+        Returns:
+            Up to num_songs distinct songs
+        """
+        picked, seen = [], set()
+
+        def add(song):
+            # The same recording can be listed under several languages
+            key = (song.title, song.artist)
+            if key not in seen:
+                seen.add(key)
+                picked.append(song)
+
+        for language in languages:
+            if len(picked) >= num_songs:
+                break
+            songs = self.songs(emotion, language)
+            for song in random.sample(songs, min(len(songs), num_songs)):
+                add(song)
+
+        # Duplicates across languages can leave the random picks short; top up in file order
+        for language in languages:
+            for song in self.songs(emotion, language):
+                if len(picked) >= num_songs:
+                    return picked[:num_songs]
+                add(song)
+
+        return picked[:num_songs]
@@ -0,0 +1,279 @@
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from concurrent.futures import TimeoutError as FuturesTimeout
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+import requests
+from requests.adapters import HTTPAdapter
+
+import config
+from cache import SQLiteStore, TTLCache
+from feature_fetcher import FeatureFetcher, FetchProgress
+from metrics import REGISTRY
+from records import AudioFeatures, Track, parse_audio_features, parse_search
+from spotify_guard import SingleFlight, SpotifyGuard, SpotifyUnavailable, get_spotify_guard
+from tracing import in_context, stage
+
+SPOTIFY_REQUEST_SECONDS = REGISTRY.histogram(
+    "spotify_request_seconds", "Duration of Spotify Web API calls", ["endpoint"])
+SPOTIFY_REQUESTS = REGISTRY.counter(
+    "spotify_requests_total", "Spotify calls by endpoint and HTTP status (\"error\" for network errors)",
+    ["endpoint", "status"])
+SPOTIFY_RETRIES = REGISTRY.counter("spotify_retries_total", "Spotify calls retried", ["endpoint"])
+
+
+def decode_tracks(rows: List) -> List[Track]:
+    """Rebuild a cached search result read back from the SQLite store."""
+    return [Track.from_stored(row) for row in rows]
+
+
+class SpotifyWebAPI:
+    """
+    Thin Spotify Web API client over a pooled keep-alive HTTP session.
+
+    All requests share one requests.Session, so TLS connections to
+    api.spotify.com are reused across searches and across requests. Several
+    searches can be fanned out concurrently with search_many.
+
+    Search results and audio features are cached with a TTL and LRU eviction,
+    optionally backed by SQLite (SPOTIFY_CACHE_DB) so restarted workers start warm.
+
+    Calls go through the process-wide SpotifyGuard (rate limit, retries with
+    Retry-After, circuit breaker), and identical calls already in flight are
+    coalesced into one. While Spotify is unavailable, searches are answered
+    from expired cache entries when there are any.
+    """
+
+    SEARCH_URL = f"{config.SPOTIFY_API_URL}/v1/search"
+    AUDIO_FEATURES_URL = f"{config.SPOTIFY_API_URL}/v1/audio-features"
+
+    def __init__(self, token_provider: Callable[[], str], pool_size: int = None, max_workers: int = None,
+                 guard: Optional[SpotifyGuard] = None):
+        """
+        Args:
+            token_provider: Callable returning a valid Spotify access token
+            pool_size: Maximum number of keep-alive connections per host
+            max_workers: Maximum number of searches in flight at once
+            guard: Rate limiter and circuit breaker, defaults to the process-wide one
+        """
+        self.token_provider = token_provider
+        self.guard = guard or get_spotify_guard()
+        self._searches = SingleFlight("search")
+        self._feature_chunks = SingleFlight("audio_features")
+        self.pool_size = pool_size or config.SPOTIFY_POOL_SIZE
+        self.max_workers = max_workers or config.SPOTIFY_MAX_WORKERS
+        self._open()
+        # A forked worker must not share the parent's sockets or executor threads
+        os.register_at_fork(after_in_child=self._open)
+
+        store = SQLiteStore(config.SPOTIFY_CACHE_DB) if config.SPOTIFY_CACHE_DB else None
+        self.search_cache = TTLCache("spotify_search", maxsize=config.SPOTIFY_SEARCH_CACHE_SIZE,
+                                     ttl=config.SPOTIFY_SEARCH_CACHE_TTL_S, store=store, decode=decode_tracks)
+        feature_store = SQLiteStore(config.SPOTIFY_FEATURE_STORE) if config.SPOTIFY_FEATURE_STORE else store
+        self.features_cache = TTLCache("spotify_audio_features", maxsize=config.SPOTIFY_FEATURES_CACHE_SIZE,
+                                       ttl=config.SPOTIFY_FEATURES_CACHE_TTL_S, store=feature_store,
+                                       decode=AudioFeatures.from_stored)
+        # One attempt per chunk: _get already retries within the request timeout
+        self.feature_fetcher = FeatureFetcher(self._fetch_features, self.features_cache, max_attempts=1)
+
+    def _open(self):
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=self.pool_size, pool_maxsize=self.pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="spotify")
+
+    def _headers(self) -> Dict[str, str]:
+        return {"Authorization": f"Bearer {self.token_provider()}"}
+
+    @property
+    def degraded(self) -> bool:
+        """True while Spotify calls are being refused or held back (circuit open or Retry-After pending)."""
+        return self.guard.degraded
+
+    def _get(self, endpoint: str, url: str, params: Dict, timeout: float) -> requests.Response:
+        """
+        GET a Web API URL within timeout seconds, retrying 429s, server errors and network errors.
+
+        Raises:
+            SpotifyUnavailable: If the guard refuses the call (circuit open, or rate limited past the timeout)
+            requests.exceptions.RequestException: If the last attempt failed, or no token could be obtained
+        """
+        deadline = time.monotonic() + timeout
+        attempt = 0
+        while True:
+            # Before admit(): a token failure says nothing about the Web API and must not hold the probe
+            headers = self._headers()
+            time.sleep(self.guard.admit(deadline - time.monotonic()))
+            try:
+                response = self._send(endpoint, url, headers, params, deadline - time.monotonic())
+            except requests.exceptions.RequestException:
+                delay = self.guard.failed(endpoint, attempt)
+                if delay is None or time.monotonic() + delay >= deadline:
+                    raise
+            except BaseException:
+                self.guard.abandoned()
+                raise
+            else:
+                delay = self.guard.completed(endpoint, response.status_code,
+                                             response.headers.get("Retry-After"), attempt)
+                if delay is None or time.monotonic() + delay >= deadline:
+                    return response
+            SPOTIFY_RETRIES.inc(endpoint=endpoint)
+            time.sleep(delay)
+            attempt += 1
+
+    def _send(self, endpoint: str, url: str, headers: Dict[str, str], params: Dict,
+              timeout: float) -> requests.Response:
+        """One GET, recording its duration, status and trace span under the endpoint name."""
+        started = time.perf_counter()
+        status = "error"
+        try:
+            with stage(f"spotify_{endpoint}"):
+                response = self.session.get(url, headers=headers, params=params, timeout=timeout)
+            status = response.status_code
+            return response
+        finally:
+            SPOTIFY_REQUEST_SECONDS.observe(time.perf_counter() - started, endpoint=endpoint)
+            SPOTIFY_REQUESTS.inc(endpoint=endpoint, status=status)
+
+    def search_tracks(self, query: str, limit: int = 20, market: str = "US",
+                      timeout: Optional[float] = None) -> List[Track]:
+        """
+        Search Spotify for tracks.
+
+        Args:
+            query: The search query string
+            limit: Maximum number of results to return
+            market: Market to search in
+            timeout: Request timeout in seconds
+
+        Returns:
+            A list of tracks, empty on error
+        """
+        key = f"{market}:{limit}:{query}"
+        tracks = self.search_cache.get(key)
+        if tracks is not None:
+            return tracks
+        return self._searches.do(key, lambda: self._search(key, query, limit, market, timeout))
+
+    def _search(self, key: str, query: str, limit: int, market: str, timeout: Optional[float]) -> List[Track]:
+        params = {"q": query, "type": "track", "limit": limit, "market": market}
+        try:
+            response = self._get("search", self.SEARCH_URL, params, timeout or config.SPOTIFY_REQUEST_TIMEOUT_S)
+        except (requests.exceptions.RequestException, SpotifyUnavailable) as e:
+            print(f"Error searching Spotify: {e}")
+            return self.search_cache.get_stale(key, [])
+
+        if response.status_code != 200:
+            print(f"Error searching Spotify: {response.text}")
+            return self.search_cache.get_stale(key, [])
+
+        # Errors are not cached so they are retried on the next request
+        tracks = parse_search(response.content)
+        self.search_cache.set(key, tracks)
+        return tracks
+
+    def search_as_completed(self, queries: Sequence[Tuple[str, int]], market: str = "US",
+                            deadline: Optional[float] = None) -> Iterator[Tuple[int, List[Track]]]:
+        """
+        Run several searches concurrently and yield each result as soon as it arrives.
+
+        Searches still queued when the deadline passes, or when the caller
+        stops iterating, are cancelled; searches still running are bounded by
+        a request timeout equal to the deadline. A search that fails or misses
+        the deadline is not yielded.
+
+        Args:
+            queries: (query, limit) pairs
+            market: Market to search in
+            deadline: Seconds to wait for all searches
+
+        Yields:
+            (index in queries, tracks) pairs, in completion order
+        """
+        deadline = deadline or config.SPOTIFY_SEARCH_DEADLINE_S
+        started = time.monotonic()
+        # Make sure a token exists before fanning out so the workers don't all refresh it
+        try:
+            self.token_provider()
+        except requests.exceptions.RequestException as e:
+            # Every search would fail the same way; the caller falls back to local results
+            print(f"Error searching Spotify: {e}")
+            return
+        futures = {self._executor.submit(in_context(self.search_tracks, query, limit, market, deadline)): index
+                   for index, (query, limit) in enumerate(queries)}
+
+        finished = 0
+        try:
+            for future in as_completed(futures, timeout=deadline):
+                finished += 1
+                if future.exception() is None:
+                    yield futures[future], future.result()
+        except FuturesTimeout:
+            print(f"Spotify search deadline of {deadline}s hit after {time.monotonic() - started:.2f}s; "
+                  f"using {finished}/{len(futures)} results")
+        finally:
+            for future in futures:
+                future.cancel()
+
+    def search_many(self, queries: Sequence[Tuple[str, int]], market: str = "US",
+                    deadline: Optional[float] = None) -> List[List[Track]]:
+        """
+        Run several searches concurrently and wait for them up to a deadline.
+
+        Whatever finished in time is returned; the other searches yield []
+        (see search_as_completed).
+
+        Args:
+            queries: (query, limit) pairs
+            market: Market to search in
+            deadline: Seconds to wait for all searches
+
+        Returns:
+            One list of tracks per query, in the same order as queries
+        """
+        results = [[] for _ in queries]
+        for index, tracks in self.search_as_completed(queries, market, deadline):
+            results[index] = tracks
+        return results
+
+    def get_audio_features(self, track_ids: List[str]) -> List[AudioFeatures]:
+        """
+        Get audio features for multiple tracks, fetching uncached chunks of 100 concurrently.
+
+        Args:
+            track_ids: List of Spotify track IDs
+
+        Returns:
+            Audio features for each track found
+        """
+        features_by_id = {}
+        state = FetchProgress()
+        for feature in self.feature_fetcher.fetch(track_ids, state=state):
+            features_by_id[feature.id] = feature
+        # Chunks that failed are answered from expired cache entries if there are any
+        for track_id in state.failed:
+            feature = self.features_cache.get_stale(track_id)
+            if feature is not None:
+                features_by_id[track_id] = feature
+
+        return [features_by_id[track_id] for track_id in track_ids if track_id in features_by_id]
+
+    def fetch_audio_features(self, track_ids: Sequence[str]) -> List[AudioFeatures]:
+        """
+        Fetch audio features for up to 100 track IDs from Spotify, bypassing the cache.
+
+        Raises:
+            SpotifyUnavailable: If the guard refuses the call
+            requests.exceptions.RequestException: If the request fails or Spotify answers with an error
+        """
+        response = self._get("audio_features", self.AUDIO_FEATURES_URL, {"ids": ",".join(track_ids)},
+                             config.SPOTIFY_REQUEST_TIMEOUT_S)
+        response.raise_for_status()
+        return parse_audio_features(response.content)
+
+    def _fetch_features(self, chunk: Sequence[str]) -> List[AudioFeatures]:
+        # Identical chunks requested concurrently (e.g. by clustering requests) share one call
+        return self._feature_chunks.do(tuple(chunk), lambda: self.fetch_audio_features(chunk))
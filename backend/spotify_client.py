@@ -1,27 +1,56 @@
-import os
+import time
 import spotipy
-from spotipy.oauth2 import SpotifyClientCredentials
+import requests
 from dotenv import load_dotenv
+import config
+from records import AudioFeatures, Track
+from spotify_guard import SpotifyUnavailable, get_spotify_guard
+from token_manager import get_token_manager
 
 class SpotifyClient:
     def __init__(self):
         load_dotenv()
         
-        # Set up authentication
-        client_id = os.getenv("SPOTIFY_CLIENT_ID")
-        client_secret = os.getenv("SPOTIFY_CLIENT_SECRET")
-        
-        client_credentials_manager = SpotifyClientCredentials(
-            client_id=client_id, client_secret=client_secret
-        )
-        self.sp = spotipy.Spotify(client_credentials_manager=client_credentials_manager)
+        # Set up authentication through the shared token manager. Retries are left to
+        # the shared guard so 429s pause every Spotify client, not just this one
+        self.sp = spotipy.Spotify(auth_manager=get_token_manager(), retries=0, status_retries=0)
+        self.sp.prefix = f"{config.SPOTIFY_API_URL}/v1/"
+        self.guard = get_spotify_guard()
         self._available_genres = None
     
+    def _call(self, endpoint, fn, *args, **kwargs):
+        """Call a spotipy method through the shared rate limiter, retry policy and circuit breaker"""
+        deadline = time.monotonic() + config.SPOTIFY_REQUEST_TIMEOUT_S
+        attempt = 0
+        while True:
+            # Make sure spotipy has a token before admit(), so a token failure cannot hold the half-open probe
+            self.sp.auth_manager.get_access_token(as_dict=False)
+            time.sleep(self.guard.admit(deadline - time.monotonic()))
+            try:
+                result = fn(*args, **kwargs)
+            except spotipy.exceptions.SpotifyException as e:
+                retry_after = (e.headers or {}).get("Retry-After")
+                delay = self.guard.completed(endpoint, e.http_status, retry_after, attempt)
+                if delay is None or time.monotonic() + delay >= deadline:
+                    raise
+            except requests.exceptions.RequestException:
+                delay = self.guard.failed(endpoint, attempt)
+                if delay is None or time.monotonic() + delay >= deadline:
+                    raise
+            except BaseException:
+                self.guard.abandoned()
+                raise
+            else:
+                self.guard.completed(endpoint, 200, None, attempt)
+                return result
+            time.sleep(delay)
+            attempt += 1
+    
     def get_available_genres(self):
         """Get a list of available genre seeds from Spotify"""
         if self._available_genres is None:
             try:
-                result = self.sp.recommendation_genre_seeds()
+                result = self._call("genre_seeds", self.sp.recommendation_genre_seeds)
                 self._available_genres = result.get('genres', [])
             except Exception as e:
                 print(f"Error fetching genre seeds: {str(e)}")
@@ -52,14 +81,19 @@ class SpotifyClient:
         
         try:
             # Get recommendations based on seeds and audio features
-            results = self.sp.recommendations(
+            results = self._call(
+                "recommendations",
+                self.sp.recommendations,
                 seed_genres=valid_seed_genres[:5],  # Spotify allows max 5 seed genres
                 seed_tracks=seed_tracks,
                 limit=limit,
                 **audio_features
             )
             
-            return results['tracks']
+            return [Track.from_item(track) for track in results['tracks']]
+        except SpotifyUnavailable as e:
+            print(f"Spotify unavailable: {str(e)}")
+            return []
         except spotipy.exceptions.SpotifyException as e:
             print(f"Spotify API error: {str(e)}")
             return []
@@ -70,7 +104,8 @@ class SpotifyClient:
     def get_track_features(self, track_id):
         """Get audio features for a specific track"""
         try:
-            return self.sp.audio_features(track_id)[0]
+            features = self._call("audio_features", self.sp.audio_features, track_id)[0]
+            return AudioFeatures.from_item(features) if features else None
         except Exception as e:
             print(f"Error fetching track features: {str(e)}")
             return None
\ No newline at end of file
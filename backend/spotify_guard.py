@@ -0,0 +1,306 @@
+import asyncio
+import os
+import random
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional
+
+import config
+from metrics import REGISTRY
+
+THROTTLED = REGISTRY.counter("spotify_throttled_total", "429 responses received from Spotify", ["endpoint"])
+THROTTLE_WAIT = REGISTRY.counter(
+    "spotify_throttle_wait_seconds_total", "Time requests waited for the client-side rate limiter")
+RETRY_AFTER = REGISTRY.gauge("spotify_retry_after_seconds", "Retry-After of the most recent 429")
+CIRCUIT_STATE = REGISTRY.gauge("spotify_circuit_state", "Circuit breaker state: 0 closed, 1 half-open, 2 open")
+CIRCUIT_REJECTED = REGISTRY.counter(
+    "spotify_circuit_rejected_total", "Calls refused without contacting Spotify", ["reason"])
+COALESCED = REGISTRY.counter(
+    "spotify_coalesced_total", "Calls served by an identical request already in flight", ["endpoint"])
+
+
+class SpotifyUnavailable(Exception):
+    """Raised instead of calling Spotify while the circuit is open or the rate limit cannot be met in time."""
+
+
+class TokenBucket:
+    """
+    Client-side rate limiter: rate requests per second with bursts of up to burst.
+
+    reserve() hands out tokens in arrival order and returns how long the
+    caller must wait for its token. pause() stops handing out tokens until a
+    Retry-After has passed and restarts the refill from empty, so throttled
+    callers resume at the steady rate instead of all at once.
+    """
+
+    def __init__(self, rate: float, burst: int):
+        """
+        Args:
+            rate: Sustained requests per second; 0 disables rate limiting (pauses still apply)
+            burst: Maximum number of requests sent back to back
+        """
+        self.rate = rate
+        self.burst = max(1, burst)
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self, max_wait: float) -> Optional[float]:
+        """Take a token and return the seconds to wait before using it, or None if that exceeds max_wait."""
+        with self._lock:
+            now = time.monotonic()
+            if now > self._updated:
+                if self.rate > 0:
+                    self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+            wait = self._updated - now
+            if self.rate > 0 and self._tokens < 1:
+                wait += (1 - self._tokens) / self.rate
+            if wait > max_wait:
+                return None
+            if self.rate > 0:
+                self._tokens -= 1
+            return wait
+
+    def pause(self, seconds: float):
+        """Hand out no tokens for the next seconds."""
+        with self._lock:
+            until = time.monotonic() + seconds
+            if until > self._updated:
+                self._updated = until
+                self._tokens = min(self._tokens, 0.0)
+
+    @property
+    def paused(self) -> bool:
+        return self._updated > time.monotonic()
+
+
+class CircuitBreaker:
+    """
+    Stops calls to a failing dependency and probes it again after a cool-down.
+
+    Closed: calls go through, and failure_threshold consecutive failures open
+    the circuit. Open: calls are refused until reset_timeout has passed, then
+    the circuit is half-open and a single probe call is let through; its
+    success closes the circuit and its failure opens it again.
+    """
+
+    CLOSED, HALF_OPEN, OPEN = 0, 1, 2
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        """
+        Args:
+            failure_threshold: Consecutive failures that open the circuit
+            reset_timeout: Seconds the circuit stays open before a probe is allowed
+        """
+        self.failure_threshold = max(1, failure_threshold)
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probing = False
+        self._lock = threading.Lock()
+        CIRCUIT_STATE.set(self.state)
+
+    def _set_state(self, state: int):
+        if state != self.state:
+            print(f"Spotify circuit breaker {('closed', 'half-open', 'open')[state]}")
+        self.state = state
+        CIRCUIT_STATE.set(state)
+
+    def allow(self) -> bool:
+        """Whether a call may go through now."""
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+                self._set_state(self.HALF_OPEN)
+            if self.state == self.HALF_OPEN and not self._probing:
+                self._probing = True
+                return True
+            return False
+
+    def release_probe(self):
+        """Give up a probe slot obtained from allow() without making the call."""
+        with self._lock:
+            self._probing = False
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._probing = False
+            self._set_state(self.CLOSED)
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            self._probing = False
+            if self.state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                self._opened_at = time.monotonic()
+                self._set_state(self.OPEN)
+
+    @property
+    def is_open(self) -> bool:
+        return self.state == self.OPEN and time.monotonic() - self._opened_at < self.reset_timeout
+
+
+class SingleFlight:
+    """Coalesces concurrent calls with the same key into one call whose result they all share."""
+
+    def __init__(self, endpoint: str):
+        self.endpoint = endpoint
+        self._calls: Dict[Hashable, Future] = {}
+        self._lock = threading.Lock()
+
+    def do(self, key: Hashable, fn: Callable[[], Any]) -> Any:
+        with self._lock:
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                future = self._calls[key] = Future()
+        if not leader:
+            COALESCED.inc(endpoint=self.endpoint)
+            return future.result()
+
+        try:
+            result = fn()
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                del self._calls[key]
+
+
+class AsyncSingleFlight:
+    """asyncio counterpart of SingleFlight (one instance per event loop)."""
+
+    def __init__(self, endpoint: str):
+        self.endpoint = endpoint
+        self._calls: Dict[Hashable, asyncio.Future] = {}
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        task = self._calls.get(key)
+        if task is not None:
+            COALESCED.inc(endpoint=self.endpoint)
+        else:
+            task = self._calls[key] = asyncio.ensure_future(fn())
+            task.add_done_callback(lambda _: self._calls.pop(key, None))
+        # A caller cancelled at its deadline must not cancel the call the others are waiting on
+        return await asyncio.shield(task)
+
+
+class SpotifyGuard:
+    """
+    Shared rate limiting, retry policy and circuit breaking for all Spotify clients in a process.
+
+    Callers ask admit() before each attempt and report its outcome with
+    completed() or failed(), which return the delay before the next attempt
+    (None when it should not be retried), or abandoned() if it raised
+    anything else. A 429 pauses the token bucket for
+    its Retry-After, so every caller backs off, not just the one that got it;
+    server errors and network failures count towards the circuit breaker.
+    """
+
+    def __init__(self, rate: float = None, burst: int = None, max_retries: int = None,
+                 retry_backoff: float = None, failure_threshold: int = None, reset_timeout: float = None):
+        """
+        Args:
+            rate: Requests per second allowed by the token bucket
+            burst: Token bucket size
+            max_retries: Retries per call after the first attempt
+            retry_backoff: Base of the exponential backoff after server errors, in seconds
+            failure_threshold: Consecutive failures that open the circuit
+            reset_timeout: Seconds the circuit stays open
+        """
+        self.max_retries = max_retries if max_retries is not None else config.SPOTIFY_MAX_RETRIES
+        self.retry_backoff = retry_backoff if retry_backoff is not None else config.SPOTIFY_RETRY_BACKOFF_S
+        self.bucket = TokenBucket(rate if rate is not None else config.SPOTIFY_RATE_LIMIT_RPS,
+                                  burst or config.SPOTIFY_RATE_LIMIT_BURST)
+        self.breaker = CircuitBreaker(failure_threshold or config.SPOTIFY_BREAKER_FAILURES,
+                                      reset_timeout if reset_timeout is not None else config.SPOTIFY_BREAKER_RESET_S)
+        # Locks held by another thread at fork time would never be released in the child
+        os.register_at_fork(after_in_child=self._after_fork)
+
+    def _after_fork(self):
+        self.bucket._lock = threading.Lock()
+        self.breaker._lock = threading.Lock()
+
+    @property
+    def degraded(self) -> bool:
+        """True while calls are being refused (circuit open) or held back by a Retry-After."""
+        return self.breaker.is_open or self.bucket.paused
+
+    def admit(self, max_wait: float) -> float:
+        """
+        Reserve a slot for one request.
+
+        Returns:
+            Seconds to wait before sending it
+
+        Raises:
+            SpotifyUnavailable: If the circuit is open or no slot is free within max_wait
+        """
+        if not self.breaker.allow():
+            CIRCUIT_REJECTED.inc(reason="circuit_open")
+            raise SpotifyUnavailable("Spotify circuit breaker is open")
+        wait = self.bucket.reserve(max(0.0, max_wait))
+        if wait is None:
+            CIRCUIT_REJECTED.inc(reason="rate_limited")
+            # If this was the half-open probe it never went out; let the next caller probe instead
+            self.breaker.release_probe()
+            raise SpotifyUnavailable("Spotify rate limit leaves no slot before the deadline")
+        if wait > 0:
+            THROTTLE_WAIT.inc(wait)
+        return wait
+
+    def completed(self, endpoint: str, status: int, retry_after: Optional[str], attempt: int) -> Optional[float]:
+        """Record a response; return the delay before retrying it, or None to use it as is."""
+        if status == 429:
+            THROTTLED.inc(endpoint=endpoint)
+            try:
+                delay = float(retry_after)
+            except (TypeError, ValueError):
+                delay = self._backoff(attempt)
+            RETRY_AFTER.set(delay)
+            self.bucket.pause(delay)
+            # Spotify is up, just busy: the breaker sees a success
+            self.breaker.record_success()
+            return delay if attempt < self.max_retries else None
+        if status >= 500:
+            self.breaker.record_failure()
+            return self._backoff(attempt) if attempt < self.max_retries else None
+        self.breaker.record_success()
+        return None
+
+    def failed(self, endpoint: str, attempt: int) -> Optional[float]:
+        """Record a network error or timeout; return the delay before retrying, or None to give up."""
+        self.breaker.record_failure()
+        return self._backoff(attempt) if attempt < self.max_retries else None
+
+    def abandoned(self):
+        """Record an attempt that ended in neither a response nor a network error (a bug, or cancellation)."""
+        # If it was the half-open probe, let the next caller probe instead of refusing calls for good
+        self.breaker.release_probe()
+
+    def _backoff(self, attempt: int) -> float:
+        # Jitter keeps retries from many callers from lining up
+        return random.uniform(0.5, 1.0) * self.retry_backoff * 2 ** attempt
+
+
+_guard = None
+_guard_lock = threading.Lock()
+
+
+def get_spotify_guard() -> SpotifyGuard:
+    """Return the process-wide guard shared by every Spotify client."""
+    global _guard
+    if _guard is None:
+        with _guard_lock:
+            if _guard is None:
+                _guard = SpotifyGuard()
+    return _guard
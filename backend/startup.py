@@ -0,0 +1,48 @@
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict
+
+from metrics import REGISTRY
+
+STARTUP_PHASE_SECONDS = REGISTRY.gauge("startup_phase_seconds", "Duration of each startup phase", ["phase"])
+
+# Reference point for the startup clock: the first import of this module
+STARTED_AT = time.perf_counter()
+
+_phases: Dict[str, float] = {}
+_last_mark = STARTED_AT
+_lock = threading.Lock()
+
+
+def record(name: str, seconds: float):
+    """Record the duration of a startup phase."""
+    with _lock:
+        _phases[name] = seconds
+    STARTUP_PHASE_SECONDS.set(seconds, phase=name)
+
+
+def mark(name: str):
+    """Record the time since the previous mark (or since startup) as a phase."""
+    global _last_mark
+    now = time.perf_counter()
+    with _lock:
+        elapsed, _last_mark = now - _last_mark, now
+    record(name, elapsed)
+
+
+@contextmanager
+def phase(name: str):
+    """Time a block of startup work."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(name, time.perf_counter() - started)
+
+
+def report() -> Dict[str, object]:
+    """Breakdown of startup time, for the readiness endpoint and CI benchmarks."""
+    with _lock:
+        phases = dict(_phases)
+    return {"phases": phases, "uptime_seconds": time.perf_counter() - STARTED_AT}
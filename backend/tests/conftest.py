@@ -0,0 +1,10 @@
+import os
+import sys
+
+# The backend modules are imported flat, as app.py does
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+# Importing app must not load the model or start background Spotify refreshes
+os.environ.setdefault("MODEL_PRELOAD", "lazy")
+os.environ.setdefault("CANDIDATE_POOLS", "0")
+os.environ.setdefault("EMOTION_WARMUP", "0")
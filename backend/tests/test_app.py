@@ -0,0 +1,71 @@
+import pytest
+
+import config
+import services
+from app import app, parse_recommend_request
+
+
+@pytest.fixture
+def client():
+    return app.test_client()
+
+
+@pytest.mark.parametrize("route", ["/recommend", "/recommend/stream"])
+@pytest.mark.parametrize("body", [
+    {"user_text": "hi", "num_songs": "abc"},
+    {"user_text": "hi", "num_songs": None},
+    {"user_text": "hi", "num_songs": 0},
+    {"user_text": "hi", "num_songs": True},
+    {"user_text": "hi", "languages": "hindi"},
+    {"user_text": 42},
+    {"text": "hi"},
+    ["hi"],
+    "hi",
+])
+def test_invalid_bodies_get_a_json_400(client, route, body):
+    response = client.post(route, json=body)
+    assert response.status_code == 400
+    assert "error" in response.get_json()
+
+
+def test_non_json_body_gets_a_json_400(client):
+    response = client.post("/recommend", data="user_text=hi", content_type="application/x-www-form-urlencoded")
+    assert response.status_code == 400
+    assert "error" in response.get_json()
+
+
+def test_batch_rejects_too_many_texts(client):
+    response = client.post("/recommend/batch", json={"texts": ["hi"] * (config.MAX_BATCH_TEXTS + 1)})
+    assert response.status_code == 400
+
+
+def test_batch_rejects_non_string_texts(client):
+    assert client.post("/recommend/batch", json={"texts": ["hi", None]}).status_code == 400
+
+
+def test_num_songs_is_clamped():
+    params = parse_recommend_request({"user_text": "hi", "num_songs": 10 ** 6})
+    assert params["num_songs"] == config.MAX_SONGS_PER_REQUEST
+
+
+def test_defaults():
+    params = parse_recommend_request({"user_text": "hi", "num_songs": "3"})
+    assert params == {"user_text": "hi", "languages": ["hindi", "malayalam"], "use_clustering": False,
+                      "num_songs": 3}
+
+
+def test_recommend_honors_num_songs(client, monkeypatch):
+    class Result:
+        emotion = "happy"
+
+    requested = []
+
+    def recommend_for_text(text, num_songs, **kwargs):
+        requested.append(num_songs)
+        return []
+
+    monkeypatch.setattr(services.emotion_detector, "detect_emotion_with_scores", lambda text: Result())
+    monkeypatch.setattr(services.recommender, "recommend_for_text", recommend_for_text)
+    assert client.post("/recommend", json={"user_text": "hi", "num_songs": 3}).status_code == 200
+    assert client.post("/recommend", json={"user_text": "hi"}).status_code == 200
+    assert requested == [3, 5]
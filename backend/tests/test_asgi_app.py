@@ -0,0 +1,67 @@
+import subprocess
+import sys
+
+import pytest
+from starlette.testclient import TestClient
+
+import asgi_app
+from records import Song
+
+
+def test_asgi_app_does_not_import_flask():
+    code = "import sys, asgi_app; sys.exit('flask' in sys.modules or 'app' in sys.modules)"
+    assert subprocess.run([sys.executable, "-c", code], cwd=asgi_app.__file__.rsplit("/", 1)[0]).returncode == 0
+
+
+@pytest.fixture(scope="module")
+def client():
+    with TestClient(asgi_app.app) as client:
+        yield client
+
+
+def test_invalid_body_gets_a_json_400(client):
+    response = client.post("/recommend", json={"user_text": "hi", "languages": 3})
+    assert response.status_code == 400
+    assert "error" in response.json()
+
+
+def test_local_fallback_runs_off_the_event_loop(client, monkeypatch):
+    import threading
+
+    class Result:
+        emotion, label, scores = "sad", "sadness", {}
+
+    threads = []
+
+    def fallback(emotion_result, num_songs):
+        threads.append(threading.current_thread().name)
+        return [Song("Title", "Artist")]
+
+    async def no_tracks(emotion, num_songs, market="US"):
+        return []
+
+    monkeypatch.setattr(asgi_app, "classify_and_recommend_offline", lambda *args: (Result(), None))
+    monkeypatch.setattr(asgi_app, "fetch_candidate_tracks", no_tracks)
+    monkeypatch.setattr(asgi_app.recommender, "recommend_local_fallback", fallback)
+
+    response = client.post("/recommend", json={"user_text": "hi"})
+    assert response.status_code == 200
+    assert response.json()["recommendations"][0]["title"] == "Title"
+    assert threads and threads[0].startswith("inference")
+
+
+def test_recommend_honors_num_songs(client, monkeypatch):
+    class Result:
+        emotion, label, scores = "happy", "joy", {}
+
+    requested = []
+
+    def classify(user_text, num_songs, languages, use_clustering):
+        requested.append(num_songs)
+        return Result(), [Song(f"Title {i}", "Artist") for i in range(num_songs)]
+
+    monkeypatch.setattr(asgi_app, "classify_and_recommend_offline", classify)
+    response = client.post("/recommend", json={"user_text": "hi", "num_songs": 3})
+    assert response.status_code == 200
+    assert len(response.json()["recommendations"]) == 3
+    assert requested == [3]
@@ -0,0 +1,95 @@
+import multiprocessing
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pytest
+
+from batching import MicroBatcher
+from tracing import end_trace, stage, start_trace
+
+
+def echo(texts):
+    return np.array([[float(text)] for text in texts])
+
+
+def test_every_caller_gets_its_own_rows_in_order():
+    batcher = MicroBatcher(echo, max_batch_size=8, max_wait_ms=5)
+    requests = [[str(i * 10 + j) for j in range(i % 4 + 1)] for i in range(64)]
+    with ThreadPoolExecutor(max_workers=16) as pool:
+        results = list(pool.map(batcher.predict, requests))
+    for texts, scores in zip(requests, results):
+        assert scores[:, 0].tolist() == [float(text) for text in texts]
+
+
+def test_batches_respect_the_size_limit():
+    sizes = []
+    started = threading.Event()
+
+    def record(texts):
+        started.wait(1.0)
+        sizes.append(len(texts))
+        return echo(texts)
+
+    batcher = MicroBatcher(record, max_batch_size=4, max_wait_ms=50)
+    futures = [batcher.submit(str(i)) for i in range(10)]
+    started.set()
+    assert [future.result(timeout=5)[0] for future in futures] == list(range(10))
+    assert max(sizes) <= 4 and sum(sizes) == 10
+
+
+def test_failure_reaches_every_caller_of_the_batch_and_the_batcher_recovers():
+    calls = []
+
+    def flaky(texts):
+        calls.append(texts)
+        if len(calls) == 1:
+            raise RuntimeError("model failed")
+        return echo(texts)
+
+    batcher = MicroBatcher(flaky, max_batch_size=8, max_wait_ms=20)
+    futures = [batcher.submit(str(i)) for i in range(3)]
+    for future in futures:
+        with pytest.raises(RuntimeError):
+            future.result(timeout=5)
+    assert batcher.predict(["7"])[0, 0] == 7.0
+
+
+def _predict_in_child(batcher, queue):
+    queue.put(batcher.predict(["3", "4"])[:, 0].tolist())
+
+
+def test_forked_child_gets_a_working_batcher():
+    batcher = MicroBatcher(echo, max_batch_size=8, max_wait_ms=1)
+    ctx = multiprocessing.get_context("fork")
+    queue = ctx.Queue()
+    child = ctx.Process(target=_predict_in_child, args=(batcher, queue))
+    child.start()
+    assert queue.get(timeout=10) == [3.0, 4.0]
+    child.join(timeout=10)
+
+
+def test_batch_stages_join_the_trace_of_every_caller_in_the_batch():
+    release = threading.Event()
+
+    def staged(texts):
+        release.wait(1.0)
+        with stage("forward"):
+            return echo(texts)
+
+    batcher = MicroBatcher(staged, max_batch_size=8, max_wait_ms=50)
+
+    def traced_predict(text):
+        token = start_trace()
+        batcher.predict([text])
+        return end_trace(token)
+
+    with ThreadPoolExecutor(max_workers=3) as pool:
+        futures = [pool.submit(traced_predict, str(i)) for i in range(3)]
+        release.set()
+        traces = [future.result(timeout=5) for future in futures]
+    for trace in traces:
+        assert [name for name, _, _ in trace.spans] == ["batch_queue", "forward"]
+
+    # Untraced callers leave no trace behind on the batcher thread
+    assert batcher.predict(["7"])[0, 0] == 7.0
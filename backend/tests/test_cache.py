@@ -0,0 +1,161 @@
+import multiprocessing
+import os
+import time
+
+import numpy as np
+
+from cache import EmotionScoreCache, SQLiteStore, TTLCache, normalize_text, text_key
+
+
+def scores(*values):
+    return np.array([values], dtype=np.float32)
+
+
+def test_case_and_whitespace_share_a_key():
+    assert text_key("I am  SO happy\n") == text_key("i am so happy")
+
+
+def test_punctuation_and_emoji_are_kept():
+    keys = {text_key(text) for text in (":)", ":(", "😭", "!!!", "😊😊", "ok", "ok!")}
+    assert len(keys) == 7
+    assert normalize_text("😭") == "😭"
+
+
+def test_blank_texts_have_no_key():
+    assert text_key("") is None
+    assert text_key(" \n\t") is None
+
+
+def test_none_keys_are_never_looked_up():
+    cache = EmotionScoreCache(2, capacity=8)
+    assert cache.get_many([None]) == [None]
+    assert cache._lookups == 0
+
+
+def test_len_counts_filled_slots():
+    cache = EmotionScoreCache(2, capacity=8)
+    cache.set_many([1, 2], np.ones((2, 2)))
+    cache.set_many([2], np.zeros((1, 2)))
+    assert len(cache) == 2
+
+
+def test_shared_file_is_reused_with_the_same_fingerprint(tmp_path):
+    path = str(tmp_path / "scores")
+    EmotionScoreCache(2, capacity=8, path=path, fingerprint="tf").set_many([7], scores(0.25, 0.75))
+    other = EmotionScoreCache(2, capacity=8, path=path, fingerprint="tf")
+    assert np.allclose(other.get_many([7])[0], [0.25, 0.75])
+    assert len(other) == 1
+
+
+def test_shared_file_from_another_backend_is_replaced_not_truncated(tmp_path):
+    path = str(tmp_path / "scores")
+    old = EmotionScoreCache(2, capacity=8, path=path, fingerprint="tf")
+    old.set_many([7], scores(0.25, 0.75))
+    inode = os.stat(path).st_ino
+
+    new = EmotionScoreCache(2, capacity=8, path=path, fingerprint="onnx-int8")
+    assert new.get_many([7]) == [None]
+    assert os.stat(path).st_ino != inode
+    # A worker that still maps the old file keeps reading it
+    assert np.allclose(old.get_many([7])[0], [0.25, 0.75])
+
+
+def test_shared_file_of_another_size_is_replaced(tmp_path):
+    path = str(tmp_path / "scores")
+    EmotionScoreCache(2, capacity=8, path=path).set_many([7], scores(0.25, 0.75))
+    assert EmotionScoreCache(2, capacity=64, path=path).get_many([7]) == [None]
+
+
+def _fill(path, start):
+    cache = EmotionScoreCache(2, capacity=64, path=path)
+    for key in range(start, start + 400):
+        cache.set_many([key], scores(key % 1000, key // 1000))
+
+
+def test_concurrent_writer_processes_never_mix_up_scores(tmp_path):
+    path = str(tmp_path / "scores")
+    EmotionScoreCache(2, capacity=64, path=path)
+    ctx = multiprocessing.get_context("fork")
+    workers = [ctx.Process(target=_fill, args=(path, 1 + 1000 * i)) for i in range(4)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+
+    cache = EmotionScoreCache(2, capacity=64, path=path)
+    table = np.asarray(cache.table).reshape(-1)
+    filled = table[table["key"] != 0]
+    assert len(filled) == len(cache) == 64
+    assert np.array_equal(filled["scores"][:, 0], filled["key"] % 1000)
+    assert np.array_equal(filled["scores"][:, 1], filled["key"] // 1000)
+
+
+def test_score_cache_hit_and_miss():
+    cache = EmotionScoreCache(2, capacity=64)
+    cache.set_many([11], scores(0.5, 0.5))
+    hit, miss = cache.get_many([11, 12])
+    assert np.allclose(hit, [0.5, 0.5]) and miss is None
+    assert (cache._hits, cache._lookups) == (1, 2)
+
+
+def test_score_cache_evicts_the_least_recently_used_way():
+    cache = EmotionScoreCache(1, capacity=EmotionScoreCache.WAYS)
+    assert cache.num_sets == 1
+    keys = list(range(1, EmotionScoreCache.WAYS + 1))
+    for key in keys:
+        cache.set_many([key], scores(key))
+    cache.get_many([1])
+    cache.set_many([100], scores(100))
+    found = cache.get_many(keys + [100])
+    assert found[1] is None
+    assert all(value is not None for i, value in enumerate(found) if i != 1)
+    assert len(cache) == EmotionScoreCache.WAYS
+
+
+def test_ttl_cache_hit_miss_and_expiry(monkeypatch):
+    import cache as cache_module
+
+    now = [1000.0]
+    monkeypatch.setattr(cache_module.time, "time", lambda: now[0])
+    cache = TTLCache("test", maxsize=4, ttl=10)
+    cache.set("a", 1)
+    assert cache.get("a") == 1
+    assert cache.get("b", "missing") == "missing"
+    now[0] += 11
+    assert cache.get("a") is None
+    assert cache.get_stale("a") == 1
+
+
+def test_ttl_cache_evicts_least_recently_used():
+    cache = TTLCache("test", maxsize=2, ttl=60)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+    assert cache.get_many(["a", "b", "c"]) == {"a": 1, "c": 3}
+
+
+def test_ttl_cache_falls_back_to_the_store(tmp_path):
+    store = SQLiteStore(str(tmp_path / "cache.db"))
+    TTLCache("test", maxsize=2, ttl=60, store=store).set("a", [1, 2])
+    assert TTLCache("test", maxsize=2, ttl=60, store=store).get("a") == [1, 2]
+
+
+def _use_store(store, queue):
+    store.set("test", "child", [3], time.time() + 60)
+    queue.put(store.get("test", "parent")[0])
+
+
+def test_forked_child_gets_its_own_store_connection(tmp_path):
+    store = SQLiteStore(str(tmp_path / "cache.db"))
+    store.set("test", "parent", [1, 2], time.time() + 60)
+    ctx = multiprocessing.get_context("fork")
+    queue = ctx.Queue()
+    # As if another thread were writing at fork time: the child must not inherit the held lock
+    with store._lock:
+        child = ctx.Process(target=_use_store, args=(store, queue), daemon=True)
+        child.start()
+    assert queue.get(timeout=10) == [1, 2]
+    child.join(timeout=10)
+    assert child.exitcode == 0
+    assert store.get("test", "child")[0] == [3]
@@ -0,0 +1,77 @@
+import os
+
+import numpy as np
+import pytest
+
+from ann_index import IVFIndex
+from catalog import FEATURE_COLUMNS, TrackCatalog, build_catalog
+
+
+def make_rows(count, seed=0):
+    rng = np.random.default_rng(seed)
+    for i in range(count):
+        row = {"id": f"t{i}", "name": f"Track {i}", "artist": f"Artist {i % 17}",
+               "language": ("english", "hindi", "malayalam")[i % 3], "genre": ("pop", "rock")[i % 2]}
+        row.update({column: float(value) for column, value in zip(FEATURE_COLUMNS, rng.random(len(FEATURE_COLUMNS)))})
+        row["tempo"] *= 200
+        yield row
+
+
+@pytest.fixture
+def indexed_catalog(tmp_path):
+    path = str(tmp_path / "catalog")
+    build_catalog(make_rows(2000), path)
+    IVFIndex.build(TrackCatalog(path), os.path.join(path, "ivf"), nlist=16, nprobe=8)
+    return path
+
+
+def test_index_is_used_when_built_for_the_catalog(indexed_catalog):
+    assert TrackCatalog(indexed_catalog).index is not None
+
+
+def test_index_is_ignored_after_the_catalog_is_rebuilt(indexed_catalog):
+    build_catalog(make_rows(500, seed=1), indexed_catalog)
+    catalog = TrackCatalog(indexed_catalog)
+    assert catalog.index is None
+    assert len(catalog.nearest({"target_valence": 0.5, "target_energy": 0.5}, k=5)) == 5
+
+
+def test_index_is_ignored_after_a_rebuild_with_the_same_count(indexed_catalog):
+    build_catalog(make_rows(2000, seed=1), indexed_catalog)
+    assert TrackCatalog(indexed_catalog).index is None
+
+
+@pytest.mark.parametrize("filters", [{}, {"languages": ["hindi"]}, {"languages": ["english"], "genres": ["rock"]}])
+def test_ivf_search_agrees_with_the_exact_scan(indexed_catalog, filters):
+    catalog = TrackCatalog(indexed_catalog)
+    rng = np.random.default_rng(3)
+    recall = []
+    for _ in range(20):
+        valence, energy = rng.random(2)
+        target = {"target_valence": valence, "target_energy": energy, "target_tempo": 120.0}
+        exact = [track["id"] for track in catalog.nearest(target, k=10, exact=True, **filters)]
+        approximate = [track["id"] for track in catalog.nearest(target, k=10, **filters)]
+        assert len(exact) == 10
+        recall.append(len(set(exact) & set(approximate)) / len(exact))
+    assert np.mean(recall) >= 0.9
+
+
+def test_ivf_search_with_every_list_probed_is_exact(indexed_catalog):
+    catalog = TrackCatalog(indexed_catalog)
+    columns, target = catalog.target_vector({"target_valence": 0.3, "target_energy": 0.8})
+    exact_rows, exact_distances = catalog.nearest_rows(columns, target, 10)
+    rows, distances = catalog.index.search(columns, target, 10, nprobe=len(catalog.index.centroids))
+    assert rows.tolist() == exact_rows.tolist()
+    assert np.allclose(distances, exact_distances)
+
+
+def test_filter_with_no_known_values_returns_nothing_without_a_scan(indexed_catalog, monkeypatch):
+    catalog = TrackCatalog(indexed_catalog)
+
+    def scan(*args, **kwargs):
+        raise AssertionError("full scan")
+
+    monkeypatch.setattr(catalog, "nearest_rows", scan)
+    target = {"target_valence": 0.5, "target_energy": 0.5}
+    assert catalog.nearest(target, k=5, languages=["klingon"]) == []
+    assert catalog.nearest(target, k=5, languages=["hindi"], genres=["polka"]) == []
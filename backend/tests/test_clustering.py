@@ -0,0 +1,64 @@
+import numpy as np
+
+from clustering import ClusterScorer, IncrementalKMeans
+from records import AudioFeatures, Track
+
+CENTERS = np.array([[0.1, 0.1, 0.1], [0.5, 0.9, 0.5], [0.9, 0.1, 0.9]])
+
+
+def blobs(centers, per_cluster=40, spread=0.02, seed=0):
+    rng = np.random.default_rng(seed)
+    return np.concatenate([center + rng.normal(scale=spread, size=(per_cluster, len(center)))
+                           for center in centers])
+
+
+def matched(centroids, centers):
+    return np.sort(np.abs(centroids[:, None, :] - centers[None, :, :]).sum(axis=2).min(axis=0))
+
+
+def test_first_batch_is_fully_fitted():
+    kmeans = IncrementalKMeans(3).partial_fit(blobs(CENTERS))
+    assert matched(kmeans.centroids, CENTERS).max() < 0.05
+
+
+def test_centroids_keep_following_a_drifting_pool():
+    kmeans = IncrementalKMeans(3).partial_fit(blobs(CENTERS))
+    for seed in range(50):
+        kmeans.partial_fit(blobs(CENTERS, seed=seed))
+    shifted = CENTERS + 0.05
+    for seed in range(30):
+        kmeans.partial_fit(blobs(shifted, seed=100 + seed))
+    assert matched(kmeans.centroids, shifted).max() < 0.02
+
+
+def test_update_swaps_in_a_new_array():
+    kmeans = IncrementalKMeans(3).partial_fit(blobs(CENTERS))
+    before = kmeans.centroids
+    snapshot = before.copy()
+    kmeans.partial_fit(blobs(CENTERS + 0.1, seed=1))
+    assert kmeans.centroids is not before
+    assert np.array_equal(before, snapshot)
+
+
+def test_too_few_rows_leave_the_model_unfitted():
+    assert not IncrementalKMeans(3).partial_fit(blobs(CENTERS[:1], per_cluster=2)).fitted
+
+
+def track_pool(prefix, seed):
+    rng = np.random.default_rng(seed)
+    tracks, features = [], []
+    for i in range(30):
+        track_id = f"{prefix}{i}"
+        valence, energy, danceability, tempo, mode, instrumentalness, acousticness = rng.random(7)
+        tracks.append(Track(track_id, f"Song {i}", "Artist"))
+        features.append(AudioFeatures(track_id, valence, energy, danceability, 60 + 120 * tempo, float(mode > 0.5),
+                                      instrumentalness, acousticness))
+    return tracks, features
+
+
+def test_each_emotion_has_its_own_centroids():
+    scorer = ClusterScorer(3)
+    scorer.select(*track_pool("a", 0), "joy")
+    scorer.select(*track_pool("b", 1), "sadness")
+    assert set(scorer.models) == {"joy", "sadness"}
+    assert not np.array_equal(scorer.models["joy"].centroids, scorer.models["sadness"].centroids)
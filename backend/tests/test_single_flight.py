@@ -0,0 +1,76 @@
+import threading
+import time
+
+from candidate_pools import CandidatePoolRefresher
+from records import Song
+from spotify_guard import SingleFlight
+from token_manager import SpotifyTokenManager
+
+
+def test_concurrent_calls_with_the_same_key_share_one_call():
+    calls = []
+    flight = SingleFlight("test")
+    release = threading.Event()
+
+    def slow():
+        calls.append(1)
+        release.wait(2)
+        return "result"
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(flight.do("key", slow))) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    time.sleep(0.1)
+    release.set()
+    for thread in threads:
+        thread.join()
+    assert results == ["result"] * 8
+    assert len(calls) == 1
+
+
+def test_concurrent_token_requests_fetch_one_token():
+    posts = []
+
+    class Response:
+        status_code = 200
+
+        def json(self):
+            return {"access_token": "token", "expires_in": 3600}
+
+    class Session:
+        def post(self, *args, **kwargs):
+            posts.append(1)
+            time.sleep(0.05)
+            return Response()
+
+    manager = SpotifyTokenManager("id", "secret", session=Session())
+    tokens = []
+    threads = [threading.Thread(target=lambda: tokens.append(manager.get_token())) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert tokens == ["token"] * 8
+    assert len(posts) == 1
+
+
+def test_pool_refresh_swaps_in_a_new_map_and_keeps_songs_on_failure():
+    key = ("joy", None, "US")
+    results = [[Song("A", "x"), Song("B", "y")], RuntimeError("spotify down")]
+
+    def build(*pool_key):
+        result = results.pop(0)
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+    refresher = CandidatePoolRefresher(build, [key])
+    refresher.refresh(key)
+    pools = refresher._pools
+    first = refresher.get(key)
+
+    refresher.refresh(key)
+    assert refresher._pools is not pools
+    assert refresher.get(key).songs == first.songs
+    assert refresher.ready()
@@ -0,0 +1,195 @@
+import asyncio
+import socket
+import time
+
+import pytest
+import requests
+
+from async_spotify import AsyncSpotifyWebAPI
+from cache import TTLCache
+from spotify_api import SpotifyWebAPI
+from spotify_guard import CircuitBreaker, SpotifyGuard, SpotifyUnavailable
+from token_manager import SpotifyTokenError, SpotifyTokenManager
+
+
+def open_breaker(breaker):
+    for _ in range(breaker.failure_threshold):
+        breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+
+
+def test_breaker_opens_after_consecutive_failures():
+    breaker = CircuitBreaker(failure_threshold=3, reset_timeout=60)
+    breaker.record_failure()
+    breaker.record_failure()
+    breaker.record_success()
+    breaker.record_failure()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.CLOSED and breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN and breaker.is_open
+    assert not breaker.allow()
+
+
+def test_half_open_lets_one_probe_through():
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0)
+    open_breaker(breaker)
+    assert breaker.allow()
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    assert not breaker.allow()
+
+
+def test_probe_success_closes_and_failure_reopens():
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0)
+    open_breaker(breaker)
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+
+    assert breaker.allow()
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED and breaker.allow()
+
+
+def test_released_probe_goes_to_the_next_caller():
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0)
+    open_breaker(breaker)
+    assert breaker.allow()
+    breaker.release_probe()
+    assert breaker.allow()
+
+
+def test_open_breaker_refuses_until_reset_timeout():
+    guard = SpotifyGuard(rate=0, failure_threshold=1, reset_timeout=0.05)
+    open_breaker(guard.breaker)
+    with pytest.raises(SpotifyUnavailable):
+        guard.admit(1.0)
+    time.sleep(0.06)
+    assert guard.admit(1.0) == 0
+    assert guard.breaker.state == CircuitBreaker.HALF_OPEN
+
+
+def test_429_pauses_without_opening_the_breaker():
+    guard = SpotifyGuard(rate=0, failure_threshold=1, max_retries=2)
+    assert guard.completed("search", 429, "0.05", 0) == 0.05
+    assert guard.breaker.state == CircuitBreaker.CLOSED
+    assert guard.bucket.paused
+
+
+def test_server_error_counts_towards_breaker_and_stops_retrying():
+    guard = SpotifyGuard(rate=0, failure_threshold=2, max_retries=1, retry_backoff=0.01)
+    assert guard.completed("search", 503, None, 0) is not None
+    assert guard.completed("search", 503, None, 1) is None
+    assert guard.breaker.state == CircuitBreaker.OPEN
+
+
+def half_open_client(token_provider, monkeypatch, get=None):
+    guard = SpotifyGuard(rate=0, failure_threshold=1, reset_timeout=0, max_retries=0)
+    api = SpotifyWebAPI(token_provider, guard=guard)
+    if get is not None:
+        monkeypatch.setattr(api.session, "get", get)
+    open_breaker(guard.breaker)
+    return api, guard
+
+
+def test_token_failure_during_probe_does_not_wedge_the_breaker(monkeypatch):
+    def no_token():
+        raise SpotifyTokenError("Failed to get Spotify token")
+
+    api, guard = half_open_client(no_token, monkeypatch)
+    with pytest.raises(requests.exceptions.RequestException):
+        api._get("search", api.SEARCH_URL, {}, timeout=1.0)
+    assert not guard.breaker._probing
+    assert guard.breaker.allow()
+
+
+def test_unexpected_error_during_probe_releases_it(monkeypatch):
+    def broken_get(*args, **kwargs):
+        raise ValueError("bug")
+
+    api, guard = half_open_client(lambda: "token", monkeypatch, broken_get)
+    with pytest.raises(ValueError):
+        api._get("search", api.SEARCH_URL, {}, timeout=1.0)
+    assert guard.breaker.state == CircuitBreaker.HALF_OPEN
+    assert guard.breaker.allow()
+
+
+def test_network_error_during_probe_reopens(monkeypatch):
+    def unreachable(*args, **kwargs):
+        raise requests.exceptions.ConnectionError("unreachable")
+
+    api, guard = half_open_client(lambda: "token", monkeypatch, unreachable)
+    with pytest.raises(requests.exceptions.ConnectionError):
+        api._get("search", api.SEARCH_URL, {}, timeout=1.0)
+    assert guard.breaker.state == CircuitBreaker.OPEN
+
+
+def test_token_manager_raises_request_exception_on_rejected_credentials():
+    class Rejected:
+        status_code = 400
+        text = '{"error": "invalid_client"}'
+
+    class Session:
+        def post(self, *args, **kwargs):
+            return Rejected()
+
+    manager = SpotifyTokenManager("id", "secret", session=Session())
+    with pytest.raises(SpotifyTokenError):
+        manager.get_token()
+
+
+@pytest.fixture
+def unreachable_token_manager(monkeypatch):
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        port = s.getsockname()[1]
+    # Nothing listens on the port any more, so every token request is refused
+    monkeypatch.setattr(SpotifyTokenManager, "TOKEN_URL", f"http://127.0.0.1:{port}/api/token")
+    return SpotifyTokenManager("id", "secret")
+
+
+def test_unreachable_token_endpoint_yields_no_tracks(unreachable_token_manager):
+    guard = SpotifyGuard(rate=0, max_retries=0)
+    api = SpotifyWebAPI(unreachable_token_manager.get_token, guard=guard)
+    assert api.search_many([("happy", 5), ("upbeat", 5)]) == [[], []]
+    assert api.search_tracks("happy songs") == []
+    assert guard.breaker.state == CircuitBreaker.CLOSED
+
+
+def test_missing_credentials_yield_no_tracks():
+    api = SpotifyWebAPI(SpotifyTokenManager("", "").get_token, guard=SpotifyGuard(rate=0, max_retries=0))
+    assert api.search_many([("happy", 5)]) == [[]]
+
+
+def test_unreachable_token_endpoint_yields_no_tracks_async(unreachable_token_manager):
+    async def run():
+        api = AsyncSpotifyWebAPI(unreachable_token_manager.get_token, TTLCache("test_search"),
+                                 TTLCache("test_features"), guard=SpotifyGuard(rate=0, max_retries=0))
+        try:
+            return (await api.search_many([("happy", 5), ("upbeat", 5)]), await api.search_tracks("happy songs"),
+                    await api.get_audio_features(["track"]))
+        finally:
+            await api.aclose()
+
+    assert asyncio.run(run()) == ([[], []], [], [])
+
+
+def test_short_lived_token_is_renewed_halfway_not_continuously():
+    posts = []
+
+    class Response:
+        status_code = 200
+
+        def json(self):
+            return {"access_token": "token", "expires_in": 120}
+
+    class Session:
+        def post(self, *args, **kwargs):
+            posts.append(1)
+            return Response()
+
+    manager = SpotifyTokenManager("id", "secret", refresh_margin=300, session=Session())
+    manager.refresh()
+    manager.refresh()
+    assert len(posts) == 1
+    assert 55 < manager.expires_at - manager._margin() - time.time() <= 60
@@ -0,0 +1,158 @@
+import base64
+import os
+import threading
+import time
+from typing import Optional
+
+import requests
+
+import config
+from spotify_api import SPOTIFY_REQUESTS, SPOTIFY_RETRIES
+from tracing import stage
+
+
+class SpotifyTokenError(requests.exceptions.RequestException):
+    """Raised when the accounts service does not issue a token."""
+
+
+class SpotifyTokenManager:
+    """
+    Process-wide Spotify client-credentials token manager.
+
+    Refreshes are single-flight: only one thread talks to the accounts service
+    at a time, and threads that arrive while a refresh is running reuse its
+    result. A background thread renews the token before it expires, so once
+    the first token exists the request path never waits on a fetch.
+    """
+
+    TOKEN_URL = f"{config.SPOTIFY_ACCOUNTS_URL}/api/token"
+
+    # A token this close to expiry is treated as expired by get_token
+    EXPIRY_SKEW = 10.0
+
+    def __init__(self, client_id: Optional[str] = None, client_secret: Optional[str] = None,
+                 refresh_margin: float = None, session: Optional[requests.Session] = None):
+        """
+        Args:
+            client_id: Spotify client ID, defaults to SPOTIFY_CLIENT_ID
+            client_secret: Spotify client secret, defaults to SPOTIFY_CLIENT_SECRET
+            refresh_margin: Seconds before expiry at which the token is renewed
+            session: HTTP session used for token requests
+        """
+        self.client_id = client_id or os.getenv("SPOTIFY_CLIENT_ID")
+        self.client_secret = client_secret or os.getenv("SPOTIFY_CLIENT_SECRET")
+        self.refresh_margin = refresh_margin if refresh_margin is not None else config.SPOTIFY_TOKEN_REFRESH_MARGIN_S
+        self.session = session or requests.Session()
+        self._owns_session = session is None
+
+        self.token = None
+        self.expires_at = 0.0
+        self.lifetime = 0.0
+        self._refresh_lock = threading.Lock()
+        self._refresher = None
+        os.register_at_fork(after_in_child=self._after_fork)
+
+    def _after_fork(self):
+        # A forked worker has no refresher thread and must not share the parent's sockets;
+        # the token itself stays valid and is kept
+        self._refresh_lock = threading.Lock()
+        self._refresher = None
+        if self._owns_session:
+            self.session = requests.Session()
+
+    def _fetch(self):
+        """Request a new token from the accounts service and store it."""
+        if not self.client_id or not self.client_secret:
+            raise SpotifyTokenError("Spotify API credentials not found in environment variables")
+
+        auth_header = base64.b64encode(f"{self.client_id}:{self.client_secret}".encode()).decode()
+        status = "error"
+        try:
+            with stage("token_refresh"):
+                response = self.session.post(
+                    self.TOKEN_URL,
+                    headers={"Authorization": f"Basic {auth_header}",
+                             "Content-Type": "application/x-www-form-urlencoded"},
+                    data={"grant_type": "client_credentials"},
+                    timeout=config.SPOTIFY_REQUEST_TIMEOUT_S,
+                )
+            status = response.status_code
+        finally:
+            SPOTIFY_REQUESTS.inc(endpoint="token", status=status)
+        if response.status_code != 200:
+            raise SpotifyTokenError(f"Failed to get Spotify token: {response.text}", response=response)
+
+        token_data = response.json()
+        self.token = token_data["access_token"]
+        self.lifetime = float(token_data["expires_in"])
+        self.expires_at = time.time() + self.lifetime
+
+    def _margin(self) -> float:
+        # A token that lives no longer than refresh_margin is renewed halfway through its life,
+        # not again as soon as it arrives
+        return min(self.refresh_margin, self.lifetime / 2)
+
+    def _needs_refresh(self) -> bool:
+        return self.token is None or time.time() >= self.expires_at - self._margin()
+
+    def refresh(self, force: bool = False):
+        """Refresh the token unless another thread just did."""
+        with self._refresh_lock:
+            if force or self._needs_refresh():
+                self._fetch()
+
+    def get_token(self) -> str:
+        """
+        Return a valid access token.
+
+        Only blocks when there is no usable token yet (first call, or the
+        background refresher has been failing until the token expired).
+        """
+        if self.token is None or time.time() >= self.expires_at - self.EXPIRY_SKEW:
+            with self._refresh_lock:
+                if self.token is None or time.time() >= self.expires_at - self.EXPIRY_SKEW:
+                    self._fetch()
+        self._ensure_refresher()
+        return self.token
+
+    def get_access_token(self, as_dict: bool = False):
+        """spotipy auth_manager interface."""
+        token = self.get_token()
+        if as_dict:
+            return {"access_token": token, "token_type": "Bearer",
+                    "expires_at": int(self.expires_at)}
+        return token
+
+    def _ensure_refresher(self):
+        if self._refresher is None or not self._refresher.is_alive():
+            with self._refresh_lock:
+                if self._refresher is None or not self._refresher.is_alive():
+                    self._refresher = threading.Thread(target=self._refresh_loop,
+                                                       name="spotify-token-refresher", daemon=True)
+                    self._refresher.start()
+
+    def _refresh_loop(self):
+        while True:
+            delay = max(1.0, self.expires_at - self._margin() - time.time())
+            time.sleep(delay)
+            try:
+                self.refresh()
+            except Exception as e:
+                print(f"Background Spotify token refresh failed: {e}")
+                SPOTIFY_RETRIES.inc(endpoint="token")
+                # Retry soon; the current token stays in use until it expires
+                time.sleep(5.0)
+
+
+_manager = None
+_manager_lock = threading.Lock()
+
+
+def get_token_manager() -> SpotifyTokenManager:
+    """Return the process-wide token manager, creating it on first use."""
+    global _manager
+    if _manager is None:
+        with _manager_lock:
+            if _manager is None:
+                _manager = SpotifyTokenManager()
+    return _manager
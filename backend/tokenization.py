@@ -0,0 +1,152 @@
+from dataclasses import dataclass
+from typing import Iterator, List, Sequence, Tuple
+
+import numpy as np
+
+from metrics import REGISTRY
+
+LONG_TEXT_STRATEGIES = ("truncate", "head_tail", "sliding_window")
+
+INPUT_TOKENS = REGISTRY.histogram(
+    "emotion_input_tokens", "Tokens per input text before truncation",
+    buckets=(8, 16, 32, 64, 128, 256, 512, 1024, 2048, 4096))
+BUCKET_TOKENS = REGISTRY.counter(
+    "emotion_bucket_tokens_total", "Real (non-padding) tokens sent to the model per length bucket", ["bucket"])
+BUCKET_PADDING = REGISTRY.counter(
+    "emotion_bucket_padding_tokens_total", "Padding tokens sent to the model per length bucket", ["bucket"])
+BUCKET_PADDING_RATIO = REGISTRY.gauge(
+    "emotion_bucket_padding_ratio", "Fraction of padding in the last batch of each length bucket", ["bucket"])
+LONG_INPUTS = REGISTRY.counter(
+    "emotion_long_inputs_total", "Texts longer than the model's maximum length", ["strategy"])
+
+
+@dataclass
+class EncodedBatch:
+    inputs: dict            # input_ids / attention_mask arrays, ready for a backend
+    owners: np.ndarray      # Index of the input text each row belongs to
+    weights: np.ndarray     # Weight of each row when a text is split into several windows
+    bucket: int             # Padded sequence length of this batch
+
+
+class LengthBucketedEncoder:
+    """
+    Tokenizes texts once, groups them into length buckets and pads each batch
+    only to its bucket's length.
+
+    Texts longer than max_length are handled by the long-text strategy:
+    "truncate" keeps the start, "head_tail" keeps head_tokens from the start
+    and fills the rest from the end, and "sliding_window" splits the text
+    into overlapping windows whose scores are averaged by the caller, weighted
+    by the number of tokens in each window.
+    """
+
+    def __init__(self, tokenizer, max_length: int = 512, buckets: Sequence[int] = (16, 32, 64, 128, 256, 512),
+                 strategy: str = "truncate", head_tokens: int = 128, window_stride: int = 256,
+                 max_windows: int = 8, max_batch_tokens: int = 8192):
+        """
+        Args:
+            tokenizer: Hugging Face tokenizer of the emotion model
+            max_length: Maximum sequence length the model accepts, special tokens included
+            buckets: Padded lengths to group sequences into; max_length is always added
+            strategy: Long-text strategy, one of LONG_TEXT_STRATEGIES
+            head_tokens: Tokens kept from the start of a text with "head_tail"
+            window_stride: Distance in tokens between window starts with "sliding_window"
+            max_windows: Maximum windows per text; later text is dropped
+            max_batch_tokens: Upper bound on rows * padded length per batch
+        """
+        if strategy not in LONG_TEXT_STRATEGIES:
+            raise ValueError(f"Unknown long-text strategy '{strategy}' (expected one of {LONG_TEXT_STRATEGIES})")
+        self.tokenizer = tokenizer
+        self.max_length = max_length
+        self.buckets = sorted({b for b in buckets if 0 < b < max_length} | {max_length})
+        self.strategy = strategy
+        self.specials = tokenizer.num_special_tokens_to_add()
+        self.budget = max_length - self.specials
+        self.head_tokens = min(head_tokens, self.budget)
+        self.window_stride = max(1, min(window_stride, self.budget))
+        self.max_windows = max(1, max_windows)
+        self.max_batch_tokens = max_batch_tokens
+        self.pad_id = tokenizer.pad_token_id or 0
+
+    def segments(self, ids: List[int]) -> List[List[int]]:
+        """Split or cut one text's token ids (without special tokens) to fit the model."""
+        if len(ids) <= self.budget:
+            return [ids]
+        LONG_INPUTS.inc(strategy=self.strategy)
+        if self.strategy == "head_tail":
+            tail = self.budget - self.head_tokens
+            return [ids[:self.head_tokens] + (ids[-tail:] if tail else [])]
+        if self.strategy == "sliding_window":
+            windows = []
+            for start in range(0, len(ids), self.window_stride):
+                windows.append(ids[start:start + self.budget])
+                if start + self.budget >= len(ids) or len(windows) == self.max_windows:
+                    break
+            return windows
+        return [ids[:self.budget]]
+
+    def bucket_for(self, length: int) -> int:
+        for bucket in self.buckets:
+            if length <= bucket:
+                return bucket
+        return self.buckets[-1]
+
+    def encode(self, texts: Sequence[str]) -> Iterator[EncodedBatch]:
+        """
+        Tokenize texts and yield padded batches, one or more per length bucket.
+
+        Every row carries the index of the text it came from, so a caller can
+        scatter the model outputs back (and average windows of the same text).
+        """
+        token_ids = self.tokenizer(list(texts), add_special_tokens=False, truncation=False)["input_ids"]
+
+        rows: List[Tuple[List[int], int, float]] = []
+        for owner, ids in enumerate(token_ids):
+            INPUT_TOKENS.observe(len(ids) + self.specials)
+            for segment in self.segments(ids):
+                sequence = self.tokenizer.build_inputs_with_special_tokens(segment)
+                rows.append((sequence, owner, float(len(segment) or 1)))
+
+        by_bucket = {}
+        for row in rows:
+            by_bucket.setdefault(self.bucket_for(len(row[0])), []).append(row)
+
+        for bucket in sorted(by_bucket):
+            bucket_rows = by_bucket[bucket]
+            per_batch = max(1, self.max_batch_tokens // bucket)
+            for start in range(0, len(bucket_rows), per_batch):
+                yield self._pad(bucket_rows[start:start + per_batch], bucket)
+
+    def filled_batch(self, token_ids: Sequence[int], bucket: int, rows: int) -> dict:
+        """
+        Model inputs of rows sequences exactly bucket tokens long, cut from token_ids.
+
+        Used to warm up and benchmark a bucket with real text; token_ids are
+        repeated as needed and the padding metrics are not touched.
+        """
+        length = max(1, bucket - self.specials)
+        needed = rows * length
+        stream = list(token_ids) * (needed // max(1, len(token_ids)) + 1)
+        input_ids = np.array([self.tokenizer.build_inputs_with_special_tokens(stream[i * length:(i + 1) * length])
+                              for i in range(rows)], dtype=np.int64)
+        return {"input_ids": input_ids, "attention_mask": np.ones_like(input_ids)}
+
+    def _pad(self, rows: List[Tuple[List[int], int, float]], bucket: int) -> EncodedBatch:
+        input_ids = np.full((len(rows), bucket), self.pad_id, dtype=np.int64)
+        attention_mask = np.zeros((len(rows), bucket), dtype=np.int64)
+        for i, (sequence, _, _) in enumerate(rows):
+            input_ids[i, :len(sequence)] = sequence
+            attention_mask[i, :len(sequence)] = 1
+
+        real = int(attention_mask.sum())
+        padding = attention_mask.size - real
+        BUCKET_TOKENS.inc(real, bucket=bucket)
+        BUCKET_PADDING.inc(padding, bucket=bucket)
+        BUCKET_PADDING_RATIO.set(padding / attention_mask.size, bucket=bucket)
+
+        return EncodedBatch(
+            inputs={"input_ids": input_ids, "attention_mask": attention_mask},
+            owners=np.array([owner for _, owner, _ in rows], dtype=np.int64),
+            weights=np.array([weight for _, _, weight in rows]),
+            bucket=bucket,
+        )
@@ -0,0 +1,115 @@
+import contextvars
+import json
+import time
+from contextlib import contextmanager
+from functools import partial
+from typing import Callable, List, Optional, Sequence, Tuple
+
+from metrics import REGISTRY
+
+STAGE_SECONDS = REGISTRY.histogram(
+    "stage_seconds", "Duration of each request processing stage", ["stage"],
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0))
+HTTP_REQUEST_SECONDS = REGISTRY.histogram(
+    "http_request_seconds", "End-to-end HTTP request duration", ["route", "status"])
+HTTP_FIRST_BYTE_SECONDS = REGISTRY.histogram(
+    "http_first_byte_seconds", "Time from request start to the first event of a streamed response", ["route"])
+HTTP_STREAM_SECONDS = REGISTRY.histogram(
+    "http_stream_seconds", "Time from request start to the last event of a streamed response", ["route"])
+
+# Request header that asks for a trace, and response header that carries it
+TRACE_REQUEST_HEADER = "X-Debug-Trace"
+TRACE_RESPONSE_HEADER = "X-Debug-Trace"
+
+
+class Trace:
+    """Spans recorded for one request: (stage, start offset, duration) in seconds."""
+
+    __slots__ = ("started", "spans")
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.spans: List[Tuple[str, float, float]] = []
+
+    def add(self, name: str, started: float, duration: float):
+        self.spans.append((name, started - self.started, duration))
+
+    def server_timing(self) -> str:
+        """Spans in the standard Server-Timing header format (shown by browser dev tools)."""
+        return ", ".join(f"{name};dur={duration * 1000:.2f}" for name, _, duration in self.spans)
+
+    def to_json(self) -> str:
+        return json.dumps([{"stage": name, "start_ms": round(start * 1000, 2), "ms": round(duration * 1000, 2)}
+                           for name, start, duration in self.spans], separators=(",", ":"))
+
+
+_current: contextvars.ContextVar[Optional[Trace]] = contextvars.ContextVar("trace", default=None)
+
+
+def start_trace() -> contextvars.Token:
+    """Start collecting spans for the current request (context)."""
+    return _current.set(Trace())
+
+
+def end_trace(token: contextvars.Token) -> Optional[Trace]:
+    trace = _current.get()
+    _current.reset(token)
+    return trace
+
+
+def current_trace() -> Optional[Trace]:
+    return _current.get()
+
+
+@contextmanager
+def stage(name: str):
+    """
+    Time a block as one processing stage.
+
+    The duration always goes to the stage_seconds histogram (a clock read and
+    one histogram update, cheap enough to leave on), and is also recorded as
+    a span when the current request is being traced.
+    """
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        duration = time.perf_counter() - started
+        STAGE_SECONDS.observe(duration, stage=name)
+        trace = _current.get()
+        if trace is not None:
+            trace.add(name, started, duration)
+
+
+class _SharedSpans:
+    """Stand-in trace that records every span in several requests' traces."""
+
+    __slots__ = ("traces",)
+
+    def __init__(self, traces: List[Trace]):
+        self.traces = traces
+
+    def add(self, name: str, started: float, duration: float):
+        for trace in self.traces:
+            trace.add(name, started, duration)
+
+
+@contextmanager
+def shared_trace(traces: Sequence[Optional[Trace]]):
+    """
+    Record the spans of a block in each of several traces.
+
+    For work done on behalf of many requests at once on another thread, such
+    as one micro-batch: every traced request in it gets the batch's stages.
+    """
+    traces = list({id(trace): trace for trace in traces if trace is not None}.values())
+    token = _current.set(_SharedSpans(traces) if traces else None)
+    try:
+        yield
+    finally:
+        _current.reset(token)
+
+
+def in_context(fn: Callable, *args, **kwargs) -> Callable:
+    """Bind fn to a copy of the current context, so spans recorded on a worker thread join this request's trace."""
+    return partial(contextvars.copy_context().run, fn, *args, **kwargs)
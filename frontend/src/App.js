@@ -16,9 +16,24 @@ function App() {
   const [userText, setUserText] = useState("");
   const [useClustering, setUseClustering] = useState(true);
   const [loading, setLoading] = useState(false);
+  const [streaming, setStreaming] = useState(false);
   const [result, setResult] = useState(null);
   const [error, setError] = useState(null);
 
+  // Apply one event of the /recommend/stream response
+  const handleEvent = (event) => {
+    if (event.event === "emotion") {
+      // Show the mood right away; songs are added as they arrive
+      setResult({ emotion: event.emotion, scores: event.scores, recommendations: [] });
+      setLoading(false);
+      setStreaming(true);
+    } else if (event.event === "recommendation") {
+      setResult((prev) => ({ ...prev, recommendations: [...prev.recommendations, event] }));
+    } else if (event.event === "error") {
+      throw new Error(event.error);
+    }
+  };
+
   // Handle form submit
   const handleSubmit = async (e) => {
     e.preventDefault();
@@ -27,7 +42,7 @@ function App() {
     setResult(null);
 
     try {
-      const response = await fetch("/recommend", {
+      const response = await fetch("/recommend/stream", {
         method: "POST",
         headers: { "Content-Type": "application/json" },
         body: JSON.stringify({
@@ -35,13 +50,25 @@ function App() {
           use_clustering: useClustering,
         }),
       });
-      if (!response.ok) throw new Error("API error");
-      const data = await response.json();
-      setResult(data);
+      if (!response.ok || !response.body) throw new Error("API error");
+
+      // The response is NDJSON: one event per line, flushed as soon as it is ready
+      const reader = response.body.getReader();
+      const decoder = new TextDecoder();
+      let buffer = "";
+      while (true) {
+        const { done, value } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+        const lines = buffer.split("\n");
+        buffer = lines.pop();
+        lines.filter((line) => line.trim()).forEach((line) => handleEvent(JSON.parse(line)));
+      }
     } catch (err) {
       setError("Failed to get recommendations. Please try again.");
     } finally {
       setLoading(false);
+      setStreaming(false);
     }
   };
 
@@ -186,7 +213,7 @@ function App() {
             Detected Mood: {result.emotion.charAt(0).toUpperCase() + result.emotion.slice(1)}
           </div>
           {/* Show message if no recommendations */}
-          {result.recommendations.length === 0 ? (
+          {result.recommendations.length === 0 && !streaming ? (
             <div style={{ color: "#e74c3c", textAlign: "center", fontWeight: "bold" }}>
               {result.message || "No recommendations found for your mood."}
             </div>
@@ -217,10 +244,15 @@ function App() {
                       {idx + 1}. {song.title}
                     </span>
                     <br />
-                    <span style={{ color: "#555", fontSize: 15 }}>{song.artist}</span>
+                    <span style={{ color: "#555", fontSize: 15 }}>
+                      {song.artist}{song.language ? ` · ${song.language}` : ""}
+                    </span>
                   </div>
                 </div>
               ))}
+              {streaming && (
+                <div style={{ color: "#888", textAlign: "center" }}>Finding more songs...</div>
+              )}
             </div>
           )}
         </div>